@@ -0,0 +1,100 @@
+"""
+Al Kamel "AnalysisEnduranceWithSections" timing files.
+
+One `;`-delimited row per car and lap with padded headers (` LAP_NUMBER`), clock
+strings for lap and pit times (`2:38.824`, `0:01:42.366`), the pit-lane flags
+(`CROSSING_FINISH_LINE_IN_PIT` = "B" on an in-lap, `PIT_TIME` set on the out-lap),
+the flag at the finish line and the local time of day at the line (`HOUR`).
+Parsed into flat per-car arrays like LapTable.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .csv_reader import read_columns, read_header, to_clock, to_numbers
+
+GREEN_FLAGS = {"GF", "FF"}
+
+
+class AnalysisTable:
+    """Laps of every car from an analysis file, sorted by car then lap number."""
+
+    def __init__(self, cars: List[str], offsets: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.cars = cars
+        self.offsets = offsets
+        self.laps: np.ndarray = columns["laps"]
+        self.times: np.ndarray = columns["times"]
+        self.in_pit: np.ndarray = columns["in_pit"]
+        self.out_lap: np.ndarray = columns["out_lap"]
+        self.pit_time: np.ndarray = columns["pit_time"]
+        self.green: np.ndarray = columns["green"]
+        # seconds after local midnight at which the lap ended
+        self.clock: np.ndarray = columns["clock"]
+        self._index = {c: i for i, c in enumerate(cars)}
+
+    def index_of(self, car: Optional[str]) -> Optional[int]:
+        """Car index by car number; GR vehicle ids ("GR86-004-78") match on their suffix."""
+        if not car:
+            return None
+        number = car.rsplit("-", 1)[-1].strip().lstrip("0") or "0"
+        return self._index.get(number)
+
+    def default_car(self) -> Optional[int]:
+        if not self.cars:
+            return None
+        return int(np.argmax(np.diff(self.offsets)))
+
+    def rows(self, idx: int) -> slice:
+        return slice(int(self.offsets[idx]), int(self.offsets[idx + 1]))
+
+
+def is_analysis_file(headers: List[str]) -> bool:
+    return "NUMBER" in headers and "LAP_NUMBER" in headers and "LAP_TIME" in headers
+
+
+ANALYSIS_COLUMNS = {
+    "car": ["NUMBER"],
+    "lap": ["LAP_NUMBER"],
+    "time": ["LAP_TIME"],
+    "in_pit": ["CROSSING_FINISH_LINE_IN_PIT"],
+    "pit_time": ["PIT_TIME"],
+    "flag": ["FLAG_AT_FL"],
+    "hour": ["HOUR"],
+}
+
+
+def car_numbers(raw: np.ndarray) -> np.ndarray:
+    """Car numbers without leading zeros ("007" -> "7", "000" -> "0")."""
+    cars = np.strings.lstrip(raw, "0")
+    return np.where(cars == "", "0", cars)
+
+
+def read_analysis(csv_path: Path) -> Optional[AnalysisTable]:
+    if not is_analysis_file(read_header(csv_path)[1]):
+        return None
+    cols = read_columns(csv_path, ANALYSIS_COLUMNS)
+    lap_f = to_numbers(cols["lap"])
+    ok = np.isfinite(lap_f)
+    blank = [""] * len(lap_f)
+    strip = lambda name: np.strings.strip(np.asarray(cols.get(name, blank), dtype=str))[ok]
+    cars = car_numbers(strip("car"))
+    flags = strip("flag")
+
+    names = sorted(set(cars.tolist()), key=lambda c: (len(c), c))
+    code = {c: i for i, c in enumerate(names)}
+    car_codes = np.array([code[c] for c in cars.tolist()], dtype=np.int64)
+    lap_arr = lap_f[ok].astype(np.int32)
+    order = np.lexsort((lap_arr, car_codes))
+    pit_arr = to_clock(cols.get("pit_time", blank))[ok][order]
+    columns = {
+        "laps": lap_arr[order],
+        "times": to_clock(cols["time"])[ok][order],
+        "in_pit": (strip("in_pit") == "B")[order],
+        "out_lap": ~np.isnan(pit_arr),
+        "pit_time": pit_arr,
+        "green": ((flags == "") | np.isin(flags, list(GREEN_FLAGS)))[order],
+        "clock": to_clock(cols.get("hour", blank))[ok][order],
+    }
+    offsets = np.searchsorted(car_codes[order], np.arange(len(names) + 1)).astype(np.int64)
+    return AnalysisTable(names, offsets, columns)
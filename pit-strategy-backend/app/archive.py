@@ -0,0 +1,158 @@
+"""
+Datasets inside ZIP archives, read in place.
+
+A dataset path such as `Sebring.zip/Race 1/sebring_lap_time_R1.csv` addresses a
+member of an archive. The archive's central directory is read once into a
+ZipIndex (cached per archive mtime/size); a ZipMember then stands in for a Path:
+it opens as a stream that inflates the member on the fly, and stats as the
+archive's mtime plus the member size, so the parse cache, sidecars and parsers
+handle members exactly like files on disk and nothing is extracted.
+"""
+import io
+import os
+import posixpath
+import threading
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional, Tuple, Union
+
+_indexes: Dict[str, Tuple[Tuple[int, int], "ZipIndex"]] = {}
+_indexes_lock = threading.Lock()
+
+
+class ZipIndex:
+    """Central directory of one archive plus a shared handle for streaming members."""
+
+    def __init__(self, archive: Path):
+        self.archive = archive
+        self._zip = zipfile.ZipFile(archive)
+        self.members: Dict[str, zipfile.ZipInfo] = {
+            info.filename.rstrip("/"): info for info in self._zip.infolist() if not info.is_dir()
+        }
+        self.dirs = {posixpath.dirname(name) for name in self.members}
+        for d in list(self.dirs):
+            while d:
+                d = posixpath.dirname(d)
+                self.dirs.add(d)
+
+    def open(self, member: str):
+        # ZipFile serialises reads of its shared handle, so members can stream concurrently
+        return self._zip.open(self.members[member])
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+def zip_index(archive: Path) -> ZipIndex:
+    """Cached index of an archive, rebuilt when the archive's mtime or size changes."""
+    st = archive.stat()
+    version = (st.st_mtime_ns, st.st_size)
+    key = str(archive.resolve())
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        index = ZipIndex(archive)
+        if cached is not None:
+            cached[1].close()
+        _indexes[key] = (version, index)
+        return index
+
+
+class _MemberStat:
+    def __init__(self, st: os.stat_result, size: int):
+        self.st_mode = st.st_mode
+        self.st_size = size
+        self.st_mtime = st.st_mtime
+        self.st_mtime_ns = st.st_mtime_ns
+
+
+class ZipMember:
+    """Path-like handle on a file (or folder) inside a ZIP archive."""
+
+    def __init__(self, archive: Path, member: str):
+        self.archive = archive
+        self.member = member.strip("/")
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.member)
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.member).suffix
+
+    @property
+    def parent(self) -> Union["ZipMember", Path]:
+        up = posixpath.dirname(self.member)
+        return ZipMember(self.archive, up) if up else self.archive
+
+    def resolve(self) -> "ZipMember":
+        return ZipMember(self.archive.resolve(), self.member)
+
+    def relative_to(self, other: Path) -> PurePosixPath:
+        return PurePosixPath(self.archive.relative_to(other).as_posix()) / self.member
+
+    def is_file(self) -> bool:
+        try:
+            return self.member in zip_index(self.archive).members
+        except (OSError, zipfile.BadZipFile):
+            return False
+
+    def exists(self) -> bool:
+        try:
+            index = zip_index(self.archive)
+        except (OSError, zipfile.BadZipFile):
+            return False
+        return self.member in index.members or self.member in index.dirs
+
+    def stat(self) -> _MemberStat:
+        try:
+            info = zip_index(self.archive).members[self.member]
+        except (KeyError, zipfile.BadZipFile):
+            raise FileNotFoundError(str(self)) from None
+        return _MemberStat(self.archive.stat(), info.file_size)
+
+    def open(self, mode: str = "r", newline: Optional[str] = None, encoding: Optional[str] = None, errors: Optional[str] = None):
+        try:
+            raw = zip_index(self.archive).open(self.member)
+        except (KeyError, zipfile.BadZipFile):
+            raise FileNotFoundError(str(self)) from None
+        if "b" in mode:
+            return raw
+        return io.TextIOWrapper(raw, encoding=encoding or "utf-8", errors=errors, newline=newline)
+
+    def __str__(self) -> str:
+        return f"{self.archive}/{self.member}"
+
+    def __repr__(self) -> str:
+        return f"ZipMember({str(self)!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ZipMember) and (self.archive, self.member) == (other.archive, other.member)
+
+    def __hash__(self) -> int:
+        return hash((self.archive, self.member))
+
+
+DatasetPath = Union[Path, ZipMember]
+
+
+def split_archive(rel: str) -> Optional[Tuple[str, str]]:
+    """("Sebring.zip", "Race 1/x.csv") for a relative path running through a .zip, else None."""
+    parts = rel.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part.lower().endswith(".zip"):
+            return "/".join(parts[: i + 1]), "/".join(parts[i + 1 :])
+    return None
+
+
+def dataset_path(base: Path, rel: str) -> DatasetPath:
+    """A relative dataset path as a file on disk, or as an archive member when it runs through a .zip."""
+    path = base / rel
+    if path.exists():
+        return path
+    split = split_archive(rel)
+    if split is None:
+        return path
+    return ZipMember(base / split[0], split[1])
@@ -0,0 +1,310 @@
+"""
+Dataset catalog: a single-pass index of the datasets directory.
+
+Each directory's direct listing is stored together with the directory mtime, so a
+refresh only re-lists directories whose entries changed (a file added, removed or
+renamed) and re-uses everything else. Recursive aggregates (CSV/ZIP counts, bytes
+and the preferred lap-time, lap start, lap end, timing analysis, weather and telemetry files) are derived bottom-up
+after every refresh and looked up per folder in O(1). The index is persisted to a JSON manifest next to
+the data so a restarted server starts warm.
+
+Files rewritten in place do not change their directory's mtime; their sizes are
+picked up on the next directory change. Parsers fingerprint files themselves, so
+this only affects the reported sizes.
+
+ZIP archives are indexed like folders: their central directory is listed once per
+archive mtime, and the folders inside appear as `Sebring.zip/Race 1`.
+"""
+import json
+import os
+import posixpath
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from zipfile import BadZipFile
+
+from .archive import zip_index
+from .metrics import span
+
+DERIVED_DIRNAME = ".trackota"
+MANIFEST_VERSION = 3
+
+
+def derived_dir(base: Path) -> Path:
+    """Folder for data derived from the datasets (manifest, sidecars, stores)."""
+    env_dir = os.getenv("TRACKOTA_CACHE_DIR")
+    return Path(env_dir) if env_dir else base / DERIVED_DIRNAME
+
+
+def normalise_rel(rel: Optional[str]) -> Optional[str]:
+    """Normalise a client supplied relative path; None if it escapes the base."""
+    if rel is None:
+        return None
+    rel = posixpath.normpath(rel.replace("\\", "/").strip("/"))
+    if rel in ("", "."):
+        return ""
+    if rel == ".." or rel.startswith("../") or rel.startswith("/"):
+        return None
+    return rel
+
+
+# candidate file kind -> predicate on the lower-cased file name; first match in tree order wins
+CANDIDATE_RULES = {
+    "lapTimesFile": lambda n: n.startswith("lap_times") or "lap_time" in n,
+    "lapStartFile": lambda n: "lap_start" in n,
+    "lapEndFile": lambda n: "lap_end" in n,
+    "analysisFile": lambda n: "analysisendurance" in n,
+    "weatherFile": lambda n: "weather" in n,
+    "telemetryFile": lambda n: "telemetry" in n,
+}
+
+SESSION_RULES = {kind: CANDIDATE_RULES[kind] for kind in ("lapTimesFile", "analysisFile")}
+MACOS_RESIDUE = "__MACOSX"
+
+
+def _is_csv(name: str) -> bool:
+    # timing exports use an upper-case .CSV extension
+    return name.lower().endswith(".csv")
+
+
+def _is_zip(name: str) -> bool:
+    return name.lower().endswith(".zip")
+
+
+def _join(rel: str, name: str) -> str:
+    return f"{rel}/{name}" if rel else name
+
+
+class DatasetCatalog:
+    def __init__(self, base: Path, manifest_path: Path, poll_interval: float = 2.0):
+        self.base = base
+        self.manifest_path = manifest_path
+        self.poll_interval = poll_interval
+        # rel dir -> {"mtime": ns, "files": [[name, size, mtime_ns], ...], "dirs": [name, ...]}
+        self._listings: Dict[str, Dict[str, Any]] = {}
+        # rel dir -> recursive aggregates
+        self._folders: Dict[str, Dict[str, Any]] = {}
+        self._first_folder: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.rescans = 0
+        self._load_manifest()
+
+    # -- public lookups -------------------------------------------------
+
+    def folder(self, rel: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Aggregates for a dataset folder, or None if unknown."""
+        rel = normalise_rel(rel)
+        if rel is None:
+            return None
+        self.refresh()
+        return self._folders.get(rel)
+
+    def first_folder(self) -> Optional[str]:
+        self.refresh()
+        return self._first_folder
+
+    def folders(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        return [self._folders[rel] for rel in sorted(self._folders, key=lambda r: r.split("/")) if rel]
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        """Folders that hold a lap-time or timing analysis file themselves: one per race or session."""
+        self.refresh()
+        out = []
+        for rel in sorted(self._listings, key=lambda r: r.split("/")):
+            # macOS archive residue: AppleDouble copies of every file
+            if MACOS_RESIDUE in rel.split("/"):
+                continue
+            names = [n.lower() for n, _, _ in self._listings[rel]["files"] if _is_csv(n) and not n.startswith("._")]
+            if any(SESSION_RULES[kind](n) for n in names for kind in SESSION_RULES) and rel in self._folders:
+                out.append(self._folders[rel])
+        return out
+
+    def files(self) -> List[Dict[str, Any]]:
+        """Every CSV and ZIP file in the tree with its size."""
+        self.refresh()
+        zips: List[Dict[str, Any]] = []
+        csvs: List[Dict[str, Any]] = []
+        for rel in sorted(self._listings, key=lambda r: r.split("/")):
+            for name, size, _ in self._listings[rel]["files"]:
+                item = {"kind": "file", "name": name, "relativePath": _join(rel, name), "size": size}
+                if _is_zip(name):
+                    zips.append(item)
+                elif _is_csv(name):
+                    csvs.append(item)
+        return zips + csvs
+
+    # -- refresh ----------------------------------------------------------
+
+    def refresh(self, force: bool = False) -> None:
+        """Re-stat directories (throttled by poll_interval) and re-list the changed ones."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.poll_interval:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.poll_interval:
+                return
+            listings: Dict[str, Dict[str, Any]] = {}
+            with span("walk"):
+                changed = self._walk("", self.base, listings)
+            if changed or listings.keys() != self._listings.keys():
+                self._listings = listings
+                self._aggregate()
+                self._save_manifest()
+            self._checked_at = time.monotonic()
+
+    def _walk(self, rel: str, path: Path, out: Dict[str, Dict[str, Any]]) -> bool:
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return True
+        listing = self._listings.get(rel)
+        changed = False
+        if listing is None or listing["mtime"] != mtime:
+            listing = self._scan(path, mtime)
+            changed = True
+            self.rescans += 1
+        out[rel] = listing
+        for name in listing["dirs"]:
+            changed = self._walk(_join(rel, name), path / name, out) or changed
+        for name, _, zip_mtime in listing["files"]:
+            if _is_zip(name):
+                changed = self._walk_zip(_join(rel, name), path / name, zip_mtime, out) or changed
+        return changed
+
+    def _walk_zip(self, rel: str, path: Path, mtime: int, out: Dict[str, Dict[str, Any]]) -> bool:
+        """Listings of the folders inside an archive, re-read only when the archive changes."""
+        listing = self._listings.get(rel)
+        if listing is not None and listing["mtime"] == mtime:
+            prefix = rel + "/"
+            out.update({k: v for k, v in self._listings.items() if k == rel or k.startswith(prefix)})
+            return False
+        self.rescans += 1
+        try:
+            index = zip_index(path)
+        except (OSError, BadZipFile):
+            return True
+        for inner in index.dirs:
+            files = [
+                [posixpath.basename(name), info.file_size, mtime]
+                for name, info in index.members.items()
+                if posixpath.dirname(name) == inner and _is_csv(name)
+            ]
+            dirs = [posixpath.basename(d) for d in index.dirs if d and posixpath.dirname(d) == inner]
+            out[_join(rel, inner) if inner else rel] = {"mtime": mtime, "files": sorted(files), "dirs": sorted(dirs), "zip": True}
+        return True
+
+    def _scan(self, path: Path, mtime: int) -> Dict[str, Any]:
+        files: List[List[Any]] = []
+        dirs: List[str] = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if entry.name != DERIVED_DIRNAME:
+                                dirs.append(entry.name)
+                        elif entry.is_file() and (_is_csv(entry.name) or _is_zip(entry.name)):
+                            st = entry.stat()
+                            files.append([entry.name, st.st_size, st.st_mtime_ns])
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        files.sort(key=lambda f: f[0])
+        dirs.sort()
+        return {"mtime": mtime, "files": files, "dirs": dirs}
+
+    def _aggregate(self) -> None:
+        """Derive recursive counts and candidates bottom-up (children before parents)."""
+        folders: Dict[str, Dict[str, Any]] = {}
+        for rel in sorted(self._listings, key=lambda r: r.count("/") if r else -1, reverse=True):
+            listing = self._listings[rel]
+            csv_count = zip_count = size = 0
+            found: Dict[str, Optional[str]] = {kind: None for kind in CANDIDATE_RULES}
+            first_csv: Optional[str] = None
+            for name, fsize, _ in listing["files"]:
+                if _is_csv(name):
+                    csv_count += 1
+                    size += fsize
+                    if first_csv is None:
+                        first_csv = _join(rel, name)
+                    lower = name.lower()
+                    for kind, rule in CANDIDATE_RULES.items():
+                        if found[kind] is None and rule(lower):
+                            found[kind] = _join(rel, name)
+                elif _is_zip(name):
+                    zip_count += 1
+                    size += fsize
+            archives = [] if listing.get("zip") else [n for n, _, _ in listing["files"] if _is_zip(n)]
+            for name in listing["dirs"] + archives:
+                child = folders.get(_join(rel, name))
+                if not child:
+                    continue
+                csv_count += child["csvCount"]
+                zip_count += child["zipCount"]
+                # an archive's own (compressed) size is already counted above
+                size += child["bytes"] if name not in archives else 0
+                first_csv = first_csv or child["firstCsv"]
+                for kind in CANDIDATE_RULES:
+                    found[kind] = found[kind] or child[kind]
+            name = posixpath.basename(rel) or self.base.name
+            folders[rel] = {
+                "kind": "directory",
+                "name": name,
+                "relativePath": rel,
+                "csvCount": csv_count,
+                "zipCount": zip_count,
+                "bytes": size,
+                "track": name[:-4] if _is_zip(name) else name,
+                **found,
+                "firstCsv": first_csv,
+                "lapTimesCandidate": found["lapTimesFile"] or first_csv,
+            }
+        with_csv = [rel for rel, f in folders.items() if rel and f["csvCount"]]
+        self._first_folder = min(with_csv, key=lambda r: r.split("/")) if with_csv else None
+        self._folders = folders
+
+    # -- manifest ---------------------------------------------------------
+
+    def _load_manifest(self) -> None:
+        try:
+            with self.manifest_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("base") != str(self.base):
+            return
+        self._listings = data.get("listings") or {}
+        self._aggregate()
+
+    def _save_manifest(self) -> None:
+        payload = {"version": MANIFEST_VERSION, "base": str(self.base), "listings": self._listings}
+        tmp = self.manifest_path.with_suffix(".tmp")
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(payload, f, separators=(",", ":"))
+            os.replace(tmp, self.manifest_path)
+        except OSError:
+            # read-only datasets folder: keep the in-memory index only
+            pass
+
+
+_catalogs: Dict[Tuple[str, str], DatasetCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(base: Path) -> DatasetCatalog:
+    """Process-wide catalog for a datasets base folder."""
+    manifest = Path(os.getenv("TRACKOTA_CATALOG_PATH") or derived_dir(base) / "catalog.json")
+    key = (str(base), str(manifest))
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            poll = float(os.getenv("TRACKOTA_CATALOG_POLL_SECONDS", "2"))
+            catalog = DatasetCatalog(base, manifest, poll)
+            _catalogs[key] = catalog
+        return catalog
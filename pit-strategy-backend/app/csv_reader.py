@@ -0,0 +1,187 @@
+"""
+Shared CSV reading for every extractor.
+
+Exports come in two dialects: the GR telemetry/timing files (`,`-delimited) and the
+Al Kamel timing files (`;`-delimited, padded headers such as ` LAP_NUMBER`, an
+upper-case `.CSV` extension, sometimes a UTF-8 BOM). The delimiter is sniffed
+from the header line once and headers are stripped, so callers look columns up
+by their aliases and never see the dialect.
+
+`read_columns` projects only the requested columns with csv.reader and index
+lookups (no per-row dict), and the `to_*` helpers convert a whole column in one
+pass: plain float() over the column, UTC ISO timestamps through datetime64, and
+the lenient per-cell parsers only when a column holds malformed values.
+"""
+import csv
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import count_read
+
+DELIMITERS = (",", ";", "\t")
+
+
+def pick_column(headers, keys) -> Optional[str]:
+    """First of `keys` present in `headers` (exact match first, then ignoring case)."""
+    for k in keys:
+        if k in headers:
+            return k
+    lowered = {h.lower(): h for h in headers}
+    for k in keys:
+        if k.lower() in lowered:
+            return lowered[k.lower()]
+    return None
+
+
+def parse_number(val: Optional[str]) -> float:
+    """Float value of a cell, NaN when empty or not numeric."""
+    if val is None or val == "":
+        return float("nan")
+    try:
+        return float(val)
+    except ValueError:
+        try:
+            return float(val.replace(",", ""))
+        except ValueError:
+            return float("nan")
+
+
+def parse_timestamp(val: Optional[str]) -> float:
+    """Epoch seconds from a numeric (s or ms) or ISO-8601 timestamp, NaN if unparseable."""
+    if val is None or val == "":
+        return float("nan")
+    try:
+        x = float(val)
+        return x / 1000.0 if x > 1e11 else x
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(val.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("nan")
+
+
+def parse_clock(val: Optional[str]) -> float:
+    """Seconds from "h:mm:ss.fff", "m:ss.fff" or "ss.fff"; NaN when empty or malformed."""
+    if not val:
+        return float("nan")
+    total = 0.0
+    try:
+        for part in val.strip().split(":"):
+            total = total * 60.0 + float(part)
+    except ValueError:
+        return float("nan")
+    return total
+
+
+def sniff_delimiter(line: str) -> str:
+    counts = [(line.count(d), d) for d in DELIMITERS]
+    best = max(counts)
+    return best[1] if best[0] else ","
+
+
+class CsvReader:
+    """
+    Rows of a CSV with the dialect sniffed from its header line.
+    Use as a context manager; iterate for raw rows (lists of strings).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.delimiter = ","
+        self.headers: List[str] = []
+        self._file = None
+        self._reader = None
+
+    def __enter__(self) -> "CsvReader":
+        self._file = self.path.open("r", newline="", encoding="utf-8-sig", errors="ignore")
+        first = self._file.readline()
+        self.delimiter = sniff_delimiter(first)
+        self.headers = [h.strip() for h in next(csv.reader([first], delimiter=self.delimiter), [])]
+        self._reader = csv.reader(self._file, delimiter=self.delimiter)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            nbytes = self._file.buffer.tell()
+        except (AttributeError, OSError, ValueError):
+            nbytes = 0
+        count_read(self._reader.line_num, nbytes)
+        self._file.close()
+
+    def __iter__(self):
+        return self._reader
+
+    def column(self, aliases: Sequence[str]) -> Optional[int]:
+        name = pick_column(self.headers, aliases)
+        return self.headers.index(name) if name is not None else None
+
+
+def read_header(path) -> Tuple[str, List[str]]:
+    """(delimiter, stripped header names) of a CSV."""
+    with CsvReader(path) as r:
+        return r.delimiter, r.headers
+
+
+def read_columns(path, columns: Dict[str, Sequence[str]], limit: Optional[int] = None) -> Dict[str, List[str]]:
+    """
+    Raw cell strings of the requested columns (logical name -> header aliases) in one
+    pass. Columns the file does not have are left out; rows too short to hold every
+    projected column are skipped.
+    """
+    with CsvReader(path) as r:
+        found = {name: r.column(aliases) for name, aliases in columns.items()}
+        found = {name: idx for name, idx in found.items() if idx is not None}
+        if not found:
+            return {}
+        width = max(found.values()) + 1
+        get = itemgetter(*found.values())
+        rows = r if limit is None else (row for _, row in zip(range(limit), r))
+        if len(found) == 1:
+            projected = [(get(row),) for row in rows if len(row) >= width]
+        else:
+            projected = [get(row) for row in rows if len(row) >= width]
+    if not projected:
+        return {name: [] for name in found}
+    return {name: list(col) for name, col in zip(found, zip(*projected))}
+
+
+_NAN = float("nan")
+
+
+def _floats(values: Sequence[str]) -> np.ndarray:
+    """Plain float() over a column; raises ValueError on the first malformed cell."""
+    return np.fromiter((float(v) if v else _NAN for v in values), dtype=np.float64, count=len(values))
+
+
+def to_numbers(values: Sequence[str]) -> np.ndarray:
+    """Float column, NaN for empty or non-numeric cells."""
+    try:
+        return _floats(values)
+    except ValueError:
+        return np.fromiter(map(parse_number, values), dtype=np.float64, count=len(values))
+
+
+def to_clock(values: Sequence[str]) -> np.ndarray:
+    """Seconds from clock strings ("1:02:38.824", "2:38.824", "38.824"); NaN for empty cells."""
+    return np.fromiter(map(parse_clock, values), dtype=np.float64, count=len(values))
+
+
+def to_epoch(values: Sequence[str]) -> np.ndarray:
+    """Epoch seconds from numeric (s or ms) or ISO-8601 timestamps; NaN when unparseable."""
+    try:
+        x = _floats(values)
+        return np.where(x > 1e11, x / 1000.0, x)
+    except ValueError:
+        pass
+    # UTC ISO strings ("2025-03-14T18:25:07.123Z") convert in bulk
+    arr = np.asarray(values, dtype=str)
+    if np.all(np.strings.endswith(arr, "Z")):
+        try:
+            return np.strings.rstrip(arr, "Z").astype("datetime64[us]").astype(np.int64) / 1e6
+        except ValueError:
+            pass
+    return np.fromiter(map(parse_timestamp, values), dtype=np.float64, count=len(values))
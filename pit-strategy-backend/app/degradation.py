@@ -0,0 +1,274 @@
+"""
+Tyre-degradation model.
+
+Each car's laps are split into stints at its pit stops (in-lap / out-lap pairs from
+the timing file). In- and out-laps, laps run under a non-green flag, the opening lap
+and traffic outliers are left out, lap times are corrected for fuel burn (and, when
+the session has weather, for track temperature), and a
+straight line (pace + slope * tyre age) is fitted to every stint of every car at
+once from grouped sums (closed-form least squares with np.bincount), so a whole
+field costs a handful of array operations rather than a Python loop per car.
+
+The projected crossover lap is the first lap at which the time already lost to
+tyre wear, carried over the remaining laps, outweighs the time lost in the pit lane.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# seconds per lap a car gets quicker as fuel burns off; added back before fitting
+FUEL_EFFECT = 0.03
+# seconds per lap a car loses for every degree C of track temperature above the session's median
+TRACK_TEMP_EFFECT = 0.02
+# laps slower or quicker than the stint median by more than this are safety car, spin or partial laps
+OUTLIER_RATIO = 0.07
+# laps further than this (as a share of the stint median) off the first fit are traffic
+TREND_RATIO = 0.015
+# fewer usable laps than this and a stint has no slope of its own
+MIN_FIT_LAPS = 3
+# pit loss used when the session has no complete in-lap / out-lap pair
+DEFAULT_PIT_LOSS = 30.0
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, mask: np.ndarray, n_groups: int) -> np.ndarray:
+    """Median of `values[mask]` per group id (NaN for groups without values)."""
+    idx = np.flatnonzero(mask & np.isfinite(values))
+    g, v = groups[idx], values[idx]
+    order = np.lexsort((v, g))
+    g, v = g[order], v[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    out = np.full(n_groups, np.nan)
+    has = counts > 0
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    out[has] = (v[lo[has]] + v[hi[has]]) / 2.0
+    return out
+
+
+def _fit(stint: np.ndarray, age: np.ndarray, y: np.ndarray, usable: np.ndarray, n_stints: int) -> Tuple[np.ndarray, ...]:
+    """
+    Least-squares line y = pace + slope * age per stint from grouped sums.
+    Returns (slope, pace, laps used, r2, confidence); NaN slope where a stint is too short.
+    """
+    w = usable.astype(np.float64)
+    x = np.where(usable, age, 0.0)
+    y = np.where(usable, y, 0.0)
+    sums = {
+        name: np.bincount(stint, weights=vals, minlength=n_stints)
+        for name, vals in (("n", w), ("x", x), ("y", y), ("xx", x * x), ("xy", x * y), ("yy", y * y))
+    }
+    cnt = sums["n"]
+    mean = lambda v: np.divide(v, cnt, out=np.zeros(n_stints), where=cnt > 0)
+    sxx = sums["xx"] - sums["x"] * mean(sums["x"])
+    sxy = sums["xy"] - sums["x"] * mean(sums["y"])
+    syy = sums["yy"] - sums["y"] * mean(sums["y"])
+    fit = (cnt >= MIN_FIT_LAPS) & (sxx > 0)
+    slope = np.where(fit, sxy / np.where(fit, sxx, 1.0), np.nan)
+    pace = np.where(fit, mean(sums["y"]) - slope * mean(sums["x"]), np.nan)
+    rss = np.maximum(syy - slope * sxy, 0.0)
+    r2 = np.where(fit & (syy > 0), 1.0 - rss / np.where(syy > 0, syy, 1.0), np.nan)
+    se = np.sqrt(rss / np.maximum(cnt - 2, 1.0) / np.where(fit, sxx, 1.0))
+    t = np.abs(slope) / np.where(se > 0, se, np.nan)
+    # probability the slope is not noise (normal approximation of the t statistic)
+    erf = np.frompyfunc(math.erf, 1, 1)(np.nan_to_num(t) / math.sqrt(2)).astype(np.float64)
+    conf = np.where(fit, np.where(se > 0, erf, 1.0), 0.0)
+    return slope, pace, cnt.astype(np.int64), r2, conf
+
+
+class DegradationModel:
+    """Fitted stints of a whole session plus each car's projected crossover lap."""
+
+    def __init__(
+        self,
+        cars: List[str],
+        offsets: np.ndarray,
+        laps: np.ndarray,
+        times: np.ndarray,
+        in_pit: Optional[np.ndarray] = None,
+        out_lap: Optional[np.ndarray] = None,
+        green: Optional[np.ndarray] = None,
+        fuel_effect: float = FUEL_EFFECT,
+        track_temp: Optional[np.ndarray] = None,
+        temp_effect: float = TRACK_TEMP_EFFECT,
+    ):
+        n = len(laps)
+        self.cars = cars
+        self.offsets = offsets
+        self.laps = np.asarray(laps, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.float64)
+        self.in_pit = in_pit if in_pit is not None else np.zeros(n, dtype=bool)
+        self.out_lap = out_lap if out_lap is not None else np.zeros(n, dtype=bool)
+        green = green if green is not None else np.ones(n, dtype=bool)
+        self.fuel_effect = fuel_effect
+        self.track_temp = np.asarray(track_temp, dtype=np.float64) if track_temp is not None else np.full(n, np.nan)
+        known = np.isfinite(self.track_temp)
+        self.reference_temp = float(np.median(self.track_temp[known])) if known.any() else None
+        self.temp_effect = temp_effect if self.reference_temp is not None else 0.0
+        # what each lap costs (+) or gains (-) from the track being off its reference temperature
+        temp_term = np.where(known, self.temp_effect * (self.track_temp - (self.reference_temp or 0.0)), 0.0)
+        self.corrected = self.times - temp_term
+        self.total_laps = int(self.laps.max()) if n else 0
+
+        counts = np.diff(offsets)
+        car_of = np.repeat(np.arange(len(cars)), counts)
+
+        # a stint starts with a car's first row, an out-lap, or the row after an in-lap
+        boundary = np.zeros(n, dtype=bool)
+        boundary[offsets[:-1][counts > 0]] = True
+        boundary |= self.out_lap
+        boundary[1:] |= self.in_pit[:-1]
+        stint = np.cumsum(boundary) - 1
+        n_stints = int(stint[-1]) + 1 if n else 0
+        first_lap = self.laps[boundary]
+        age = (self.laps - first_lap[stint]).astype(np.float64) if n else np.empty(0)
+
+        usable = np.isfinite(self.times) & ~self.in_pit & ~self.out_lap & green & (self.laps > 1)
+        median = _group_median(self.times, stint, usable, n_stints)
+        # fuel- and temperature-corrected lap time: a full tank on a track at the reference temperature
+        y = self.corrected + fuel_effect * (self.laps - 1)
+        if n:
+            # gross outliers first (safety car, spins), then laps far off the stint's trend (traffic)
+            usable &= np.abs(self.times / median[stint] - 1.0) <= OUTLIER_RATIO
+            slope, pace = _fit(stint, age, y, usable, n_stints)[:2]
+            resid = y - pace[stint] - slope[stint] * age
+            usable &= ~(np.abs(resid) > TREND_RATIO * median[stint])
+        slope, pace, cnt, r2, conf = _fit(stint, age, y, usable, n_stints)
+
+        self.stint = stint
+        self.usable = usable
+        self.fitted = np.where(
+            ~self.in_pit & ~self.out_lap,
+            pace[stint] + slope[stint] * age - fuel_effect * (self.laps - 1) + temp_term,
+            np.nan,
+        ) if n else np.empty(0)
+        last_row = np.flatnonzero(np.append(boundary[1:], True)) if n else np.empty(0, dtype=np.int64)
+        self.stints = {
+            "car": car_of[boundary],
+            "start": first_lap,
+            "end": self.laps[last_row],
+            "rows": np.bincount(stint, minlength=n_stints),
+            "used": cnt,
+            "slope": slope,
+            "pace": pace,
+            "r2": r2,
+            "confidence": conf,
+        }
+        self.pit_loss = self._pit_loss(car_of, usable)
+        self.crossover, self.window_end, self.car_slope, self.car_confidence = self._crossovers(counts)
+
+    @classmethod
+    def from_series(cls, times: List[float]) -> "DegradationModel":
+        """Single unnamed car from a plain lap-time series."""
+        n = len(times)
+        return cls([""] if n else [], np.array([0, n] if n else [0], dtype=np.int64), np.arange(1, n + 1), np.asarray(times, dtype=np.float64))
+
+    def _pit_loss(self, car_of: np.ndarray, usable: np.ndarray) -> float:
+        """Median time an in-lap + out-lap pair costs over two of the car's clean laps."""
+        if not len(self.laps):
+            return DEFAULT_PIT_LOSS
+        medians = _group_median(self.times, car_of, usable, len(self.cars))
+        pair = np.flatnonzero(self.in_pit[:-1] & self.out_lap[1:] & (car_of[:-1] == car_of[1:]))
+        losses = self.times[pair] + self.times[pair + 1] - 2.0 * medians[car_of[pair]]
+        losses = losses[np.isfinite(losses) & (losses > 0)]
+        return float(np.median(losses)) if losses.size else DEFAULT_PIT_LOSS
+
+    def _crossovers(self, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """First and last lap of each car's current stint at which stopping pays back the pit loss."""
+        n_cars = len(self.cars)
+        none = np.full(n_cars, -1, dtype=np.int64)
+        if not len(self.laps) or self.total_laps < 2:
+            return none, none.copy(), np.full(n_cars, np.nan), np.zeros(n_cars)
+        has_rows = counts > 0
+        current = np.zeros(n_cars, dtype=np.int64)
+        current[has_rows] = self.stint[self.offsets[1:][has_rows] - 1]
+        slope = np.where(has_rows, self.stints["slope"][current], np.nan)
+        confidence = np.where(has_rows & np.isfinite(slope), self.stints["confidence"][current], 0.0)
+        # cars without a fit of their own (fresh out-lap, short stint) take the field's typical slope
+        field = self.stints["slope"][np.isfinite(self.stints["slope"])]
+        slope = np.where(np.isfinite(slope), slope, np.median(field) if field.size else np.nan)
+
+        total = self.total_laps
+        lap = np.arange(1, total + 1)
+        start = np.where(has_rows, self.stints["start"][current], total)
+        gain = slope[:, None] * (lap[None, :] - start[:, None]) * (total - lap[None, :])
+        ok = (lap[None, :] > start[:, None]) & (gain >= self.pit_loss)
+        any_ok = ok.any(axis=1)
+        first = np.where(any_ok, lap[ok.argmax(axis=1)], -1)
+        last = np.where(any_ok, lap[total - 1 - ok[:, ::-1].argmax(axis=1)], -1)
+        return first, last, slope, confidence
+
+    def index_of(self, car: Optional[str]) -> Optional[int]:
+        """Car index by name or car number (GR vehicle ids match on their suffix)."""
+        if car is None:
+            return None
+        if car in self.cars:
+            return self.cars.index(car)
+        wanted = car.rsplit("-", 1)[-1].strip().lstrip("0") or "0"
+        for i, name in enumerate(self.cars):
+            if (name.rsplit("-", 1)[-1].lstrip("0") or "0") == wanted:
+                return i
+        return None
+
+    def default_car(self) -> Optional[int]:
+        if not self.cars:
+            return None
+        return int(np.argmax(np.diff(self.offsets)))
+
+    def pit_window(self, idx: int) -> Tuple[int, int]:
+        """Laps between which a stop pays off; else the car's first stop, else mid-race."""
+        if self.crossover[idx] > 0:
+            return int(self.crossover[idx]), int(self.window_end[idx])
+        sl = slice(int(self.offsets[idx]), int(self.offsets[idx + 1]))
+        laps = self.laps[sl]
+        stops = np.flatnonzero(self.in_pit[sl])
+        if stops.size:
+            start = int(laps[stops[0]])
+        elif laps.size:
+            start = int(laps[max(1, int(len(laps) * 0.5)) - 1])
+        else:
+            return 0, 0
+        return start, int(min(laps[-1], start + 2))
+
+    def car(self, idx: int) -> Dict[str, Any]:
+        """Chart-ready laps, times, fitted curve and stint fits of one car."""
+        sl = slice(int(self.offsets[idx]), int(self.offsets[idx + 1]))
+        timed = np.isfinite(self.times[sl])
+        fitted = self.fitted[sl][timed]
+        mine = np.flatnonzero(self.stints["car"] == idx)
+        stints = [
+            {
+                "start": int(self.stints["start"][s]),
+                "end": int(self.stints["end"][s]),
+                "laps": int(self.stints["rows"][s]),
+                "fittedLaps": int(self.stints["used"][s]),
+                "slope": _round(self.stints["slope"][s], 4),
+                "pace": _round(self.stints["pace"][s], 3),
+                "r2": _round(self.stints["r2"][s], 3),
+                "confidence": _round(self.stints["confidence"][s], 3),
+            }
+            for s in mine
+        ]
+        start, end = self.pit_window(idx)
+        weather = self.reference_temp is not None
+        return {
+            "laps": self.laps[sl][timed].tolist(),
+            "times": np.round(self.times[sl][timed], 3).tolist(),
+            "fitted": [None if v != v else round(v, 3) for v in fitted.tolist()],
+            "stints": stints,
+            "slope": _round(self.car_slope[idx], 4),
+            "confidence": _round(self.car_confidence[idx], 3),
+            "crossoverLap": int(self.crossover[idx]) if self.crossover[idx] > 0 else None,
+            "pitWindow": {"start": start, "end": end},
+            "pitLoss": round(self.pit_loss, 3),
+            "totalLaps": self.total_laps,
+            "trackTemp": [_round(v, 1) for v in self.track_temp[sl][timed].tolist()] if weather else None,
+            "tempCorrected": np.round(self.corrected[sl][timed], 3).tolist() if weather else None,
+            "referenceTrackTemp": self.reference_temp,
+            "trackTempEffect": self.temp_effect,
+        }
+
+
+def _round(value: float, digits: int) -> Optional[float]:
+    return None if value != value else round(float(value), digits)
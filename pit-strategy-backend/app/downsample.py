@@ -0,0 +1,135 @@
+"""
+Visually faithful decimation of long telemetry channels.
+
+Two methods are offered:
+- min/max bucketing keeps the extreme samples of equal-sized row buckets, so spikes
+  (braking points, gear shifts) survive any zoom level;
+- LTTB (largest triangle three buckets) keeps the sample forming the largest
+  triangle with its neighbours, which reads better for smooth channels.
+
+For windows much larger than the requested point count, a per-channel min/max
+pyramid is built once over the whole session (bucket sizes doubling per level) and
+requests are answered from the closest level, so pan/zoom costs O(points) rather
+than O(rows). LTTB then runs on the min/max candidates of that level.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+BASE_BUCKET = 32
+
+
+def _bucket_extremes(values: np.ndarray, lo: int, hi: int, buckets: int) -> np.ndarray:
+    """Indices of the min and max sample of `buckets` equal row buckets over [lo, hi)."""
+    n = hi - lo
+    if n <= 0 or buckets <= 0:
+        return np.empty(0, dtype=np.int64)
+    if n <= buckets * 2:
+        return np.arange(lo, hi, dtype=np.int64)
+    edges = np.linspace(lo, hi, buckets + 1).astype(np.int64)
+    window = np.asarray(values[lo:hi], dtype=np.float64)
+    filled_min = np.where(np.isnan(window), np.inf, window)
+    filled_max = np.where(np.isnan(window), -np.inf, window)
+    starts = edges[:-1] - lo
+    mins = np.minimum.reduceat(filled_min, starts)
+    maxs = np.maximum.reduceat(filled_max, starts)
+    # first position in each bucket holding the bucket min / max
+    bucket_of = np.repeat(np.arange(buckets), np.diff(edges))
+    pos = np.arange(n)
+    min_hit = np.where(filled_min == mins[bucket_of], pos, n)
+    max_hit = np.where(filled_max == maxs[bucket_of], pos, n)
+    min_idx = np.minimum.reduceat(min_hit, starts)
+    max_idx = np.minimum.reduceat(max_hit, starts)
+    picked = np.concatenate([min_idx[min_idx < n], max_idx[max_idx < n]]) + lo
+    return np.unique(picked)
+
+
+class MinMaxPyramid:
+    """
+    Precomputed min/max sample indices of one channel at doubling bucket sizes.
+    Level k holds, per bucket of BASE_BUCKET * 2**k rows, the index of the min and the
+    max sample.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.rows = len(values)
+        self.levels: List[Tuple[np.ndarray, np.ndarray]] = []
+        n_buckets = self.rows // BASE_BUCKET
+        if n_buckets == 0:
+            return
+        full = np.asarray(values, dtype=np.float64)
+        filled_min = np.where(np.isnan(full), np.inf, full)
+        filled_max = np.where(np.isnan(full), -np.inf, full)
+        del full
+        offsets = np.arange(n_buckets) * BASE_BUCKET
+        span = n_buckets * BASE_BUCKET
+        mins = filled_min[:span].reshape(n_buckets, BASE_BUCKET).argmin(axis=1) + offsets
+        maxs = filled_max[:span].reshape(n_buckets, BASE_BUCKET).argmax(axis=1) + offsets
+        self.levels.append((mins, maxs))
+        while len(mins) >= 2:
+            half = len(mins) // 2
+            a, b = mins[: half * 2 : 2], mins[1 : half * 2 : 2]
+            mins = np.where(filled_min[b] < filled_min[a], b, a)
+            a, b = maxs[: half * 2 : 2], maxs[1 : half * 2 : 2]
+            maxs = np.where(filled_max[b] > filled_max[a], b, a)
+            self.levels.append((mins, maxs))
+
+    def indices(self, lo: int, hi: int, points: int) -> np.ndarray:
+        """About `points` sample indices summarising rows [lo, hi)."""
+        buckets = max(1, points // 2)
+        target = (hi - lo) / buckets
+        level = int(np.floor(np.log2(target / BASE_BUCKET))) if target >= BASE_BUCKET else -1
+        level = min(level, len(self.levels) - 1)
+        if level < 0:
+            return _bucket_extremes(self.values, lo, hi, buckets)
+        size = BASE_BUCKET << level
+        first, last = -(-lo // size), hi // size
+        mins, maxs = self.levels[level]
+        inner = np.concatenate([mins[first:last], maxs[first:last]])
+        # partial buckets at the window edges are summarised from the raw rows
+        head = _bucket_extremes(self.values, lo, min(hi, first * size), 1)
+        tail = _bucket_extremes(self.values, max(lo, last * size), hi, 1) if last * size > lo else np.empty(0, dtype=np.int64)
+        picked = np.unique(np.concatenate([head, inner, tail]))
+        if len(picked) > points:
+            sub = _bucket_extremes(np.asarray(self.values)[picked], 0, len(picked), buckets)
+            picked = picked[sub]
+        return picked
+
+    def cache_size(self) -> int:
+        return sum(a.nbytes + b.nbytes for a, b in self.levels) + 1024
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-triangle-three-buckets selection over (x, y); returns positions into x/y."""
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= points or points < 3:
+        return valid
+    xv = np.asarray(x, dtype=np.float64)[valid]
+    yv = np.asarray(y, dtype=np.float64)[valid]
+    m = len(valid)
+    edges = np.linspace(1, m - 1, points - 1).astype(np.int64)
+    out = np.empty(points, dtype=np.int64)
+    out[0], out[-1] = 0, m - 1
+    a = 0
+    for i in range(points - 2):
+        s, e = edges[i], max(edges[i] + 1, edges[i + 1])
+        ns, ne = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else m
+        ne = max(ne, ns + 1)
+        avg_x = xv[ns:ne].mean()
+        avg_y = yv[ns:ne].mean()
+        area = np.abs((xv[a] - avg_x) * (yv[s:e] - yv[a]) - (xv[a] - xv[s:e]) * (avg_y - yv[a]))
+        a = s + int(area.argmax())
+        out[i + 1] = a
+    return valid[out]
+
+
+def decimate(values: np.ndarray, x: np.ndarray, lo: int, hi: int, points: int, method: str, pyramid: MinMaxPyramid) -> np.ndarray:
+    """Row indices into the full channel representing [lo, hi) with about `points` samples."""
+    if hi - lo <= points:
+        return np.arange(lo, hi, dtype=np.int64)
+    if method == "lttb":
+        candidates = pyramid.indices(lo, hi, points * 4)
+        picked = lttb_indices(np.asarray(x)[candidates], np.asarray(values)[candidates], points)
+        return candidates[picked]
+    return pyramid.indices(lo, hi, points)
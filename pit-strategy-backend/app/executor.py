@@ -0,0 +1,137 @@
+"""
+Blocking work off the event loop.
+
+Route handlers parse CSVs, convert sidecars and fit models synchronously; run on
+the event loop, one slow parse would stall every other request on the worker. They
+run instead on a bounded thread pool (`offload`, or the `offloaded` route
+decorator), with the request's contextvars copied into the worker thread.
+
+Identical concurrent calls are coalesced: the first caller starts the work and
+later callers await the same future (single-flight). Each caller waits at most
+its own timeout (RequestTimeout, served as 504). When the last caller has given
+up, the run is flagged as cancelled and long conversions stop at their next
+`checkpoint()`.
+"""
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .metrics import record, span
+
+DEFAULT_TIMEOUT = float(os.getenv("TRACKOTA_REQUEST_TIMEOUT_SECONDS", "30"))
+WORKERS = int(os.getenv("TRACKOTA_WORKER_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+
+class RequestTimeout(Exception):
+    """A request waited longer than its timeout for blocking work."""
+
+
+class Cancelled(Exception):
+    """Raised at a checkpoint once nobody is waiting for the work any more."""
+
+
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("trackota_cancel", default=None)
+
+
+def checkpoint() -> None:
+    """Abort the current offloaded run if every caller has timed out or gone away."""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise Cancelled()
+
+
+class _Flight:
+    def __init__(self, future: "asyncio.Future[Any]", cancel: threading.Event):
+        self.future = future
+        self.cancel = cancel
+        self.waiters = 0
+
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="trackota")
+_flights: Dict[Hashable, _Flight] = {}
+_stats = {"started": 0, "coalesced": 0, "timeouts": 0, "cancelled": 0}
+
+
+def _start(fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> _Flight:
+    cancel = threading.Event()
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def run() -> Any:
+        _cancel_event.set(cancel)
+        record("queue", submitted, time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    future = asyncio.get_running_loop().run_in_executor(_pool, ctx.run, run)
+    # nobody may be left to read an error; mark it retrieved so asyncio does not warn
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _stats["started"] += 1
+    return _Flight(future, cancel)
+
+
+async def offload(fn: Callable[..., Any], *args: Any, key: Optional[Hashable] = None, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """
+    Run fn(*args, **kwargs) on the worker pool and await the result. Calls sharing a
+    non-None `key` while one is in flight share that run.
+    """
+    flight = _flights.get(key) if key is not None else None
+    if flight is None:
+        flight = _start(fn, args, kwargs)
+        if key is not None:
+            _flights[key] = flight
+            flight.future.add_done_callback(lambda _f: _flights.get(key) is flight and _flights.pop(key))
+    else:
+        _stats["coalesced"] += 1
+    flight.waiters += 1
+    try:
+        return await asyncio.wait_for(asyncio.shield(flight.future), DEFAULT_TIMEOUT if timeout is None else timeout)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise RequestTimeout(f"{getattr(fn, '__name__', 'request')} did not finish within the request timeout") from None
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.future.done():
+            flight.cancel.set()
+            _stats["cancelled"] += 1
+            if key is not None and _flights.get(key) is flight:
+                del _flights[key]
+
+
+def offloaded(fn: Optional[Callable[..., Any]] = None, *, timeout: Optional[float] = None):
+    """
+    Route decorator: the plain function runs on the worker pool, and concurrent
+    requests with the same arguments share one run. FastAPI reads the parameters
+    from the wrapped function.
+    """
+
+    def wrap(func: Callable[..., Any]):
+        @functools.wraps(func)
+        async def endpoint(*args: Any, **kwargs: Any) -> Any:
+            key: Optional[Hashable] = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                # request bodies (pydantic models) are not hashable: no coalescing
+                key = None
+            with span("handler"):
+                return await offload(func, *args, key=key, timeout=timeout, **kwargs)
+
+        return endpoint
+
+    return wrap(fn) if fn is not None else wrap
+
+
+def stats() -> Dict[str, Any]:
+    return {"workers": WORKERS, "inFlight": len(_flights), "timeoutSeconds": DEFAULT_TIMEOUT, **_stats}
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool for CPU-bound batches, started from a clean forkserver."""
+    # never fork the server itself: a worker thread may hold a lock the child would inherit
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
@@ -0,0 +1,208 @@
+"""
+Conditional GET and compact encoding for chart payloads.
+
+Chart routes return the same bytes until one of their source files changes. The
+`conditional` route decorator derives a validator from the fingerprints (path,
+mtime, size) of those files before any parsing happens: the ETag hashes the
+fingerprints with the route and its query, Last-Modified is the newest mtime. A
+matching If-None-Match (or If-Modified-Since when no ETag is sent) is answered
+304 without running the handler.
+
+Bodies are serialised straight to bytes with orjson when it is installed (stdlib
+json otherwise), skipping FastAPI's per-element jsonable_encoder walk.
+CompressionMiddleware gzips responses above TRACKOTA_COMPRESS_MIN_BYTES, or
+brotli-compresses them when the optional `brotli` package is installed and the
+client accepts it. `pack_f32` lays numeric arrays out as little-endian float32.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import struct
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+from .executor import offload
+from .parse_cache import fingerprint
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("TRACKOTA_COMPRESS_MIN_BYTES", "1024"))
+F32_MEDIA_TYPE = "application/x-trackota-f32"
+# responses read while they are produced: compressing them would hold chunks back
+STREAMED_MEDIA_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def dumps(payload: Any) -> bytes:
+    """Compact JSON bytes; NaN and numpy scalars/arrays are handled by orjson when present."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), default=_json_default).encode()
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serialisable")
+
+
+def validator(sources: Iterable[Any], *parts: Any) -> Tuple[str, Optional[float]]:
+    """(strong ETag, newest mtime) over the fingerprints of `sources` and any extra key parts."""
+    prints = []
+    for path in sources:
+        if path is None:
+            continue
+        try:
+            prints.append(fingerprint(path))
+        except OSError:
+            continue
+    digest = hashlib.blake2b(repr((sorted(prints), parts)).encode(), digest_size=12).hexdigest()
+    mtime = max((p[1] for p in prints), default=None)
+    return f'"{digest}"', (mtime / 1e9 if mtime is not None else None)
+
+
+def _validate(sources: Callable[..., Iterable[Any]], params: Dict[str, Any], *parts: Any) -> Tuple[str, Optional[float]]:
+    return validator(sources(**params), *parts)
+
+
+def not_modified(request: Request, etag: str, mtime: Optional[float]) -> bool:
+    """RFC 9110 precedence: If-None-Match decides when present, else If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    since = request.headers.get("if-modified-since")
+    if since is None or mtime is None:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def conditional(sources: Callable[..., Iterable[Any]]):
+    """
+    Route decorator (between `@app.get` and `@offloaded`): ETag/Last-Modified from the
+    files `sources(**params)` names, 304 when the client's copy is current, and the
+    handler's dict serialised with `dumps`. Handlers may return a Response instead;
+    one with any status other than 200 is passed through without validators.
+    """
+
+    def wrap(endpoint: Callable[..., Any]):
+        signature = inspect.signature(endpoint)
+
+        @functools.wraps(endpoint)
+        async def handler(request: Request, **params: Any) -> Response:
+            query = tuple(sorted(request.query_params.multi_items()))
+            key = ("validator", request.url.path, query)
+            etag, mtime = await offload(_validate, sources, params, request.url.path, query, key=key)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if mtime is not None:
+                headers["Last-Modified"] = formatdate(mtime, usegmt=True)
+            if not_modified(request, etag, mtime):
+                return Response(status_code=304, headers=headers)
+            body = await endpoint(**params)
+            if isinstance(body, Response):
+                if body.status_code != 200:
+                    # an error must not be revalidated into a cached copy: no validators
+                    return body
+                # coalesced requests share the handler's result: copy rather than mutate it
+                return Response(body.body, status_code=body.status_code, media_type=body.media_type, headers=headers)
+            return Response(dumps(body), media_type="application/json", headers=headers)
+
+        request_param = inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        handler.__signature__ = signature.replace(parameters=[*signature.parameters.values(), request_param])
+        return handler
+
+    return wrap
+
+
+def pack_f32(header: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Binary payload: uint32 LE length of a JSON header, the header (space padded to a
+    multiple of 4 bytes), then every array as little-endian float32 (NaN for gaps).
+    header["arrays"] maps each name to [byte offset from the end of the header, count].
+    """
+    blocks = [np.ascontiguousarray(a, dtype="<f4") for a in arrays.values()]
+    offsets, pos = {}, 0
+    for name, block in zip(arrays, blocks):
+        offsets[name] = [pos, int(block.size)]
+        pos += block.nbytes
+    meta = json.dumps({**header, "arrays": offsets}, separators=(",", ":")).encode()
+    meta += b" " * (-len(meta) % 4)
+    return b"".join([struct.pack("<I", len(meta)), meta, *(b.tobytes() for b in blocks)])
+
+
+class CompressionMiddleware:
+    """
+    gzip (starlette) for bodies of at least `minimum_size` bytes; brotli instead when
+    the `brotli` package is installed and the client sends `Accept-Encoding: br`.
+    Brotli applies to single-chunk bodies. Responses of a STREAMED_MEDIA_TYPES type and
+    paths under an `uncompressed` prefix are never compressed.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES, uncompressed: Tuple[str, ...] = ()):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.uncompressed = uncompressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.uncompressed):
+            await self.app(scope, receive, send)
+            return
+        streamed = False
+
+        async def app(scope, receive, compress_send):
+            async def route_send(message):
+                nonlocal streamed
+                if message["type"] == "http.response.start":
+                    media_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+                    streamed = media_type in STREAMED_MEDIA_TYPES
+                # streamed responses skip the compressor, which would never see their start
+                await (send if streamed else compress_send)(message)
+
+            await self.app(scope, receive, route_send)
+
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is None or "br" not in accept:
+            await GZipMiddleware(app, minimum_size=self.minimum_size)(scope, receive, send)
+            return
+        start: Dict[str, Any] = {}
+
+        async def brotli_send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                return
+            if not start:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if not message.get("more_body") and len(body) >= self.minimum_size and "content-encoding" not in headers:
+                body = brotli.compress(body, quality=4)
+                headers["Content-Encoding"] = "br"
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+            await send(start.copy())
+            start.clear()
+            await send(message)
+
+        await app(scope, receive, brotli_send)
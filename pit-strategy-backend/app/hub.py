@@ -0,0 +1,157 @@
+"""
+Push channel for live sessions (Server-Sent Events).
+
+Viewers subscribe to a topic (dataset folder and vehicle). Each topic has one
+producer task that runs a blocking `poll(state) -> (events, state)` on the worker
+pool every POLL_SECONDS and fans the resulting deltas out to every subscriber, so
+a hundred viewers of a session cost one poll, not a hundred.
+
+Subscribers never block the producer. Each holds at most one pending payload per
+event name: while a slow client has not drained its queue, new laps are merged
+into the pending `laps` event, telemetry samples are appended (keeping only the
+newest MAX_PENDING_SAMPLES) and snapshot events such as `summary` are replaced by
+the newest one. A new subscriber first receives the topic's current snapshot.
+"""
+import asyncio
+import contextlib
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from .executor import offload
+from .http_cache import dumps
+
+POLL_SECONDS = float(os.getenv("TRACKOTA_LIVE_POLL_SECONDS", "1"))
+KEEPALIVE_SECONDS = 15.0
+MAX_PENDING_SAMPLES = 5000
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+Events = List[Tuple[str, Dict[str, Any]]]
+Poll = Callable[[Any], Tuple[Events, Any]]
+
+
+def merge_laps(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Laps by lap number, a later correction of the same lap replacing the earlier one."""
+    laps = {row["lap"]: row for row in old["laps"]}
+    laps.update((row["lap"], row) for row in new["laps"])
+    return {**new, "laps": [laps[k] for k in sorted(laps)]}
+
+
+def merge_samples(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Concatenated telemetry samples, trimmed to the newest MAX_PENDING_SAMPLES."""
+    keep = -MAX_PENDING_SAMPLES
+    series = {k: (old["series"].get(k, []) + v)[keep:] for k, v in new["series"].items()}
+    return {**new, "time": (old["time"] + new["time"])[keep:], "series": series}
+
+
+MERGE: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+    "laps": merge_laps,
+    "telemetry": merge_samples,
+}
+
+
+def sse(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class Subscriber:
+    """One client's pending events, coalesced per event name until it reads them."""
+
+    def __init__(self):
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+
+    def push(self, event: str, data: Dict[str, Any]) -> None:
+        if event in self.pending:
+            merge = MERGE.get(event)
+            self.pending[event] = merge(self.pending[event], data) if merge else data
+            self.coalesced += 1
+        else:
+            self.pending[event] = data
+        self.ready.set()
+
+    async def drain(self, timeout: float) -> Dict[str, Dict[str, Any]]:
+        """Everything pending, waiting up to `timeout` seconds for something to arrive."""
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        self.ready.clear()
+        out, self.pending = self.pending, {}
+        return out
+
+
+class _Topic:
+    def __init__(self, key: Hashable, poll: Poll):
+        self.key = key
+        self.poll = poll
+        self.state: Any = None
+        self.snapshot: Dict[str, Dict[str, Any]] = {}
+        self.subscribers: Set[Subscriber] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.polls = 0
+
+    async def run(self) -> None:
+        while True:
+            try:
+                events, self.state = await offload(self.poll, self.state, key=("live", self.key))
+            except Exception:
+                # a failed poll (file mid-rewrite, timeout) is retried on the next tick
+                events = []
+            self.polls += 1
+            for event, data in events:
+                # telemetry is a stream, not state: new subscribers do not get a backlog
+                if event != "telemetry":
+                    merge = MERGE.get(event)
+                    self.snapshot[event] = merge(self.snapshot[event], data) if merge and event in self.snapshot else data
+                for sub in self.subscribers:
+                    sub.push(event, data)
+            await asyncio.sleep(POLL_SECONDS)
+
+
+class Hub:
+    """Topics with at least one subscriber, each with its own producer task."""
+
+    def __init__(self):
+        self._topics: Dict[Hashable, _Topic] = {}
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, key: Hashable, poll: Poll) -> AsyncIterator[Subscriber]:
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = self._topics[key] = _Topic(key, poll)
+            topic.task = asyncio.get_running_loop().create_task(topic.run())
+        sub = Subscriber()
+        for event, data in topic.snapshot.items():
+            sub.push(event, data)
+        topic.subscribers.add(sub)
+        try:
+            yield sub
+        finally:
+            topic.subscribers.discard(sub)
+            if not topic.subscribers and self._topics.get(key) is topic:
+                del self._topics[key]
+                topic.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "topics": len(self._topics),
+            "subscribers": sum(len(t.subscribers) for t in self._topics.values()),
+            "polls": sum(t.polls for t in self._topics.values()),
+            "coalesced": sum(s.coalesced for t in self._topics.values() for s in t.subscribers),
+        }
+
+
+hub = Hub()
+
+
+async def stream(sub: Subscriber, select: Callable[[str, Dict[str, Any]], Optional[Dict[str, Any]]] = lambda e, d: d) -> AsyncIterator[bytes]:
+    """SSE frames of a subscriber's events (`select` may trim or drop one per client), with keep-alive comments."""
+    yield b"retry: 2000\n\n"
+    while True:
+        pending = await sub.drain(KEEPALIVE_SECONDS)
+        if not pending:
+            yield b": keep-alive\n\n"
+            continue
+        for event, data in pending.items():
+            data = select(event, data)
+            if data is not None:
+                yield sse(event, data)
@@ -0,0 +1,256 @@
+"""
+Per-vehicle lap tables.
+
+GR timing exports (`*_lap_time_*`, `*_lap_start_time_*`, `*_lap_end_time_*`) hold one
+row per vehicle and lap, sourced from a message stream: the same lap can be sent
+more than once, late corrections arrive with a newer `meta_time`, and placeholder
+rows carry lap 32768 or a value of a few milliseconds. A LapTable resolves all of
+that in one pass and stores the whole field as flat arrays grouped by vehicle
+(CSR-style offsets), so any car's laps are a slice rather than a re-parse.
+"""
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .csv_reader import read_columns, to_epoch, to_numbers
+from .degradation import FUEL_EFFECT, MIN_FIT_LAPS, OUTLIER_RATIO
+
+# lap numbers at or above this are sentinel values from the timing feed
+MAX_LAP = 32768
+# anything quicker is a placeholder row rather than a real lap
+MIN_LAP_SECONDS = 20.0
+# laps this much quicker than the field median are partial laps (retirements, timing glitches)
+SHORT_LAP_RATIO = 0.9
+
+GR_REQUIRED = ("vehicle_id", "lap", "value")
+GR_COLUMNS = {
+    "vehicle": ["vehicle_id"],
+    "lap": ["lap"],
+    "value": ["value"],
+    "meta": ["meta_time", "timestamp"],
+    "expire": ["expire_at"],
+}
+
+
+class LapFileError(ValueError):
+    """A lap-time file without the GR columns a lap table is built from."""
+
+
+class LapTable:
+    """Laps of every vehicle, sorted by vehicle then lap number."""
+
+    def __init__(self, vehicles: List[str], offsets: np.ndarray, laps: np.ndarray, times: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        self.vehicles = vehicles
+        self.offsets = offsets
+        self.laps = laps
+        self.times = times
+        self.starts = starts
+        self.ends = ends
+        self._index = {v: i for i, v in enumerate(vehicles)}
+
+    @classmethod
+    def from_series(cls, times: List[float]) -> "LapTable":
+        """Single unnamed vehicle from a plain lap-time series (non GR files)."""
+        n = len(times)
+        nan = np.full(n, np.nan)
+        return cls(
+            [""] if n else [],
+            np.array([0, n] if n else [0], dtype=np.int64),
+            np.arange(1, n + 1, dtype=np.int32),
+            np.asarray(times, dtype=np.float64),
+            nan,
+            nan.copy(),
+        )
+
+    def index_of(self, vehicle: Optional[str]) -> Optional[int]:
+        """Vehicle index by full id ("GR86-004-78") or car number ("78")."""
+        if vehicle is None:
+            return None
+        idx = self._index.get(vehicle)
+        if idx is not None:
+            return idx
+        wanted = vehicle.strip().lstrip("0") or "0"
+        for i, v in enumerate(self.vehicles):
+            if (car_number(v).lstrip("0") or "0") == wanted:
+                return i
+        return None
+
+    def default_vehicle(self) -> Optional[int]:
+        """Vehicle with the most laps (ties: first by id), used when none is requested."""
+        if not self.vehicles:
+            return None
+        counts = np.diff(self.offsets)
+        return int(np.argmax(counts))
+
+    def rows(self, idx: int) -> slice:
+        return slice(int(self.offsets[idx]), int(self.offsets[idx + 1]))
+
+    def plausible(self) -> np.ndarray:
+        """Row mask of timed laps that are not implausibly short for this field."""
+        timed = ~np.isnan(self.times)
+        if not timed.any():
+            return timed
+        return timed & (self.times >= SHORT_LAP_RATIO * np.median(self.times[timed]))
+
+    def lap_times(self, idx: int, plausible_only: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """(lap numbers, lap times in seconds) of one vehicle, laps without a time dropped."""
+        sl = self.rows(idx)
+        laps, times = self.laps[sl], self.times[sl]
+        keep = self.plausible()[sl] if plausible_only else ~np.isnan(times)
+        return laps[keep], times[keep]
+
+    def lap_counts(self) -> np.ndarray:
+        """Highest lap number with a known end time (or lap time) per vehicle."""
+        out = np.zeros(len(self.vehicles), dtype=np.int64)
+        for i in range(len(self.vehicles)):
+            sl = self.rows(i)
+            done = ~np.isnan(self.ends[sl]) | ~np.isnan(self.times[sl])
+            if done.any():
+                out[i] = int(self.laps[sl][done].max())
+        return out
+
+    def best_laps(self) -> np.ndarray:
+        """Best plausible lap time per vehicle (NaN when a car has none)."""
+        if not len(self.times):
+            return np.full(len(self.vehicles), np.nan)
+        filled = np.where(self.plausible(), self.times, np.inf)
+        starts = np.minimum(self.offsets[:-1], len(filled) - 1)
+        best = np.minimum.reduceat(filled, starts)
+        best[np.diff(self.offsets) == 0] = np.inf
+        return np.where(np.isinf(best), np.nan, best)
+
+    def last_laps(self) -> np.ndarray:
+        """Time of each vehicle's most recent timed lap (NaN when a car has none)."""
+        out = np.full(len(self.vehicles), np.nan)
+        for i in range(len(self.vehicles)):
+            times = self.times[self.rows(i)]
+            timed = np.flatnonzero(~np.isnan(times))
+            if timed.size:
+                out[i] = times[timed[-1]]
+        return out
+
+    def degradation(self) -> np.ndarray:
+        """Running degradation per vehicle in seconds per lap (see `lap_trend`)."""
+        return np.array([lap_trend(self.laps[self.rows(i)], self.times[self.rows(i)]) for i in range(len(self.vehicles))])
+
+    def end_of_lap(self, idx: int, lap: int) -> float:
+        sl = self.rows(idx)
+        pos = np.searchsorted(self.laps[sl], lap)
+        if pos < sl.stop - sl.start and self.laps[sl][pos] == lap:
+            return float(self.ends[sl][pos])
+        return float("nan")
+
+    def standings(self) -> List[int]:
+        """Vehicle indices in running order: most laps first, then earliest finish of that lap."""
+        counts = self.lap_counts()
+        finish = np.array([self.end_of_lap(i, int(c)) for i, c in enumerate(counts)])
+        finish = np.where(np.isnan(finish), np.inf, finish)
+        return [int(i) for i in np.lexsort((finish, -counts))]
+
+
+def lap_trend(laps: np.ndarray, times: np.ndarray) -> float:
+    """
+    Fuel-corrected seconds per lap a car is losing over its laps so far, with the
+    opening lap and gross outliers (pit, caution laps) left out; NaN with too few laps.
+    """
+    ok = ~np.isnan(times) & (laps > 1)
+    laps, times = laps[ok], times[ok]
+    if laps.size < MIN_FIT_LAPS:
+        return float("nan")
+    median = np.median(times)
+    keep = np.abs(times - median) <= OUTLIER_RATIO * median
+    laps, times = laps[keep].astype(np.float64), times[keep]
+    if laps.size < MIN_FIT_LAPS or laps.min() == laps.max():
+        return float("nan")
+    return float(np.polyfit(laps, times + FUEL_EFFECT * (laps - 1), 1)[0])
+
+
+def car_number(vehicle_id: str) -> str:
+    """Car number from a GR vehicle id: GR86-004-78 -> "78"."""
+    return vehicle_id.rsplit("-", 1)[-1] if vehicle_id else ""
+
+
+def is_gr_lap_file(headers: List[str]) -> bool:
+    return all(h in headers for h in GR_REQUIRED)
+
+
+def _read_gr_rows(csv_path: Path, value_is_time: bool) -> Optional[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Resolve the (vehicle, lap) rows of a GR timing file to one value each.
+    Returns (vehicle ids, vehicle codes, laps, values) with values as seconds (lap times)
+    or epoch seconds (start/end timestamps); None when the file lacks a required column.
+    """
+    cols = read_columns(csv_path, GR_COLUMNS)
+    if not all(k in cols for k in ("vehicle", "lap", "value")):
+        return None
+    lap_f = to_numbers(cols["lap"])
+    ok = (lap_f > 0) & (lap_f < MAX_LAP)
+    vehicles, v = np.unique(np.asarray(cols["vehicle"], dtype=str)[ok], return_inverse=True)
+    vehicles = vehicles.tolist()
+    v = v.astype(np.int64).reshape(-1)
+    lap_arr = lap_f[ok].astype(np.int64)
+    val_arr = (to_numbers if value_is_time else to_epoch)(cols["value"])[ok]
+    meta_arr = to_epoch(cols["meta"])[ok] if "meta" in cols else np.arange(len(v), dtype=np.float64)
+    exp_arr = to_epoch(cols["expire"])[ok] if "expire" in cols else np.full(len(v), np.nan)
+
+    if value_is_time and val_arr.size:
+        # GR lap times are milliseconds
+        if np.nanmedian(val_arr) > 1000:
+            val_arr = val_arr / 1000.0
+        keep = val_arr >= MIN_LAP_SECONDS
+    else:
+        keep = ~np.isnan(val_arr)
+    # rows already expired by the time of the newest message in the file
+    if meta_arr.size:
+        newest = np.nanmax(meta_arr) if not np.all(np.isnan(meta_arr)) else np.inf
+        keep &= ~(exp_arr <= newest)
+    v, lap_arr, val_arr, meta_arr = v[keep], lap_arr[keep], val_arr[keep], meta_arr[keep]
+
+    # latest message per (vehicle, lap) wins
+    order = np.lexsort((np.nan_to_num(meta_arr, nan=-np.inf), lap_arr, v))
+    v, lap_arr, val_arr = v[order], lap_arr[order], val_arr[order]
+    last = np.ones(len(v), dtype=bool)
+    if len(v):
+        last[:-1] = (v[1:] != v[:-1]) | (lap_arr[1:] != lap_arr[:-1])
+    return vehicles, v[last], lap_arr[last], val_arr[last]
+
+
+def build_lap_table(lap_time_path: Optional[Path], start_path: Optional[Path] = None, end_path: Optional[Path] = None) -> LapTable:
+    """
+    Join lap times with lap start/end timestamps into one per-vehicle table. A start or
+    end file without the GR columns counts as absent; such a lap-time file is a LapFileError.
+    """
+    sources = [(lap_time_path, True), (start_path, False), (end_path, False)]
+    parsed = [(_read_gr_rows(p, is_time) if p else None) for p, is_time in sources]
+    if lap_time_path and parsed[0] is None:
+        raise LapFileError(f"{lap_time_path.name} has no {', '.join(GR_REQUIRED)} columns")
+
+    names = sorted({name for part in parsed if part for name in part[0]})
+    code_of = {name: i for i, name in enumerate(names)}
+    keyed = []
+    for part in parsed:
+        if part is None:
+            keyed.append((np.empty(0, dtype=np.int64), np.empty(0)))
+            continue
+        local_names, v, lap, val = part
+        remap = np.array([code_of[n] for n in local_names], dtype=np.int64)
+        global_v = remap[v] if len(v) else v
+        keyed.append((global_v * MAX_LAP + lap, val))
+
+    all_keys = np.unique(np.concatenate([k for k, _ in keyed])) if keyed else np.empty(0, dtype=np.int64)
+    columns = []
+    for keys, vals in keyed:
+        col = np.full(len(all_keys), np.nan)
+        if len(keys):
+            col[np.searchsorted(all_keys, keys)] = vals
+        columns.append(col)
+    times, starts, ends = columns
+    # laps with timestamps but no lap-time row
+    derived = ends - starts
+    fill = np.isnan(times) & (derived >= MIN_LAP_SECONDS)
+    times[fill] = derived[fill]
+
+    vehicle_codes = all_keys // MAX_LAP
+    offsets = np.searchsorted(vehicle_codes, np.arange(len(names) + 1)).astype(np.int64)
+    return LapTable(names, offsets, (all_keys % MAX_LAP).astype(np.int32), times, starts, ends)
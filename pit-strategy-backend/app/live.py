@@ -0,0 +1,358 @@
+"""
+Tail-follow ingestion of growing GR timing files.
+
+During a live session the `*_lap_time_*`, `*_lap_start_time_*` and `*_lap_end_time_*`
+exports keep growing. A LiveSession follows one session's three files: each poll
+stats them and reads only the bytes appended after the last complete line, so a
+poll costs O(new rows) however long the race has run. A replaced or truncated file
+restarts the session from byte 0. An unterminated last line is held back until its
+newline arrives, or until the file has been idle for SETTLE_SECONDS (exports that
+simply end without one).
+
+Appended rows are resolved like build_lap_table (latest message per vehicle and
+lap wins, placeholder and expired rows dropped), and only vehicles that received
+rows have their lap arrays and aggregates (laps run, finish time, best and last
+lap, running degradation) rebuilt. `table()` returns a LiveTable: a LapTable whose
+lap counts, best laps, last laps, standings and degradation come from those
+aggregates instead of a pass over the whole field.
+"""
+import bisect
+import csv
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .csv_reader import pick_column, sniff_delimiter, to_epoch, to_numbers
+from .laps import GR_COLUMNS, MAX_LAP, MIN_LAP_SECONDS, SHORT_LAP_RATIO, LapTable, lap_trend
+from .metrics import count_read, span
+
+FOLLOW = os.getenv("TRACKOTA_LIVE_FOLLOW", "1") != "0"
+# an unterminated last line counts as a row once the file has not changed for this long
+SETTLE_SECONDS = 2.0
+# files unchanged for longer than this belong to a finished session: parsed once, not followed
+QUIET_SECONDS = float(os.getenv("TRACKOTA_LIVE_QUIET_SECONDS", "600"))
+MAX_SESSIONS = 32
+# files whose last (size, mtime) is remembered to tell growing files from fresh copies
+MAX_WATCHED = 1024
+
+# sources of a session: lap times, lap start and lap end timestamps
+TIME, START, END = 0, 1, 2
+
+
+class _Tail:
+    """Read position in one followed CSV: offset of the first unread line, plus its header."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.pending = False
+        self.delimiter = ","
+        self.headers: List[str] = []
+        self._ident: Optional[Tuple[int, int]] = None
+        self._version: Optional[Tuple[int, int]] = None
+
+    def read(self) -> Tuple[bool, List[List[str]]]:
+        """(restarted, complete rows appended since the last read); restarted when the file was replaced or truncated."""
+        try:
+            st = self.path.stat()
+        except OSError:
+            return False, []
+        ident, version = (st.st_dev, st.st_ino), (st.st_size, st.st_mtime_ns)
+        restarted = self._ident is not None and (ident != self._ident or st.st_size < self.offset)
+        if restarted:
+            self.offset, self.headers = 0, []
+        elif version == self._version and not self.pending:
+            return False, []
+        self._ident, self._version = ident, version
+
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(st.st_size - self.offset)
+        end = chunk.rfind(b"\n") + 1
+        if end < len(chunk) and time.time() - st.st_mtime >= SETTLE_SECONDS:
+            end = len(chunk)
+        self.pending = end < len(chunk)
+        self.offset += end
+        lines = chunk[:end].decode("utf-8", errors="ignore").splitlines()
+        if not self.headers and lines:
+            first = lines.pop(0).lstrip("\ufeff")
+            self.delimiter = sniff_delimiter(first)
+            self.headers = [h.strip() for h in next(csv.reader([first], delimiter=self.delimiter), [])]
+        rows = [row for row in csv.reader(lines, delimiter=self.delimiter) if row]
+        count_read(len(rows), end)
+        return restarted, rows
+
+
+class _Source:
+    """Messages of one followed file per (vehicle, lap), enough to re-resolve a key on its own."""
+
+    def __init__(self, path: Path, kind: int):
+        self.tail = _Tail(path)
+        self.kind = kind
+        self.seq = 0
+        # newest message time seen in the file; rows expiring at or before it are dropped
+        self.newest: Optional[float] = None
+        # lap times arrive in ms or s; decided from the first rows, like the batch parser
+        self.millis: Optional[bool] = None
+        # (vehicle, lap) -> [best non-expiring candidate, [(candidate, expire_at), ...]]
+        self.messages: Dict[Tuple[str, int], list] = {}
+        self.expiring: Set[Tuple[str, int]] = set()
+
+    def horizon(self) -> float:
+        return self.newest if self.newest is not None else np.inf
+
+    def ingest(self, rows: List[List[str]], vehicles: Set[str]) -> Set[Tuple[str, int]]:
+        """Add appended rows; returns the (vehicle, lap) keys whose winner may have changed."""
+        headers = self.tail.headers
+        idx = {name: headers.index(col) for name, aliases in GR_COLUMNS.items() if (col := pick_column(headers, aliases))}
+        if not all(k in idx for k in ("vehicle", "lap", "value")):
+            return set()
+        width = max(idx.values()) + 1
+        rows = [row for row in rows if len(row) >= width]
+        col = lambda name: [row[idx[name]] for row in rows]
+
+        lap_f = to_numbers(col("lap"))
+        ok = (lap_f > 0) & (lap_f < MAX_LAP)
+        names = np.asarray(col("vehicle"), dtype=str)[ok].tolist()
+        laps = lap_f[ok].astype(np.int64).tolist()
+        values = (to_numbers if self.kind == TIME else to_epoch)(col("value"))[ok]
+        n = len(laps)
+        meta = to_epoch(col("meta"))[ok] if "meta" in idx else np.full(n, np.nan)
+        expire = to_epoch(col("expire"))[ok] if "expire" in idx else np.full(n, np.nan)
+
+        if self.kind == TIME:
+            if self.millis is None and not np.all(np.isnan(values)):
+                self.millis = bool(np.nanmedian(values) > 1000)
+            if self.millis:
+                values = values / 1000.0
+            keep = values >= MIN_LAP_SECONDS
+        else:
+            keep = ~np.isnan(values)
+        if not np.all(np.isnan(meta)):
+            newest = float(np.nanmax(meta))
+            self.newest = newest if self.newest is None else max(self.newest, newest)
+
+        vehicles.update(names)
+        changed: Set[Tuple[str, int]] = set()
+        order = np.nan_to_num(meta, nan=-np.inf).tolist()
+        for name, lap, value, m, e, k in zip(names, laps, values.tolist(), order, expire.tolist(), keep.tolist()):
+            self.seq += 1
+            if not k:
+                continue
+            key = (name, lap)
+            state = self.messages.setdefault(key, [None, []])
+            # (meta time, row sequence, value): the greatest current candidate wins
+            cand = (m, self.seq, value)
+            if e == e:
+                state[1].append((cand, e))
+                self.expiring.add(key)
+            elif state[0] is None or cand > state[0]:
+                state[0] = cand
+            changed.add(key)
+        return changed
+
+    def winner(self, key: Tuple[str, int]) -> float:
+        """Resolved value of a (vehicle, lap), NaN when every message was a placeholder or has expired."""
+        state = self.messages.get(key)
+        if state is None:
+            return np.nan
+        horizon = self.horizon()
+        cands = [c for c, e in state[1] if not e <= horizon]
+        if state[0] is not None:
+            cands.append(state[0])
+        return max(cands)[2] if cands else np.nan
+
+
+class _Car:
+    """Resolved laps of one vehicle ([time, start, end] per lap number) and its arrays."""
+
+    def __init__(self):
+        self.laps: Dict[int, List[float]] = {}
+        self.arrays: Tuple[np.ndarray, ...] = (np.empty(0, dtype=np.int32), np.empty(0), np.empty(0), np.empty(0))
+        self.sorted_times: List[float] = []
+        self.count = 0
+        self.finish = np.nan
+        self.last = np.nan
+        self.trend = np.nan
+
+    def rebuild(self) -> None:
+        """Lap arrays and aggregates from the resolved laps; runs only for vehicles with new rows."""
+        laps = sorted(self.laps)
+        vals = np.array([self.laps[lap] for lap in laps], dtype=np.float64).reshape(-1, 3)
+        times, starts, ends = vals[:, TIME].copy(), vals[:, START].copy(), vals[:, END].copy()
+        # laps with timestamps but no lap-time row
+        derived = ends - starts
+        fill = np.isnan(times) & (derived >= MIN_LAP_SECONDS)
+        times[fill] = derived[fill]
+        lap_arr = np.asarray(laps, dtype=np.int32)
+        self.arrays = (lap_arr, times, starts, ends)
+
+        timed = ~np.isnan(times)
+        done = np.flatnonzero(~np.isnan(ends) | timed)
+        self.count = int(lap_arr[done[-1]]) if done.size else 0
+        self.finish = float(ends[done[-1]]) if done.size else np.nan
+        self.last = float(times[timed][-1]) if timed.any() else np.nan
+        self.sorted_times = np.sort(times[timed]).tolist()
+        self.trend = lap_trend(lap_arr, times)
+
+
+class LiveTable(LapTable):
+    """LapTable snapshot of a followed session with its per-vehicle aggregates precomputed."""
+
+    def __init__(self, cars: List[Tuple[str, _Car]]):
+        parts = [car.arrays for _, car in cars]
+        counts = [len(p[0]) for p in parts]
+        concat = lambda i, dtype: np.concatenate([p[i] for p in parts]) if parts else np.empty(0, dtype=dtype)
+        super().__init__(
+            [name for name, _ in cars],
+            np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            concat(0, np.int32),
+            concat(1, np.float64),
+            concat(2, np.float64),
+            concat(3, np.float64),
+        )
+        timed = self.times[~np.isnan(self.times)]
+        floor = SHORT_LAP_RATIO * float(np.median(timed)) if timed.size else np.inf
+        best = []
+        for _, car in cars:
+            # the fastest lap no quicker than the field's plausibility floor
+            pos = bisect.bisect_left(car.sorted_times, floor)
+            best.append(car.sorted_times[pos] if pos < len(car.sorted_times) else np.nan)
+        self._counts = np.array([car.count for _, car in cars], dtype=np.int64)
+        self._finish = np.array([car.finish for _, car in cars], dtype=np.float64)
+        self._best = np.array(best, dtype=np.float64)
+        self._last = np.array([car.last for _, car in cars], dtype=np.float64)
+        self._trend = np.array([car.trend for _, car in cars], dtype=np.float64)
+
+    def lap_counts(self) -> np.ndarray:
+        return self._counts.copy()
+
+    def best_laps(self) -> np.ndarray:
+        return self._best.copy()
+
+    def last_laps(self) -> np.ndarray:
+        return self._last.copy()
+
+    def degradation(self) -> np.ndarray:
+        return self._trend.copy()
+
+    def standings(self) -> List[int]:
+        finish = np.where(np.isnan(self._finish), np.inf, self._finish)
+        return [int(i) for i in np.lexsort((finish, -self._counts))]
+
+
+class LiveSession:
+    """One session's lap-time file and its lap start/end files, followed together."""
+
+    def __init__(self, lap_time_path: Path, start_path: Optional[Path], end_path: Optional[Path]):
+        self._paths = (lap_time_path, start_path, end_path)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._sources = [_Source(p, kind) for kind, p in enumerate(self._paths) if p is not None]
+        self._vehicles: Set[str] = set()
+        self._cars: Dict[str, _Car] = {}
+        self._table: Optional[LiveTable] = None
+
+    def poll(self) -> bool:
+        """Ingest whatever was appended since the last poll; True when anything changed."""
+        with self._lock, span("follow"):
+            reads = [src.tail.read() for src in self._sources]
+            if any(restarted for restarted, _ in reads):
+                self._reset()
+                reads = [src.tail.read() for src in self._sources]
+            dirty: Set[Tuple[str, int]] = set()
+            before = len(self._vehicles)
+            for src, (_, rows) in zip(self._sources, reads):
+                if not rows:
+                    continue
+                horizon = src.horizon()
+                changed = src.ingest(rows, self._vehicles)
+                if src.horizon() != horizon:
+                    # a newer message can expire rows that were still current
+                    changed |= src.expiring
+                dirty |= {(src.kind, key) for key in changed}
+            if not dirty and len(self._vehicles) == before:
+                return False
+            self._apply(dirty)
+            return True
+
+    def _apply(self, dirty: Set[Tuple[int, Tuple[str, int]]]) -> None:
+        by_kind = {src.kind: src for src in self._sources}
+        touched: Set[str] = set()
+        for kind, (name, lap) in dirty:
+            car = self._cars.setdefault(name, _Car())
+            row = car.laps.setdefault(lap, [np.nan, np.nan, np.nan])
+            row[kind] = by_kind[kind].winner((name, lap))
+            if all(v != v for v in row):
+                del car.laps[lap]
+            touched.add(name)
+        for name in self._vehicles:
+            car = self._cars.setdefault(name, _Car())
+            if name in touched:
+                car.rebuild()
+        self._table = None
+
+    def table(self) -> LiveTable:
+        """Current snapshot, after ingesting anything appended since the last call."""
+        self.poll()
+        with self._lock:
+            if self._table is None:
+                self._table = LiveTable([(name, self._cars[name]) for name in sorted(self._vehicles)])
+            return self._table
+
+
+_sessions: "OrderedDict[Tuple[str, ...], LiveSession]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+# path -> ((size, mtime ns) at the last check, whether it was ever seen to change)
+_watched: "OrderedDict[str, Tuple[Tuple[int, int], bool]]" = OrderedDict()
+_watched_lock = threading.Lock()
+
+
+def is_live(*paths: Optional[Path]) -> bool:
+    """
+    Whether any of the files belongs to a running session: it changed between two checks
+    and its last change is within QUIET_SECONDS. A dataset just copied or unpacked has
+    recent mtimes but does not grow, so it is parsed once like a finished session.
+    """
+    now = time.time()
+    live = False
+    with _watched_lock:
+        for path in paths:
+            if path is None:
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            key = str(path)
+            version = (st.st_size, st.st_mtime_ns)
+            seen = _watched.get(key)
+            changed = seen is not None and (seen[1] or seen[0] != version)
+            _watched[key] = (version, changed)
+            _watched.move_to_end(key)
+            live = live or (changed and now - st.st_mtime < QUIET_SECONDS)
+        while len(_watched) > MAX_WATCHED:
+            _watched.popitem(last=False)
+    return live
+
+
+def live_session(lap_time_path: Path, start_path: Optional[Path] = None, end_path: Optional[Path] = None) -> LiveSession:
+    """The followed session of these files, created on first use (least recently used dropped past MAX_SESSIONS)."""
+    key = tuple(str(p.resolve()) if p else "" for p in (lap_time_path, start_path, end_path))
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = LiveSession(lap_time_path, start_path, end_path)
+            while len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        _sessions.move_to_end(key)
+        return session
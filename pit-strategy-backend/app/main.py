@@ -1,12 +1,74 @@
+import asyncio
+import contextlib
+import functools
+import logging
 import os
 from typing import Optional, List, Dict, Tuple
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pathlib import Path
-from pydantic import BaseModel
-import csv
+from pydantic import BaseModel, Field
+import posixpath
+import numpy as np
 
-app = FastAPI(title="Trackota Pit Strategy API")
+from .analysis import AnalysisTable, read_analysis
+from .archive import DatasetPath, ZipMember, dataset_path
+from .catalog import DatasetCatalog, derived_dir, get_catalog, normalise_rel
+from .csv_reader import pick_column, read_columns, read_header, to_epoch, to_numbers
+from .degradation import DegradationModel
+from .downsample import MinMaxPyramid, decimate
+from .executor import RequestTimeout, offload, offloaded, stats as executor_stats
+from .http_cache import F32_MEDIA_TYPE, CompressionMiddleware, conditional, dumps, pack_f32
+from .hub import MAX_PENDING_SAMPLES, SSE_HEADERS, hub, sse as sse_frame, stream as sse_stream
+from .laps import LapFileError, LapTable, build_lap_table, is_gr_lap_file
+from .live import FOLLOW, is_live, live_session
+from .metrics import MetricsMiddleware, render as render_metrics, span
+from .parse_cache import fingerprint, parse_cache
+from .optimiser import optimise, plan_risk
+from .overlay import KMH_TO_MS, MIN_LAP_SAMPLES, MPH_TO_MS, LapTrace, lap_bounds, overlay, resample_lap, segment
+from .season import METRICS, SeasonAggregate, in_pool as season_in_pool
+from .sectors import LEVELS, SECTIONS, SectorTable, read_sectors, rounded
+from .simulation import COMPOUNDS, Calibration, run_batch, summarise
+from .store import AnalyticsStore, open_store
+from .telemetry import (
+    LAP_COLUMNS,
+    SERIES_CHANNELS,
+    TELEMETRY_FIELDS,
+    TelemetrySidecar,
+    first_vehicle,
+    is_long_format,
+    open_sidecar,
+    open_vehicle_sidecar,
+    read_headers,
+    vehicle_sidecar_token,
+)
+from .weather import WeatherSeries, read_weather
+
+# persist parsed results across restarts, and parse every session in the background at startup
+STORE = os.getenv("TRACKOTA_STORE", "1") != "0"
+WARM_UP = os.getenv("TRACKOTA_WARM_UP", "1") != "0"
+# warm-up parses one session at a time and is not held to the request timeout
+WARM_TIMEOUT = 3600.0
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STORE:
+        parse_cache.store = await offload(_open_store)
+    warm = asyncio.get_running_loop().create_task(_warm_up()) if WARM_UP else None
+    try:
+        yield
+    finally:
+        if warm is not None:
+            warm.cancel()
+
+
+app = FastAPI(title="Trackota Pit Strategy API", lifespan=lifespan)
+log = logging.getLogger("trackota")
+
+# placeholder lap times served when no dataset provides any
+DEMO_LAP_TIMES = [93.2, 92.9, 92.7, 92.6, 92.5, 92.8, 93.1, 93.4, 93.9, 94.2, 94.7, 95.1, 95.6, 96.0, 96.4, 96.8, 97.2, 97.5, 97.9, 98.3, 98.8, 99.1, 99.5, 99.9]
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +77,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# event streams are flushed frame by frame, never buffered by a compressor
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -22,278 +87,360 @@ async def root():
     return {"status": "ok"}
 
 
+@app.exception_handler(RequestTimeout)
+async def request_timeout(request: Request, exc: RequestTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.exception_handler(LapFileError)
+async def lap_file_error(request: Request, exc: LapFileError):
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and memory use of the shared parse cache, plus worker pool counters."""
+    store = parse_cache.store
+    return {**parse_cache.stats(), "executor": executor_stats(), "live": hub.stats(), "store": store.stats() if store else None}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text metrics: request/stage/parse histograms, rows and bytes read, cache and pool state."""
+    cache = parse_cache.stats()
+    pool = executor_stats()
+    live = hub.stats()
+    extra = {
+        "trackota_parse_cache_hits_total": ("counter", "Parse cache hits.", cache["hits"]),
+        "trackota_parse_cache_misses_total": ("counter", "Parse cache misses (files parsed or read from the store).", cache["misses"]),
+        "trackota_store_loads_total": ("counter", "Parse cache misses answered from the persistent store.", cache["storeLoads"]),
+        "trackota_parse_cache_hit_ratio": ("gauge", "Parse cache hits / lookups.", cache["hitRatio"]),
+        "trackota_parse_cache_bytes": ("gauge", "Estimated memory held by the parse cache.", cache["bytes"]),
+        "trackota_parse_cache_evictions_total": ("counter", "Parse cache evictions.", cache["evictions"]),
+        "trackota_executor_in_flight": ("gauge", "Offloaded runs in flight.", pool["inFlight"]),
+        "trackota_executor_coalesced_total": ("counter", "Requests that joined an identical run in flight.", pool["coalesced"]),
+        "trackota_executor_timeouts_total": ("counter", "Requests that hit the request timeout.", pool["timeouts"]),
+        "trackota_live_topics": ("gauge", "Live topics with a producer running.", live["topics"]),
+        "trackota_live_subscribers": ("gauge", "Connected live-stream clients.", live["subscribers"]),
+    }
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/strategy/summary")
-async def get_summary(file: Optional[str] = Query(default=None), folder: Optional[str] = Query(default=None)):
-    base = _datasets_base()
+@offloaded
+def get_summary(file: Optional[str] = Query(default=None), folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
     # Default to first available dataset folder when none provided
     if not file and not folder:
         folder = _first_dataset_folder()
+    return _summary(folder, file, vehicle)
 
-    times: List[float] = []
-    if folder:
-        folder_path = (base / folder).resolve()
-        if str(folder_path).startswith(str(base.resolve())) and folder_path.is_dir():
-            candidate = None
-            for p in folder_path.rglob("*.csv"):
-                if p.name.lower().startswith("lap_times"):
-                    candidate = p
-                    break
-            if not candidate:
-                for p in folder_path.rglob("*.csv"):
-                    candidate = p
-                    if candidate:
-                        break
-            if candidate:
-                times = _extract_lap_times(candidate)
-    elif file:
-        file_path = (base / file).resolve()
-        if str(file_path).startswith(str(base.resolve())) and file_path.is_file():
-            if file_path.suffix.lower() == ".csv":
-                times = _extract_lap_times(file_path)
 
-    total_laps = len(times)
+def _summary(folder: Optional[str], file: Optional[str], vehicle: Optional[str]) -> Dict:
+    table = _session_laps(folder, file)
+    idx = _pick_vehicle(table, vehicle)
+    current_lap = total_laps = 0
+    position = gap_ahead = gap_behind = last_lap = best_lap = trend = None
+    stamp = None
+    if idx is not None:
+        counts = table.lap_counts()
+        current_lap = int(counts[idx])
+        total_laps = int(counts.max())
+        last_lap = _round_or_none(table.last_laps()[idx], 3)
+        best_lap = _round_or_none(table.best_laps()[idx], 3)
+        trend = _round_or_none(table.degradation()[idx], 4)
+        ends = table.ends[table.rows(idx)]
+        stamp = float(np.nanmax(ends)) if np.isfinite(ends).any() else None
+        if table.vehicles[idx]:
+            order = table.standings()
+            pos = order.index(idx)
+            position = pos + 1
+            mine = table.end_of_lap(idx, current_lap)
+            if pos > 0:
+                gap_ahead = _gap(table.end_of_lap(order[pos - 1], current_lap), mine)
+            if pos + 1 < len(order):
+                gap_behind = _gap(table.end_of_lap(order[pos + 1], current_lap), mine)
+
+    # conditions as the car last crossed the line, else the newest sample
+    series = _cached_weather(_weather_file(folder, file))
+    conditions = series.latest(stamp) if series is not None else None
+
     # Minimal dataset-derived summary; other fields left null for frontend placeholders
     return {
-        "currentLap": total_laps or None,
+        "currentLap": current_lap or None,
         "totalLaps": total_laps or None,
         "session": "Race",
-        "weather": None,
-        "position": None,
-        "gapAhead": None,
-        "gapBehind": None,
+        "weather": _weather_text(conditions),
+        "conditions": conditions,
+        "position": position,
+        "gapAhead": gap_ahead,
+        "gapBehind": gap_behind,
         "tyre": None,
         "lapsOnTyre": None,
         "tyreWearPct": None,
         "fuelPct": None,
+        "lastLap": last_lap,
+        "bestLap": best_lap,
+        "degradation": trend,
+        "vehicle": table.vehicles[idx] if idx is not None and table.vehicles[idx] else None,
     }
 
 
+def _weather_text(conditions: Optional[Dict]) -> Optional[str]:
+    """Short label such as "33°C, Dry" (air temperature and rain)."""
+    if not conditions:
+        return None
+    state = "Rain" if conditions.get("rain") else "Dry"
+    air = conditions.get("airTemp")
+    return f"{round(air)}°C, {state}" if air is not None else state
+
+
+def _round_or_none(value: float, digits: int) -> Optional[float]:
+    return round(float(value), digits) if value == value else None
+
+
+def _gap(other_end: float, own_end: float) -> Optional[float]:
+    """Seconds between two cars crossing the line on the same lap (negative: other car ahead)."""
+    gap = other_end - own_end
+    return round(gap, 3) if gap == gap else None
+
+
 @app.get("/strategy/recommendations")
-async def get_recommendations():
+@offloaded
+def get_recommendations(folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
     """
-    Compute simple recommendations from lap-time degradation:
-    - Find lap with largest positive jump (time lost) as indicative pit start.
-    - Offer an optimal and a caution option based on window +/- 2 laps.
+    Recommendations from the pit-window optimiser:
+    - optimal: the plan with the fastest expected race time.
+    - caution: the best plan that pits on a different lap (or not at all), as a fallback.
     """
-    base = _datasets_base()
-    folder = _first_dataset_folder()
-    times: List[float] = []
-    if folder:
-        folder_path = (base / folder).resolve()
-        candidate = None
-        for p in folder_path.rglob("*.csv"):
-            if p.name.lower().startswith("lap_times"):
-                candidate = p
-                break
-        if not candidate:
-            for p in folder_path.rglob("*.csv"):
-                candidate = p
-                if candidate:
-                    break
-        if candidate:
-            times = _extract_lap_times(candidate)
-
-    if not times:
-        return []
+    return _recommendations(folder, vehicle)
 
-    # Detect pit window via largest single-lap positive jump
-    pit_start = None
-    max_jump = 0.0
-    for i in range(1, len(times)):
-        jump = times[i] - times[i - 1]
-        if jump > max_jump:
-            max_jump = jump
-            pit_start = i + 1
 
-    if pit_start is None:
-        pit_start = max(2, int(len(times) * 0.5))
-    caution_lap = min(len(times), pit_start + 2)
+def _recommendations(folder: Optional[str], vehicle: Optional[str]) -> List[Dict]:
+    folder = folder or _first_dataset_folder()
+    plans = _strategy_plans(folder, vehicle, DEFAULT_PLAN_PARAMS)["plans"]
+    if not plans:
+        return []
 
-    return [
+    best = plans[0]
+    alt = next((p for p in plans[1:] if p["stops"][:1] != best["stops"][:1]), plans[1] if len(plans) > 1 else None)
+    out = [
         {
             "style": "optimal",
-            "text": f"BOX on Lap {pit_start} — Tyre: Hard — Risk: Low",
-            "reason": "Largest time loss detected suggests pit window opening.",
-        },
-        {
-            "style": "caution",
-            "text": f"Defer to Lap {caution_lap} — Tyre: Medium — Risk: Medium",
-            "reason": "Later stop protects track position; watch for Safety Car.",
-        },
+            "text": _plan_text(best),
+            "reason": f"Fastest expected race ({best['expectedTime']:.1f}s) of the 1- and 2-stop plans searched.",
+        }
     ]
+    if alt:
+        out.append({
+            "style": "caution",
+            "text": _plan_text(alt),
+            "reason": f"+{alt['delta']:.1f}s on average; keeps options open if a Safety Car changes the pit loss.",
+        })
+    return out
+
+
+def _plan_text(plan: Dict) -> str:
+    risk = plan["risk"]["level"] if plan.get("risk") else "Medium"
+    if not plan["stops"]:
+        return f"Stay out to the flag — Risk: {risk}"
+    laps = " & ".join(str(s["lap"]) for s in plan["stops"])
+    tyres = " → ".join(s["compound"] for s in plan["stops"])
+    label = "Lap" if len(plan["stops"]) == 1 else "Laps"
+    return f"BOX on {label} {laps} — Tyre: {tyres} — Risk: {risk}"
+
+
+@app.get("/strategy/optimise")
+@offloaded
+def optimise_strategy(
+    folder: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    top: int = Query(default=10, ge=1, le=100),
+    maxStops: int = Query(default=2, ge=0, le=2),
+    minStint: int = Query(default=1, ge=1),
+    pitLoss: Optional[float] = Query(default=None, ge=0),
+    degradationScale: float = Query(default=1.0, ge=0),
+    compounds: Optional[str] = Query(default=None),
+    scProbability: float = Query(default=0.2, ge=0, le=1),
+):
+    """
+    Top-N 0/1/2-stop plans (pit laps x compounds) ranked by expected race time, each with
+    a Monte Carlo risk estimate. pitLoss and degradationScale override the calibrated model.
+    Results are memoised per dataset file version and parameters.
+    """
+    folder = folder or _first_dataset_folder()
+    names = tuple(c for c in (compounds.split(",") if compounds else COMPOUNDS) if c in COMPOUNDS)
+    params = (top, maxStops, minStint, pitLoss, degradationScale, names, scProbability)
+    return _strategy_plans(folder, vehicle, params)
 
 
 @app.get("/race/top3")
-async def get_top3():
+@offloaded
+def get_top3(folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
     """
-    Return top 3 fastest laps from the active dataset.
+    Return the top 3 cars by best lap from the active dataset, or with `vehicle`
+    (or a single-car dataset) that car's 3 fastest laps.
     """
-    base = _datasets_base()
-    folder = _first_dataset_folder()
-    times: List[float] = []
-    if folder:
-        folder_path = (base / folder).resolve()
-        candidate = None
-        for p in folder_path.rglob("*.csv"):
-            if p.name.lower().startswith("lap_times"):
-                candidate = p
-                break
-        if not candidate:
-            for p in folder_path.rglob("*.csv"):
-                candidate = p
-                if candidate:
-                    break
-        if candidate:
-            times = _extract_lap_times(candidate)
+    return _top3(folder, vehicle)
 
-    if not times:
+
+def _top3(folder: Optional[str], vehicle: Optional[str]) -> List[Dict]:
+    folder = folder or _first_dataset_folder()
+    table = _session_laps(folder, None)
+    if table is None or not table.vehicles:
         return []
 
-    lap_times = list(enumerate(times, start=1))
-    lap_times.sort(key=lambda kv: kv[1])
-    best = lap_times[0][1]
+    if vehicle is None and len(table.vehicles) > 1:
+        best = table.best_laps()
+        ranked = [(table.vehicles[i], float(best[i])) for i in np.argsort(best) if best[i] == best[i]]
+        names_times = ranked[:3]
+    else:
+        laps, times = _vehicle_lap_times(table, vehicle, plausible_only=True)
+        if not times:
+            return []
+        lap_times = sorted(zip(laps, times), key=lambda kv: kv[1])
+        names_times = [(f"Lap {lap}", t) for lap, t in lap_times[:3]]
 
+    if not names_times:
+        return []
+    best_time = names_times[0][1]
     out = []
-    for idx, (lap, t) in enumerate(lap_times[:3], start=1):
-        gap = t - best
+    for idx, (name, t) in enumerate(names_times, start=1):
+        gap = t - best_time
         out.append({
             "pos": idx,
-            "name": f"Lap {lap}",
+            "name": name,
             "gap": f"+{gap:.1f}s" if idx > 1 else "+0.0s",
         })
     return out
 
 
-@app.get("/charts/tyre-degradation")
-async def get_tyre_degradation(track: Optional[str] = Query(default=None), file: Optional[str] = Query(default=None), folder: Optional[str] = Query(default=None)):
-    base = _datasets_base()
-    # Default to first available dataset folder when none provided
+def _chart_sources(folder: Optional[str] = None, file: Optional[str] = None, **_params) -> List[Path]:
+    """Every dataset file a chart for `folder` or `file` can be built from; their fingerprints validate its cached copies."""
     if not file and not folder:
         folder = _first_dataset_folder()
-    times: List[float] = []
+    paths: List[Path] = []
     if folder:
-        folder_path = (base / folder).resolve()
-        if str(folder_path).startswith(str(base.resolve())) and folder_path.is_dir():
-            # Prefer lap_times.csv; else first CSV containing lap time column
-            candidate = None
-            for p in folder_path.rglob("*.csv"):
-                if p.name.lower().startswith("lap_times"):
-                    candidate = p
-                    break
-            if not candidate:
-                for p in folder_path.rglob("*.csv"):
-                    candidate = p
-                    if candidate:
-                        break
-            if candidate:
-                times = _extract_lap_times(candidate)
+        entry = _catalog().folder(folder) or {}
+        keys = ("lapTimesCandidate", "analysisFile", "lapStartFile", "lapEndFile", "weatherFile", "firstCsv")
+        paths = [_dataset_path(entry[k]) for k in keys if entry.get(k)]
     elif file:
-        file_path = (base / file).resolve()
-        if str(file_path).startswith(str(base.resolve())) and file_path.is_file():
-            if file_path.suffix.lower() == ".csv":
-                times = _extract_lap_times(file_path)
-            # zip parsing not yet implemented
+        path = _resolve_file(file)
+        paths = [p for p in (path, _analysis_file(None, file), _weather_file(None, file)) if p]
+        if path and path.suffix.lower() == ".csv":
+            paths += [p for p in _lap_timestamp_files(path) if p]
+    return paths
 
-    if not times:
+
+@app.get("/charts/tyre-degradation")
+@conditional(_chart_sources)
+@offloaded
+def get_tyre_degradation(track: Optional[str] = Query(default=None), file: Optional[str] = Query(default=None), folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
+    """
+    Lap times of one car with the fitted degradation curve per stint, the fit confidence
+    and the projected crossover lap. pitWindow spans the laps at which a stop pays off.
+    """
+    return _tyre_degradation(folder, file, vehicle, track)
+
+
+def _tyre_degradation(folder: Optional[str], file: Optional[str], vehicle: Optional[str], track: Optional[str] = None) -> Dict:
+    # Default to first available dataset folder when none provided
+    if not file and not folder:
+        folder = _first_dataset_folder()
+    model = _session_degradation(folder, file)
+    idx = _degradation_car(model, folder, file, vehicle)
+    car = model.car(idx) if idx is not None else None
+
+    if not car or not car["laps"]:
         # fallback demo series
-        times = [93.2, 92.9, 92.7, 92.6, 92.5, 92.8, 93.1, 93.4, 93.9, 94.2, 94.7, 95.1, 95.6, 96.0, 96.4, 96.8, 97.2, 97.5, 97.9, 98.3, 98.8, 99.1, 99.5, 99.9]
-
-    laps = list(range(1, len(times) + 1))
-    # Detect pit window: find largest positive jump (time lost) suggesting pit stop
-    pit_start = None
-    max_jump = 0.0
-    for i in range(1, len(times)):
-        jump = times[i] - times[i - 1]
-        if jump > max_jump:
-            max_jump = jump
-            pit_start = i + 1  # lap index is i+1 in 1-based terms
-    if pit_start is None:
-        pit_start = max(2, int(len(times) * 0.5))
-    pit_end = min(len(times), pit_start + 2)
-    return {
-        "laps": laps,
-        "times": times,
-        "pitWindow": {"start": pit_start, "end": pit_end},
-        "track": track,
-        "file": file or folder,
-    }
+        car = DegradationModel.from_series(DEMO_LAP_TIMES).car(0)
+        return {**car, "track": track, "file": file or folder, "vehicle": vehicle}
+    return {**car, "track": track, "file": file or folder, "vehicle": vehicle or model.cars[idx] or None}
+
+def _cached_lap_times(csv_path: Path) -> List[float]:
+    return parse_cache.get_or_parse(csv_path, "lap_times", _extract_lap_times)
+
+
+def _cached_lap_table(csv_path: Path) -> LapTable:
+    """
+    Per-vehicle lap table for a lap-time CSV. GR timing files are joined with the lap
+    start/end files found next to them; files still being written are followed as they
+    grow (only appended rows are parsed), finished ones go through the parse cache and
+    its persistent store. Other files become a single unnamed vehicle.
+    """
+    headers = parse_cache.get_or_parse(csv_path, "headers", read_headers)
+    if not is_gr_lap_file(headers):
+        return LapTable.from_series(_cached_lap_times(csv_path))
+    start, end = _lap_timestamp_files(csv_path)
+    if FOLLOW and not isinstance(csv_path, ZipMember) and is_live(csv_path, start, end):
+        return live_session(csv_path, start, end).table()
+    return parse_cache.get_or_parse(
+        csv_path, "lap_table", _build_lap_table, start, end, versions=(_fingerprint_or_none(start), _fingerprint_or_none(end))
+    )
+
+
+def _build_lap_table(csv_path: Path, start: Optional[Path], end: Optional[Path], *_fingerprints) -> LapTable:
+    # start/end fingerprints are only part of the cache key
+    return build_lap_table(csv_path, start, end)
+
+
+def _cached_sections(csv_path: Path) -> Optional[Tuple[List[int], Dict[str, List[float]]]]:
+    return parse_cache.get_or_parse(csv_path, "sections", _extract_sections)
+
+
+def _cached_telemetry(csv_path: Path, limit: int) -> Dict[str, List[Optional[float]]]:
+    return parse_cache.get_or_parse(csv_path, "telemetry", _extract_telemetry, limit)
+
+
+def _cached_sidecar(csv_path: Path) -> TelemetrySidecar:
+    return parse_cache.get_or_parse(csv_path, "telemetry_sidecar", open_sidecar, _sidecar_root())
+
+
+def _cached_pyramid(csv_path: Path, sidecar: TelemetrySidecar, column: str) -> MinMaxPyramid:
+    """Min/max zoom pyramid of one sidecar column, built once per sidecar version."""
+    return parse_cache.get_or_parse(csv_path, "telemetry_pyramid", _build_pyramid, sidecar.root, column, versions=(sidecar,))
+
+
+def _build_pyramid(csv_path: Path, _root: Path, column: str, sidecar: TelemetrySidecar) -> MinMaxPyramid:
+    return MinMaxPyramid(sidecar.column(column))
+
+
+LAP_TIME_COLUMNS = ["lap_time", "laptime", "lapTime", "LapTime", "lap_time_seconds", "laptime_s", "laptime_ms"]
+TIMESTAMP_COLUMNS = ["timestamp", "Timestamp", "time", "meta_time"]
+
 
 def _extract_lap_times(csv_path: Path) -> List[float]:
     try:
-        with csv_path.open("r", newline="", encoding="utf-8", errors="ignore") as f:
-            reader = csv.DictReader(f)
-            headers = [h.strip() for h in (reader.fieldnames or [])]
-            # common variants
-            lap_time_keys = [
-                "lap_time", "laptime", "lapTime", "LapTime", "lap_time_seconds", "laptime_s", "laptime_ms"
-            ]
-            lap_key_options = ["lap", "Lap", "lap_number", "LapNumber"]
-            ts_key_options = ["timestamp", "Timestamp", "time", "meta_time"]
-
-            lt_key = next((k for k in lap_time_keys if k in headers), None)
-            lap_key = next((k for k in lap_key_options if k in headers), None)
-            ts_key = next((k for k in ts_key_options if k in headers), None)
-
-            if lt_key:
-                # direct per-lap times
-                times: Dict[int, float] = {}
-                for row in reader:
-                    lap_num = None
-                    if lap_key and row.get(lap_key):
-                        try:
-                            lap_num = int(float(row[lap_key]))
-                        except:
-                            lap_num = None
-                    try:
-                        val = row.get(lt_key)
-                        if val is None or val == "":
-                            continue
-                        t = float(val) / 1000.0 if lt_key.endswith("_ms") else float(val)
-                        if lap_num is None:
-                            times[len(times) + 1] = t
-                        else:
-                            if lap_num not in times:
-                                times[lap_num] = t
-                    except:
-                        continue
-                if times:
-                    return [t for _, t in sorted(times.items(), key=lambda kv: kv[0])]
-
-            # derive from timestamp and lap change
-            if lap_key and ts_key:
-                last_lap = None
-                last_lap_ts = None
-                out: Dict[int, float] = {}
-                for row in reader:
-                    try:
-                        lap = int(float(row[lap_key]))
-                    except:
-                        continue
-                    try:
-                        ts_val = float(row[ts_key])
-                    except:
-                        # try parse ISO-ish
-                        try:
-                            ts_val = float(row[ts_key].replace(":", "").replace("-", "").replace(" ", ""))
-                        except:
-                            continue
-                    if last_lap is None:
-                        last_lap = lap
-                        last_lap_ts = ts_val
-                        continue
-                    if lap != last_lap:
-                        if last_lap_ts is not None:
-                            dt = max(0.0, ts_val - last_lap_ts)
-                            # convert ms to s if looks too large
-                            if dt > 1000:
-                                dt = dt / 1000.0
-                            out[last_lap] = dt
-                        last_lap = lap
-                        last_lap_ts = ts_val
-                if out:
-                    return [t for _, t in sorted(out.items(), key=lambda kv: kv[0])]
+        lt_key = pick_column(read_header(csv_path)[1], LAP_TIME_COLUMNS)
+        cols = read_columns(csv_path, {"time": LAP_TIME_COLUMNS, "lap": LAP_COLUMNS, "ts": TIMESTAMP_COLUMNS})
     except Exception:
         return []
+    lap = to_numbers(cols["lap"]) if "lap" in cols else None
+
+    if lt_key:
+        # direct per-lap times; the first row of each lap wins
+        t = to_numbers(cols["time"])
+        if lt_key.endswith("_ms"):
+            t = t / 1000.0
+        timed = ~np.isnan(t)
+        numbered = timed & ~np.isnan(lap) if lap is not None else np.zeros(len(t), dtype=bool)
+        if numbered.any():
+            _, first = np.unique(lap[numbered].astype(np.int64), return_index=True)
+            return t[numbered][first].tolist()
+        if timed.any():
+            return t[timed].tolist()
+
+    # derive from timestamp and lap change
+    if lap is not None and "ts" in cols:
+        ts = to_epoch(cols["ts"])
+        ok = ~np.isnan(lap) & ~np.isnan(ts)
+        lap, ts = lap[ok].astype(np.int64), ts[ok]
+        starts = np.flatnonzero(np.r_[True, lap[1:] != lap[:-1]]) if lap.size else lap
+        if len(starts) > 1:
+            dt = np.maximum(0.0, np.diff(ts[starts]))
+            # convert ms to s if looks too large
+            dt = np.where(dt > 1000, dt / 1000.0, dt)
+            out = dict(zip(lap[starts[:-1]].tolist(), dt.tolist()))
+            return [t for _, t in sorted(out.items())]
     return []
 
 
@@ -303,19 +450,32 @@ class SimulationRequest(BaseModel):
     safetyCar: bool = False
 
 
+class SafetyCarModel(BaseModel):
+    probability: float = Field(default=0.2, ge=0.0, le=1.0)
+    minLaps: int = Field(default=2, ge=1)
+    maxLaps: int = Field(default=4, ge=1)
+
+
+class BatchSimulationRequest(BaseModel):
+    # explicit pit laps, or every lap from pitLapFrom to pitLapTo; neither: every lap of the race
+    pitLaps: Optional[List[int]] = None
+    pitLapFrom: Optional[int] = None
+    pitLapTo: Optional[int] = None
+    compounds: List[str] = ["Soft", "Medium", "Hard"]
+    includeNoStop: bool = True
+    safetyCar: SafetyCarModel = SafetyCarModel()
+    traces: int = Field(default=10000, ge=1, le=200000)
+    seed: Optional[int] = None
+
+
 @app.post("/strategy/simulate")
-async def simulate(req: SimulationRequest, folder: Optional[str] = Query(default=None)):
+@offloaded
+def simulate(req: SimulationRequest, folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
     # Basic mock: drop lap time by 1.5s after pit, slight compound effect, SC flattens 2 laps
-    # Decide race total based on selected dataset folder (Race 1 => 19, Race 2 => 16). Fallback to 45.
-    total = 45
-    if folder:
-        f = folder.lower()
-        if "race" in f:
-            if "race 1" in f or "race_1" in f or "race-1" in f:
-                total = 19
-            elif "race 2" in f or "race_2" in f or "race-2" in f:
-                total = 16
-    base = [93.0 + (i * 0.25) for i in range(total)]
+    # Base pace, degradation and race length are calibrated from the dataset (45 laps of demo pace without one).
+    calib = _calibration(folder, vehicle)
+    total = calib.total_laps
+    base = [round(calib.pace + (i * calib.slope), 3) for i in range(total)]
     times = base[:]
     gain = {"Soft": -1.8, "Medium": -1.2, "Hard": -0.6}.get(req.compound, -1.0)
     pit = max(1, min(req.pitLap, total))
@@ -327,121 +487,442 @@ async def simulate(req: SimulationRequest, folder: Optional[str] = Query(default
     return {"laps": list(range(1, total + 1)), "times": times}
 
 
+@app.post("/strategy/simulate/batch")
+async def simulate_batch(req: BatchSimulationRequest, folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
+    """
+    Monte Carlo comparison of pit strategies (every pit lap x compound, plus no stop) over
+    `traces` random races with lap-time noise and a random safety-car period.
+    Returns finish-time percentiles, win probability and a histogram per strategy.
+    """
+    calib = await offload(_calibration, folder, vehicle, key=("calibration", folder, vehicle))
+    total = calib.total_laps
+    if req.pitLaps:
+        candidates = sorted(set(req.pitLaps))
+    else:
+        candidates = list(range(req.pitLapFrom or 1, (req.pitLapTo or total - 1) + 1))
+    candidates = [lap for lap in candidates if 1 <= lap < total]
+    compounds = [c for c in dict.fromkeys(req.compounds) if c in COMPOUNDS]
+    plan = [(lap, c) for lap in candidates for c in compounds]
+    if req.includeNoStop:
+        plan.append((0, ""))
+    if not plan:
+        return {"calibration": calib.as_dict(), "traces": 0, "strategies": [], "histogram": {"edges": [], "counts": []}}
+
+    pit_laps = np.array([lap for lap, _ in plan], dtype=np.int64)
+    names = [c for _, c in plan]
+    sc = (req.safetyCar.probability, req.safetyCar.minLaps, max(req.safetyCar.minLaps, req.safetyCar.maxLaps))
+    finish = await run_batch(calib, pit_laps, names, req.traces, sc, req.seed)
+    labels = [{"pitLap": lap or None, "compound": c or None} for lap, c in plan]
+    summary = await offload(summarise, finish, labels)
+    return {"calibration": calib.as_dict(), "traces": req.traces, **summary, "vehicle": vehicle}
+
+
+# optimiser parameters: (top, maxStops, minStint, pitLoss, degradationScale, compounds, scProbability)
+DEFAULT_PLAN_PARAMS = (10, 2, 1, None, 1.0, tuple(COMPOUNDS), 0.2)
+
+
+def _strategy_plans(folder: Optional[str], vehicle: Optional[str], params: Tuple) -> Dict:
+    """Optimiser result, cached against the session's timing, lap and weather files until one changes."""
+    lap_file = _session_lap_file(folder, None) if folder else None
+    source = (_analysis_file(folder, None) or lap_file) if folder else None
+    if source is None:
+        return _plan_strategies(None, folder, vehicle, params)
+    # the default car comes from the lap table even when the model is fitted on the analysis file
+    laps = tuple(_fingerprint_or_none(p) for p in (lap_file, *(_lap_timestamp_files(lap_file) if lap_file else (None, None))))
+    weather = _fingerprint_or_none(_weather_file(folder, None))
+    return parse_cache.get_or_parse(source, "strategy_plans", _plan_strategies, folder, vehicle, params, versions=(weather, laps))
+
+
+def _plan_strategies(_source: Optional[Path], folder: Optional[str], vehicle: Optional[str], params: Tuple, *_fingerprints) -> Dict:
+    top, max_stops, min_stint, pit_loss, scale, compounds, sc_probability = params
+    calib = _calibration(folder, vehicle)
+    calib = Calibration(
+        calib.pace,
+        calib.slope * scale,
+        calib.sigma,
+        calib.pit_loss if pit_loss is None else pit_loss,
+        calib.total_laps,
+        calib.fuel_effect,
+        calib.track_temp,
+        calib.temp_effect,
+    )
+    ranked = optimise(calib, compounds, max_stops, top, min_stint)
+    risks = plan_risk(calib, [plan for _, plan in ranked], (sc_probability, 2, 4))
+    best = ranked[0][0] if ranked else 0.0
+    plans = [
+        {
+            "rank": i + 1,
+            "stops": [{"lap": lap, "compound": c} for lap, c in plan],
+            "stopCount": len(plan),
+            "expectedTime": round(t, 3),
+            "delta": round(t - best, 3),
+            "risk": risk,
+        }
+        for i, ((t, plan), risk) in enumerate(zip(ranked, risks))
+    ]
+    return {"calibration": calib.as_dict(), "plans": plans, "vehicle": vehicle}
+
+
+def _calibration(folder: Optional[str], vehicle: Optional[str]) -> Calibration:
+    """Simulation model of the requested (or default) car in a dataset folder."""
+    folder = folder or _first_dataset_folder()
+    model = _session_degradation(folder, None) if folder else None
+    return Calibration.from_model(model, _degradation_car(model, folder, None, vehicle))
+
+
 @app.get("/datasets")
-async def list_datasets():
+@offloaded
+def list_datasets():
     base = _datasets_base()
     items = []
     if base.exists():
+        catalog = _catalog()
         # directories
-        for d in base.rglob("*"):
-            if d.is_dir():
-                try:
-                    rel = d.relative_to(base)
-                except ValueError:
-                    rel = d.name
-                # count csv files inside
-                csv_count = len(list(d.rglob("*.csv")))
-                if csv_count:
-                    items.append({
-                        "kind": "directory",
-                        "name": d.name,
-                        "relativePath": str(rel).replace("\\", "/"),
-                        "csvCount": csv_count,
-                        "track": d.name,
-                    })
+        for entry in catalog.folders():
+            if entry["csvCount"]:
+                items.append(entry)
         # zip and csv files at any depth
-        for p in base.rglob("*.zip"):
-            try:
-                rel = p.relative_to(base)
-            except ValueError:
-                rel = p.name
-            items.append({
-                "kind": "file",
-                "name": p.name,
-                "relativePath": str(rel).replace("\\", "/"),
-                "size": p.stat().st_size,
-            })
-        for p in base.rglob("*.csv"):
-            try:
-                rel = p.relative_to(base)
-            except ValueError:
-                rel = p.name
-            items.append({
-                "kind": "file",
-                "name": p.name,
-                "relativePath": str(rel).replace("\\", "/"),
-                "size": p.stat().st_size,
-            })
+        items.extend(catalog.files())
     return {"path": str(base), "files": items}
 
+@app.get("/season/query")
+async def season_query(
+    metric: str = Query(default="bestLaps", pattern="^(" + "|".join(METRICS) + ")$"),
+    track: Optional[str] = Query(default=None),
+    car: Optional[str] = Query(default=None),
+):
+    """
+    Aggregate across every session (race folder) in the datasets folder, as NDJSON:
+    one `session` line per session as it completes (its per-car rows), then one
+    `aggregate` line merging them. metric=bestLaps: fastest lap per track;
+    degradation: each car's slope per event and confidence-weighted across events;
+    pace: per-track pace per car, normalised to the track's median track temperature.
+    Session summaries are computed in worker processes and cached per file version.
+    """
+    sessions = await offload(_season_sessions, track)
+    return StreamingResponse(_season_lines(sessions, SeasonAggregate(metric, car)), media_type="application/x-ndjson")
+
+
+async def _season_lines(sessions: List[Dict], aggregate: SeasonAggregate):
+    async def run(session: Dict):
+        try:
+            summary = await offload(_season_summary, session["files"], key=("season", session["files"]))
+            return session, summary, None
+        except Exception as e:  # one unreadable session must not end the stream
+            return session, None, str(e) or type(e).__name__
+
+    for done in asyncio.as_completed([run(s) for s in sessions]):
+        session, summary, error = await done
+        line = {"event": "session", "folder": session["folder"], "track": session["track"], "session": session["session"]}
+        if error is not None:
+            line = {**line, "event": "error", "detail": error}
+        else:
+            line["rows"] = aggregate.add(session["track"], session["session"], summary, session["folder"])
+        yield dumps(line) + b"\n"
+    yield dumps({"event": "aggregate", **aggregate.result()}) + b"\n"
+
+
+def _season_sessions(track: Optional[str]) -> List[Dict]:
+    """Every session folder with its timing, lap timestamp and weather files."""
+    if not _datasets_base().exists():
+        return []
+    kinds = {"lapTimes": "lapTimesFile", "lapStart": "lapStartFile", "lapEnd": "lapEndFile", "analysis": "analysisFile", "weather": "weatherFile"}
+    out = []
+    for entry in _catalog().sessions():
+        rel = entry["relativePath"]
+        top = rel.split("/")[0]
+        name = top[:-4] if top.lower().endswith(".zip") else top
+        if track and name.lower() != track.lower():
+            continue
+        files = tuple((kind, _dataset_path(entry[key]) if entry.get(key) else None) for kind, key in kinds.items())
+        out.append({"folder": rel, "track": name, "session": posixpath.basename(rel) or name, "files": files})
+    return out
+
+
+def _season_summary(files: Tuple) -> Dict:
+    """Per-car summary of one session, cached against the versions of all of its files."""
+    found = dict(files)
+    primary = found["analysis"] or found["lapTimes"]
+    prints = tuple(_fingerprint_or_none(path) for _, path in files)
+    return parse_cache.get_or_parse(primary, "season_summary", _pooled_season_summary, files, versions=(prints,))
+
+
+def _pooled_season_summary(_primary: Path, files: Tuple, *_fingerprints) -> Dict:
+    return season_in_pool(dict(files))
+
+
 def _datasets_base() -> Path:
     default_base = Path(__file__).resolve().parent.parent.parent / "data" / "datasets"
     env_base = os.getenv("TRACKOTA_DATASETS_DIR")
     return Path(env_base) if env_base else default_base
 
+def _catalog() -> DatasetCatalog:
+    return get_catalog(_datasets_base())
+
+def _open_store() -> Optional[AnalyticsStore]:
+    """The persistent store (stale rows pruned), or None without a datasets folder to put it in."""
+    env_path = os.getenv("TRACKOTA_STORE_PATH")
+    if not env_path and not _datasets_base().exists():
+        return None
+    store = open_store(Path(env_path) if env_path else derived_dir(_datasets_base()) / "store.sqlite")
+    if store is not None:
+        store.prune()
+    return store
+
+async def _warm_up() -> None:
+    """Parse every session into the caches (and the store), most recently modified first."""
+    try:
+        folders = await offload(_warm_order)
+    except Exception:
+        return
+    for folder in folders:
+        try:
+            await offload(_warm_session, folder, key=("warm", folder), timeout=WARM_TIMEOUT)
+        except Exception:
+            # a broken session fails again, with its error, when it is requested
+            continue
+
+def _warm_order() -> List[str]:
+    if not _datasets_base().exists():
+        return []
+    newest: Dict[str, int] = {}
+    for entry in _catalog().sessions():
+        stamps = [0]
+        for key in ("lapTimesCandidate", "analysisFile", "weatherFile"):
+            if entry.get(key):
+                try:
+                    stamps.append(_dataset_path(entry[key]).stat().st_mtime_ns)
+                except OSError:
+                    continue
+        newest[entry["relativePath"]] = max(stamps)
+    return sorted(newest, key=newest.get, reverse=True)
+
+def _warm_session(folder: str) -> None:
+    _session_laps(folder, None)
+    _session_degradation(folder, None)
+    _session_sectors(folder, None)
+    path = _session_lap_file(folder, None)
+    if path is not None:
+        _cached_sections(path)
+
+def _sidecar_root() -> Path:
+    env_dir = os.getenv("TRACKOTA_SIDECAR_DIR")
+    return Path(env_dir) if env_dir else derived_dir(_datasets_base()) / "telemetry"
+
 def _first_dataset_folder() -> Optional[str]:
     """
     Returns the first dataset directory (relative path to base) that contains at least one CSV file.
     """
+    with span("resolve"):
+        if not _datasets_base().exists():
+            return None
+        return _catalog().first_folder()
+
+def _lap_times_candidate(folder: str) -> Optional[Path]:
+    """Preferred lap-times CSV for a folder: lap_times*.csv, else its first CSV."""
+    with span("resolve"):
+        entry = _catalog().folder(folder)
+        if not entry or not entry["lapTimesCandidate"]:
+            return None
+        return _dataset_path(entry["lapTimesCandidate"])
+
+def _session_lap_file(folder: Optional[str], file: Optional[str]) -> Optional[Path]:
+    """A folder's lap-time candidate, or a single CSV file."""
+    if folder:
+        return _lap_times_candidate(folder)
+    if file:
+        path = _resolve_file(file)
+        if path and path.suffix.lower() == ".csv":
+            return path
+    return None
+
+def _session_laps(folder: Optional[str], file: Optional[str]) -> Optional[LapTable]:
+    """Lap table for a folder's lap-time candidate, or for a single CSV file."""
+    path = _session_lap_file(folder, file)
+    return _cached_lap_table(path) if path else None
+
+def _analysis_file(folder: Optional[str], file: Optional[str]) -> Optional[Path]:
+    """Timing analysis file of a folder, or of the folder holding `file`."""
+    with span("resolve"):
+        rel = folder
+        if not rel and file:
+            rel = posixpath.dirname(normalise_rel(file) or "")
+        entry = _catalog().folder(rel) if rel is not None else None
+        if not entry or not entry["analysisFile"]:
+            return None
+        return _dataset_path(entry["analysisFile"])
+
+def _session_degradation(folder: Optional[str], file: Optional[str]) -> Optional[DegradationModel]:
+    """Degradation model of a session: from its timing analysis file when present, else its lap table."""
+    analysis = _analysis_file(folder, file)
+    weather = _weather_file(folder, file)
+    if analysis:
+        model = parse_cache.get_or_parse(analysis, "degradation", _fit_analysis, weather, versions=(_fingerprint_or_none(weather),))
+        if model is not None:
+            return model
+    path = _session_lap_file(folder, file)
+    if not path:
+        return None
+    start, end = _lap_timestamp_files(path)
+    return parse_cache.get_or_parse(
+        path, "degradation_laps", _fit_lap_table, weather,
+        versions=(_fingerprint_or_none(start), _fingerprint_or_none(end), _fingerprint_or_none(weather)),
+    )
+
+def _fit_analysis(csv_path: Path, weather: Optional[Path], *_fingerprints) -> Optional[DegradationModel]:
+    table = _cached_analysis(csv_path)
+    if table is None:
+        return None
+    conditions = _analysis_weather(csv_path, weather)
+    return DegradationModel(
+        table.cars, table.offsets, table.laps, table.times, table.in_pit, table.out_lap, table.green,
+        track_temp=conditions["trackTemp"] if conditions else None,
+    )
+
+def _fit_lap_table(csv_path: Path, weather: Optional[Path], *_fingerprints) -> DegradationModel:
+    # lap tables carry no pit flags: one stint per car, pit laps drop out as outliers
+    table = _cached_lap_table(csv_path)
+    series = _cached_weather(weather)
+    track_temp = series.join(table.ends)["trackTemp"] if series is not None else None
+    return DegradationModel(table.vehicles, table.offsets, table.laps, table.times, track_temp=track_temp)
+
+def _cached_analysis(csv_path: Path) -> Optional[AnalysisTable]:
+    return parse_cache.get_or_parse(csv_path, "analysis", read_analysis)
+
+def _cached_weather(csv_path: Optional[Path]) -> Optional[WeatherSeries]:
+    return parse_cache.get_or_parse(csv_path, "weather", read_weather) if csv_path else None
+
+def _analysis_weather(csv_path: Path, weather: Optional[Path]) -> Optional[Dict[str, np.ndarray]]:
+    """Weather as of the end of every lap of an analysis file, joined once per version of both files."""
+    if weather is None:
+        return None
+    return parse_cache.get_or_parse(csv_path, "lap_weather", _join_analysis_weather, weather, versions=(_fingerprint_or_none(weather),))
+
+def _join_analysis_weather(csv_path: Path, weather: Path, *_fingerprints) -> Optional[Dict[str, np.ndarray]]:
+    table, series = _cached_analysis(csv_path), _cached_weather(weather)
+    if table is None or series is None:
+        return None
+    return series.join(series.align_clock(table.clock))
+
+def _weather_file(folder: Optional[str], file: Optional[str]) -> Optional[Path]:
+    """Weather station file of a folder, or of the folder holding `file`."""
+    with span("resolve"):
+        rel = folder
+        if not rel and file:
+            rel = posixpath.dirname(normalise_rel(file) or "")
+        entry = _catalog().folder(rel) if rel is not None else None
+        if not entry or not entry.get("weatherFile"):
+            return None
+        return _dataset_path(entry["weatherFile"])
+
+def _degradation_car(model: Optional[DegradationModel], folder: Optional[str], file: Optional[str], vehicle: Optional[str]) -> Optional[int]:
+    """Requested car in a degradation model, else the session's default vehicle."""
+    if model is None:
+        return None
+    if vehicle:
+        return model.index_of(vehicle)
+    table = _session_laps(folder, file)
+    idx = _pick_vehicle(table, None)
+    found = model.index_of(table.vehicles[idx]) if idx is not None and table.vehicles[idx] else None
+    return found if found is not None else model.default_car()
+
+def _pick_vehicle(table: Optional[LapTable], vehicle: Optional[str]) -> Optional[int]:
+    """Requested vehicle's index, or the default vehicle when none is requested."""
+    if table is None:
+        return None
+    return table.index_of(vehicle) if vehicle else table.default_vehicle()
+
+def _vehicle_lap_times(table: Optional[LapTable], vehicle: Optional[str], plausible_only: bool = False) -> Tuple[List[int], List[float]]:
+    idx = _pick_vehicle(table, vehicle)
+    if idx is None:
+        return [], []
+    laps, times = table.lap_times(idx, plausible_only)
+    return laps.tolist(), times.tolist()
+
+def _lap_timestamp_files(csv_path: Path) -> Tuple[Optional[Path], Optional[Path]]:
+    """Lap start/end timestamp files in the same folder as a lap-time file."""
     base = _datasets_base()
-    if not base.exists():
+    try:
+        rel = csv_path.resolve().parent.relative_to(base.resolve())
+    except ValueError:
+        return None, None
+    entry = _catalog().folder(rel.as_posix())
+    if not entry:
+        return None, None
+    start = _dataset_path(entry["lapStartFile"]) if entry["lapStartFile"] else None
+    end = _dataset_path(entry["lapEndFile"]) if entry["lapEndFile"] else None
+    return start, end
+
+def _fingerprint_or_none(path: Optional[Path]):
+    try:
+        return fingerprint(path) if path else None
+    except OSError:
         return None
-    for d in sorted(base.rglob("*")):
-        if d.is_dir():
-            try:
-                if len(list(d.rglob("*.csv"))) > 0:
-                    rel = d.relative_to(base)
-                    return str(rel).replace("\\", "/")
-            except Exception:
-                continue
-    return None
+
+def _resolve_file(file: str) -> Optional[DatasetPath]:
+    """
+    Resolve a client supplied file path, refusing anything outside the datasets base.
+    Paths running through a .zip (`Sebring.zip/Race 1/x.csv`) resolve to the archive member.
+    """
+    with span("resolve"):
+        base = _datasets_base()
+        rel = normalise_rel(file)
+        if not rel:
+            return None
+        file_path = _dataset_path(rel).resolve()
+        outer = file_path.archive if isinstance(file_path, ZipMember) else file_path
+        if str(outer).startswith(str(base.resolve())) and file_path.is_file():
+            return file_path
+        return None
+
+def _dataset_path(rel: str) -> DatasetPath:
+    return dataset_path(_datasets_base(), rel)
 
 
 @app.get("/charts/sections")
-async def get_sections(track: Optional[str] = Query(default=None), file: Optional[str] = Query(default=None), folder: Optional[str] = Query(default=None)):
+@conditional(_chart_sources)
+@offloaded
+def get_sections(track: Optional[str] = Query(default=None), file: Optional[str] = Query(default=None), folder: Optional[str] = Query(default=None), vehicle: Optional[str] = Query(default=None)):
     """
     Returns per-section times for each lap. If section columns are not present, splits lap times evenly into 6 sections.
     sections: ["S1.a","S1.b","S2.a","S2.b","S3.a","S3.b"]
     """
-    base = _datasets_base()
+    return _sections(folder, file, vehicle, track)
+
+
+def _sections(folder: Optional[str], file: Optional[str], vehicle: Optional[str], track: Optional[str] = None) -> Dict:
     # Default to first available dataset folder when none provided
     if not file and not folder:
         folder = _first_dataset_folder()
-    times = []
     sections_times: Optional[Tuple[List[int], Dict[str, List[float]]]] = None
+    candidate = None
     if folder:
-        folder_path = (base / folder).resolve()
-        if str(folder_path).startswith(str(base.resolve())) and folder_path.is_dir():
-            candidate = None
-            for p in folder_path.rglob("*.csv"):
-                if p.name.lower().startswith("lap_times"):
-                    candidate = p
-                    break
-            if not candidate:
-                for p in folder_path.rglob("*.csv"):
-                    candidate = p
-                    if candidate:
-                        break
-            if candidate:
-                sections_times = _extract_sections(candidate)
-                if not sections_times:
-                    times = _extract_lap_times(candidate)
+        candidate = _lap_times_candidate(folder)
     elif file:
-        file_path = (base / file).resolve()
-        if str(file_path).startswith(str(base.resolve())) and file_path.is_file():
-            if file_path.suffix.lower() == ".csv":
-                sections_times = _extract_sections(file_path)
-                if not sections_times:
-                    times = _extract_lap_times(file_path)
+        candidate = _resolve_file(file)
+        if candidate and candidate.suffix.lower() != ".csv":
+            candidate = None
+    if candidate:
+        sections_times = _cached_sections(candidate)
 
     if sections_times:
         laps, times_by_section = sections_times
         sections = list(times_by_section.keys())
         return {"sections": sections, "laps": laps, "timesBySection": times_by_section, "track": track, "file": file or folder}
 
-    laps = list(range(1, len(times) + 1)) if times else list(range(1, 25))
+    # timing analysis file: the car's measured intermediate sections
+    table = _session_sectors(folder, file)
+    car = _sector_car(table, folder, file, vehicle)
+    if car is not None:
+        rows = table.car_rows(car)
+        times_by_section = {name: rounded(col) for name, col in zip(SECTIONS, table.splits["section"][rows].T)}
+        if rows.size and any(v is not None for col in times_by_section.values() for v in col):
+            return {"sections": SECTIONS, "laps": table.laps[rows].tolist(), "timesBySection": times_by_section, "track": track, "file": file or folder, "vehicle": vehicle or car}
+
+    laps, times = _vehicle_lap_times(_cached_lap_table(candidate) if candidate else None, vehicle)
     if not times:
-        times = [93.2, 92.9, 92.7, 92.6, 92.5, 92.8, 93.1, 93.4, 93.9, 94.2, 94.7, 95.1, 95.6, 96.0, 96.4, 96.8, 97.2, 97.5, 97.9, 98.3, 98.8, 99.1, 99.5, 99.9][: len(laps)]
+        laps = list(range(1, 25))
+        times = DEMO_LAP_TIMES[: len(laps)]
 
     sections = ["S1.a", "S1.b", "S2.a", "S2.b", "S3.a", "S3.b"]
     # Even split if section data not available (placeholder weights can be tuned per track)
@@ -451,88 +932,530 @@ async def get_sections(track: Optional[str] = Query(default=None), file: Optiona
         for s, w in zip(sections, weights):
             times_by_section[s].append(round(t * w, 3))
 
-    return {"sections": sections, "laps": laps, "timesBySection": times_by_section, "track": track, "file": file or folder}
+    return {"sections": sections, "laps": laps, "timesBySection": times_by_section, "track": track, "file": file or folder, "vehicle": vehicle}
 
 
-@app.get("/telemetry/series")
-async def telemetry_series(folder: Optional[str] = Query(default=None), file: Optional[str] = Query(default=None), limit: int = 500):
-    base = _datasets_base()
-    # Default to first available dataset folder when none provided
+def _session_sectors(folder: Optional[str], file: Optional[str]) -> Optional[SectorTable]:
+    """Sector table of a session's timing analysis file, parsed once per file version."""
+    analysis = _analysis_file(folder, file)
+    return parse_cache.get_or_parse(analysis, "sectors", read_sectors) if analysis else None
+
+def _sector_car(table: Optional[SectorTable], folder: Optional[str], file: Optional[str], vehicle: Optional[str]) -> Optional[str]:
+    """Car number of the requested vehicle, else the session's default vehicle, else the car with most laps."""
+    if table is None or not table.cars:
+        return None
+    if vehicle:
+        return vehicle if table.select(vehicle).size else None
+    laps = _session_laps(folder, file)
+    idx = _pick_vehicle(laps, None)
+    if idx is not None and laps.vehicles[idx] and table.select(laps.vehicles[idx]).size:
+        return laps.vehicles[idx]
+    return table.default_car()
+
+
+def _sectors_or_empty(folder: Optional[str], file: Optional[str]) -> Tuple[Optional[str], Optional[SectorTable]]:
     if not file and not folder:
         folder = _first_dataset_folder()
-    path = None
-    if folder:
-        p = (base / folder).resolve()
-        if str(p).startswith(str(base.resolve())) and p.is_dir():
-            # choose first csv as a sample stream
-            for c in p.rglob("*.csv"):
-                path = c
-                break
-    elif file:
-        p = (base / file).resolve()
-        if str(p).startswith(str(base.resolve())) and p.is_file():
-            path = p
+    table = _session_sectors(folder, file)
+    return folder, table if table is not None and table.cars else None
 
+
+@app.get("/sectors/best")
+@conditional(_chart_sources)
+@offloaded
+def sectors_best(
+    folder: Optional[str] = Query(default=None),
+    file: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    driver: Optional[str] = Query(default=None),
+    level: str = Query(default="sector", pattern="^(sector|section)$"),
+):
+    """
+    Best sector (level=sector: S1-S3) or section (level=section: IM1a..FL) times of every
+    driver (car NUMBER + DRIVER_NUMBER), their rank in the field, the theoretical best lap
+    (sum of the driver's best splits) and what it gains on the driver's best actual lap.
+    """
+    folder, table = _sectors_or_empty(folder, file)
+    if table is None:
+        return {"level": level, "splits": LEVELS[level], "drivers": [], "fieldBest": []}
+    idx = table.select(vehicle, driver)
+    best, theoretical = table.best[level], table.theoretical[level]
+    ranks = np.where(table.ranks[level] > 0, table.ranks[level], -1)
+    labels = table.labels()
+    drivers = [
+        {
+            **labels[i],
+            "laps": int(table.offsets[i + 1] - table.offsets[i]),
+            "best": rounded(best[i]),
+            "rank": [r if r > 0 else None for r in ranks[i].tolist()],
+            "bestLap": rounded(table.best_lap[i]),
+            "theoreticalBest": rounded(theoretical[i]),
+            "gain": rounded(table.best_lap[i] - theoretical[i]),
+        }
+        for i in idx.tolist()
+    ]
+    field = np.where(np.all(np.isnan(best), axis=0), np.nan, np.nanmin(np.where(np.isnan(best), np.inf, best), axis=0)) if len(best) else np.empty(0)
+    return {
+        "level": level,
+        "splits": LEVELS[level],
+        "drivers": drivers,
+        "fieldBest": rounded(field),
+        "fieldTheoreticalBest": rounded(np.nansum(field)) if field.size and not np.isnan(field).any() else None,
+        "file": file or folder,
+    }
+
+
+@app.get("/sectors/rolling")
+@conditional(_chart_sources)
+@offloaded
+def sectors_rolling(
+    folder: Optional[str] = Query(default=None),
+    file: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    driver: Optional[str] = Query(default=None),
+    level: str = Query(default="sector", pattern="^(sector|section)$"),
+    window: int = Query(default=5, ge=1, le=50),
+):
+    """
+    Rolling pace per split: for every lap, the mean of each split over the driver's last
+    `window` laps, counting only green-flag laps that are not in- or out-laps.
+    Without `vehicle`, every driver in the field.
+    """
+    folder, table = _sectors_or_empty(folder, file)
+    if table is None:
+        return {"level": level, "splits": LEVELS[level], "window": window, "drivers": []}
+    pace = table.rolling(level, window)
+    labels = table.labels()
+    drivers = []
+    for i in table.select(vehicle, driver).tolist():
+        rows = table.rows(i)
+        drivers.append({**labels[i], "laps": table.laps[rows].tolist(), "pace": dict(zip(LEVELS[level], rounded(pace[rows].T)))})
+    return {"level": level, "splits": LEVELS[level], "window": window, "drivers": drivers, "file": file or folder}
+
+
+@app.get("/sectors/gaps")
+@conditional(_chart_sources)
+@offloaded
+def sectors_gaps(
+    folder: Optional[str] = Query(default=None),
+    file: Optional[str] = Query(default=None),
+    level: str = Query(default="sector", pattern="^(sector|section)$"),
+    split: Optional[str] = Query(default=None),
+):
+    """
+    Field-wide gap matrices between drivers' best splits: gaps[split][i][j] is driver i's
+    best minus driver j's (negative: i is quicker), plus `theoretical` for the theoretical
+    best lap. `split` limits the response to one of them.
+    """
+    folder, table = _sectors_or_empty(folder, file)
+    if table is None:
+        return {"level": level, "splits": LEVELS[level], "drivers": [], "gaps": {}}
+    gaps = table.gaps(level)
+    if split:
+        gaps = {split: gaps[split]} if split in gaps else {}
+    return {"level": level, "splits": LEVELS[level], "drivers": table.labels(), "gaps": {k: rounded(v) for k, v in gaps.items()}, "file": file or folder}
+
+
+@app.get("/telemetry/series")
+@conditional(_chart_sources)
+@offloaded
+def telemetry_series(
+    folder: Optional[str] = Query(default=None),
+    file: Optional[str] = Query(default=None),
+    limit: int = 500,
+    vehicle: Optional[str] = Query(default=None),
+    channels: Optional[str] = Query(default=None),
+    points: Optional[int] = Query(default=None, ge=3, le=20000),
+    start: Optional[float] = Query(default=None),
+    end: Optional[float] = Query(default=None),
+    axis: str = Query(default="time", pattern="^(time|lap)$"),
+    method: str = Query(default="minmax", pattern="^(minmax|lttb)$"),
+    format: str = Query(default="json", pattern="^(json|f32)$"),
+):
+    """
+    Telemetry channels decimated to about `points` samples (default `limit`) over a window.
+    axis=time: start/end are seconds from the first sample; axis=lap: start/end are lap numbers.
+    No window returns the whole session. `time` holds each channel's sample times in seconds
+    from `t0` (epoch seconds of the first sample).
+    Long-format (name/value) files are pivoted per vehicle; `vehicle` defaults to the first
+    one in the file and `channels` (comma separated) limits what is materialised.
+    format=f32 returns the same arrays as little-endian float32 (see `pack_f32`), NaN for gaps.
+    """
+    return _telemetry_series(folder, file, limit, vehicle, channels, points, start, end, axis, method, format)
+
+
+def _telemetry_series(
+    folder: Optional[str],
+    file: Optional[str],
+    limit: int = 500,
+    vehicle: Optional[str] = None,
+    channels: Optional[str] = None,
+    points: Optional[int] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    axis: str = "time",
+    method: str = "minmax",
+    format: str = "json",
+):
+    base = _datasets_base()
+    path = _telemetry_path(folder, file)
     if not path or not path.exists():
         # empty series
         return {"series": []}
 
-    fields = {
-        "speed": ["Speed", "speed", "mph", "kmh", "km/h"],
-        "gear": ["Gear", "gear"],
-        "throttle": ["ath", "aps", "Throttle", "throttle"],
-        "brake_f": ["pbrake_f", "brake_f", "brake"],
-        "brake_r": ["pbrake_r", "brake_r"],
-        "accx": ["accx_can", "accx"],
-        "accy": ["accy_can", "accy"],
-        "steering": ["Steering_Angle", "steering", "steering_angle"],
-        "timestamp": ["timestamp", "meta_time", "time"],
+    wanted = [c for c in (channels.split(",") if channels else SERIES_CHANNELS) if c in SERIES_CHANNELS]
+    points = points or limit
+    data: Dict[str, np.ndarray] = {}
+    times: Dict[str, np.ndarray] = {}
+    try:
+        sidecar, vehicle = _open_telemetry(path, vehicle, tuple(wanted))
+    except OSError as exc:
+        root = _sidecar_root()
+        if _writable(root):
+            log.exception("telemetry sidecar of %s failed", path)
+            return JSONResponse(status_code=500, content={"detail": f"telemetry could not be read: {exc}"})
+        # derived-data folder not writable: the head of the CSV, rows as the time axis
+        log.warning("sidecar folder %s is not writable; serving the first %d rows of %s", root, limit, path)
+        head = _cached_telemetry(path, limit)
+        for k in wanted:
+            data[k] = np.array(head.get(k, []), dtype=np.float64)
+            times[k] = np.arange(len(data[k]), dtype=np.float64)
+        t0, lo, hi = None, 0, max((len(v) for v in data.values()), default=0)
+    else:
+        if sidecar is None:
+            return {"series": []}
+        ts = sidecar.timestamps
+        t0 = float(ts[0]) if ts is not None and sidecar.rows and ts[0] == ts[0] else None
+        lo, hi = _telemetry_window(sidecar, axis, start, end, t0)
+        if ts is not None and t0 is not None:
+            x = ts
+        else:
+            x = np.arange(sidecar.rows, dtype=np.float64)
+            t0 = None
+
+        for k in wanted:
+            col_name = pick_column(sidecar.columns, TELEMETRY_FIELDS[k])
+            if col_name is None:
+                data[k] = times[k] = np.empty(0)
+                continue
+            col = sidecar.column(col_name)
+            pyramid = _cached_pyramid(path, sidecar, col_name)
+            idx = decimate(col, x, lo, hi, points, method, pyramid)
+            values = np.asarray(col[idx], dtype=np.float64)
+            data[k] = _speed_to_mph(values) if k == "speed" else values
+            times[k] = np.round(np.asarray(x[idx]) - (t0 or 0.0), 3)
+
+    meta = {
+        "t0": t0,
+        "window": {"axis": axis, "start": start, "end": end, "rows": hi - lo},
+        "points": points,
+        "method": method,
+        "vehicle": vehicle,
+        "file": str(path.relative_to(base)),
+    }
+    if format == "f32":
+        arrays = {**{f"series.{k}": v for k, v in data.items()}, **{f"time.{k}": v for k, v in times.items()}}
+        return Response(pack_f32(meta, arrays), media_type=F32_MEDIA_TYPE)
+    return {
+        "series": {k: [None if v != v else v for v in values.tolist()] for k, values in data.items()},
+        "time": {k: values.tolist() for k, values in times.items()},
+        **meta,
     }
 
-    def pick(headers, keys):
-        for k in keys:
-            if k in headers:
-                return k
+def _telemetry_path(folder: Optional[str], file: Optional[str]) -> Optional[DatasetPath]:
+    """Telemetry stream of a request: `file`, else the first CSV of `folder` (default: first dataset folder)."""
+    # Default to first available dataset folder when none provided
+    if not file and not folder:
+        folder = _first_dataset_folder()
+    if folder:
+        # choose first csv as a sample stream
+        entry = _catalog().folder(folder)
+        if entry and entry["firstCsv"]:
+            return _dataset_path(entry["firstCsv"])
         return None
+    return _resolve_file(file) if file else None
 
-    data = {k: [] for k in ["speed", "gear", "throttle", "brake_f", "brake_r", "accx", "accy", "steering"]}
-    t_key = None
+def _open_telemetry(path: Path, vehicle: Optional[str], channels: Tuple[str, ...]) -> Tuple[Optional[TelemetrySidecar], Optional[str]]:
+    """Sidecar for a wide telemetry CSV, or the pivoted per-vehicle sidecar of a long one."""
+    headers = parse_cache.get_or_parse(path, "headers", read_headers)
+    if not is_long_format(headers):
+        return _cached_sidecar(path), vehicle
+    vehicle = vehicle or parse_cache.get_or_parse(path, "first_vehicle", first_vehicle)
+    if not vehicle:
+        return None, None
+    # keyed on the pivot on disk: a re-pivot for more channels retires every earlier view
+    token = vehicle_sidecar_token(path, _sidecar_root(), vehicle)
+    sidecar = parse_cache.get_or_parse(path, "telemetry_vehicle", _pivot_vehicle, _sidecar_root(), vehicle, channels, versions=(token,))
+    return sidecar, vehicle
 
-    with path.open("r", newline="", encoding="utf-8", errors="ignore") as f:
-        reader = csv.DictReader(f)
-        headers = [h.strip() for h in (reader.fieldnames or [])]
-        t_key = pick(headers, fields["timestamp"]) or None
-        picks = {k: pick(headers, fields[k]) for k in data.keys()}
+def _pivot_vehicle(csv_path: Path, root: Path, vehicle: str, channels: Tuple[str, ...], _token: int) -> TelemetrySidecar:
+    return open_vehicle_sidecar(csv_path, root, vehicle, channels)
 
-        count = 0
-        for row in reader:
-            for k, col in picks.items():
-                if not col:
-                    continue
-                val = row.get(col)
-                if val is None or val == "":
-                    data[k].append(None)
-                else:
-                    try:
-                        num = float(val)
-                        data[k].append(num)
-                    except:
-                        try:
-                            data[k].append(float(val.replace(",", "")))
-                        except:
-                            data[k].append(None)
-            count += 1
-            if count >= limit:
-                break
+def _telemetry_window(sidecar: TelemetrySidecar, axis: str, start: Optional[float], end: Optional[float], t0: Optional[float]) -> Tuple[int, int]:
+    """Row range [lo, hi) of a sidecar covered by a time or lap window."""
+    if start is None and end is None:
+        return 0, sidecar.rows
+    if axis == "lap":
+        lap_col = pick_column(sidecar.columns, LAP_COLUMNS)
+        if lap_col is None:
+            return 0, sidecar.rows
+        laps = np.asarray(sidecar.column(lap_col))
+        mask = np.ones(sidecar.rows, dtype=bool)
+        if start is not None:
+            mask &= laps >= start
+        if end is not None:
+            mask &= laps <= end
+        idx = np.flatnonzero(mask)
+        return (int(idx[0]), int(idx[-1]) + 1) if idx.size else (0, 0)
+    if t0 is None:
+        # no timestamps: treat start/end as row numbers
+        lo = int(start) if start is not None else 0
+        hi = int(end) if end is not None else sidecar.rows
+        return max(0, lo), min(sidecar.rows, max(lo, hi))
+    return sidecar.time_range(
+        t0 + start if start is not None else None,
+        t0 + end if end is not None else None,
+    )
+
+def _writable(folder: Path) -> bool:
+    """Whether files can be created in `folder` (or, while it does not exist, its nearest parent)."""
+    while not folder.exists() and folder != folder.parent:
+        folder = folder.parent
+    return os.access(folder, os.W_OK)
+
+def _speed_is_kmh(values: np.ndarray) -> bool:
+    # heuristic: if typical values > 120, we assume km/h
+    vals = values[~np.isnan(values)]
+    return bool(vals.size and np.count_nonzero(vals > 120) > vals.size / 2)
 
+def _speed_to_mph(values: np.ndarray) -> np.ndarray:
     # convert speed to mph if appears km/h
-    # heuristic: if typical values > 120, we assume km/h and convert
-    if data["speed"]:
-        vals = [v for v in data["speed"] if v is not None]
-        if vals and (sum(1 for v in vals if v > 120) > len(vals) / 2):
-            data["speed"] = [round(v * 0.621371, 2) if v is not None else None for v in data["speed"]]
+    if _speed_is_kmh(values):
+        return np.round(values * 0.621371, 2)
+    return values
+
+def _extract_telemetry(csv_path: Path, limit: int) -> Dict[str, List[Optional[float]]]:
+    """Read up to `limit` rows of wide-format telemetry channels from a CSV."""
+    cols = read_columns(csv_path, {k: TELEMETRY_FIELDS[k] for k in SERIES_CHANNELS}, limit=limit)
+    data = {}
+    for k in SERIES_CHANNELS:
+        values = to_numbers(cols.get(k, []))
+        if k == "speed":
+            values = _speed_to_mph(values)
+        data[k] = [None if v != v else v for v in values.tolist()]
+    return data
+
+OVERLAY_CHANNELS = ("speed", "throttle", "brake_f", "gear", "steering")
+# most laps one overlay draws
+MAX_OVERLAY_LAPS = 10
+
+
+def _overlay_sources(folder: Optional[str] = None, file: Optional[str] = None, **params) -> List[Path]:
+    """Chart sources of the session plus its telemetry file."""
+    if not file and not folder:
+        folder = _first_dataset_folder()
+    path = _overlay_telemetry_path(folder, file)
+    session = folder or posixpath.dirname(normalise_rel(file) or "")
+    return _chart_sources(session, **params) + ([path] if path else [])
+
+
+@app.get("/telemetry/overlay")
+@conditional(_overlay_sources)
+@offloaded
+def telemetry_overlay(
+    folder: Optional[str] = Query(default=None),
+    file: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    laps: Optional[str] = Query(default=None),
+    vehicles: Optional[str] = Query(default=None),
+    count: int = Query(default=3, ge=1, le=MAX_OVERLAY_LAPS),
+    channels: Optional[str] = Query(default=None),
+    points: int = Query(default=500, ge=50, le=5000),
+):
+    """
+    Laps overlaid on a common distance axis with a delta-time trace against the first.
+    `laps` (comma separated lap numbers) compares laps of one `vehicle`; `vehicles`
+    (comma separated) compares those cars' best laps; neither compares the best laps of
+    the `count` fastest cars. `file` is a telemetry CSV, else the folder's telemetry file.
+    A wide (one column per channel) file holds one car: the one its vehicle_id names,
+    else `vehicle` or the session's default car; laps of other cars are listed as missing.
+    """
+    return _telemetry_overlay(folder, file, vehicle, laps, vehicles, count, channels, points)
+
+
+def _telemetry_overlay(
+    folder: Optional[str],
+    file: Optional[str],
+    vehicle: Optional[str] = None,
+    laps: Optional[str] = None,
+    vehicles: Optional[str] = None,
+    count: int = 3,
+    channels: Optional[str] = None,
+    points: int = 500,
+):
+    if not file and not folder:
+        folder = _first_dataset_folder()
+    wanted = [c for c in (channels.split(",") if channels else OVERLAY_CHANNELS) if c in SERIES_CHANNELS]
+    path = _overlay_telemetry_path(folder, file)
+    session = folder if folder else posixpath.dirname(normalise_rel(file) or "")
+    table = _session_laps(session, None)
+    if path is None or table is None or not table.vehicles:
+        return {"distance": [], "laps": [], "missing": [], "channels": wanted}
+
+    read = tuple(dict.fromkeys(["speed", *wanted]))
+    picks = _overlay_picks(table, vehicle, laps, vehicles, count)
+    owner = _telemetry_owner(path)
+    # a wide file is one car's trace: other cars' lap times would cut it at the wrong places
+    own = None if owner is None else (table.index_of(owner) if owner else _pick_vehicle(table, vehicle))
+    drawn, missing = [], []
+    for idx, row in picks:
+        name, lap = table.vehicles[idx], int(table.laps[row])
+        trace = _overlay_lap(path, table, idx, row, read, points) if owner is None or idx == own else None
+        if trace is None:
+            missing.append({"vehicle": name, "lap": lap})
+        else:
+            drawn.append((name, lap, float(table.times[row]), trace))
+    base = {"channels": wanted, "points": points, "file": str(path.relative_to(_datasets_base()))}
+    if not drawn:
+        return {"distance": [], "laps": [], "missing": missing, **base}
+
+    # one unit decision for every lap, the same one /telemetry/series makes, so speeds stay comparable
+    raw = np.vstack([trace.channels["speed"] for *_, trace in drawn])
+    kmh = _speed_is_kmh(raw)
+    scale = KMH_TO_MS if kmh else MPH_TO_MS
+    speeds = np.round(raw * 0.621371, 2) if kmh else raw
+    aligned = overlay([trace for *_, trace in drawn], scale)
+    out = []
+    for i, (name, lap, lap_time, trace) in enumerate(drawn):
+        values = {k: speeds[i] if k == "speed" else trace.channels[k] for k in wanted}
+        out.append({
+            "vehicle": name,
+            "lap": lap,
+            "lapTime": None if lap_time != lap_time else round(lap_time, 3),
+            "length": round(trace.length * scale, 1),
+            "samples": trace.samples,
+            "channels": {k: rounded(v) for k, v in values.items()},
+            "elapsed": rounded(trace.elapsed),
+            "delta": rounded(aligned["delta"][i]),
+        })
+    return {
+        "distance": np.round(aligned["distance"], 1).tolist(),
+        "reference": {"vehicle": drawn[0][0], "lap": drawn[0][1]},
+        "laps": out,
+        "missing": missing,
+        **base,
+    }
+
+
+def _overlay_telemetry_path(folder: Optional[str], file: Optional[str]) -> Optional[DatasetPath]:
+    """Telemetry CSV of an overlay: `file`, else the telemetry file of `folder`."""
+    if file and not folder:
+        return _resolve_file(file)
+    entry = _catalog().folder(folder) if folder else None
+    if not entry or not entry.get("telemetryFile"):
+        return None
+    return _dataset_path(entry["telemetryFile"])
+
+
+def _telemetry_owner(path: Path) -> Optional[str]:
+    """None for long-format telemetry (any vehicle); else the vehicle a wide file records, "" when it names none."""
+    if is_long_format(parse_cache.get_or_parse(path, "headers", read_headers)):
+        return None
+    return parse_cache.get_or_parse(path, "first_vehicle", first_vehicle) or ""
+
+
+def _overlay_picks(table: LapTable, vehicle: Optional[str], laps: Optional[str], vehicles: Optional[str], count: int) -> List[Tuple[int, int]]:
+    """(vehicle index, lap table row) of every lap to draw, the reference first."""
+    if laps:
+        idx = _pick_vehicle(table, vehicle)
+        if idx is None:
+            return []
+        sl = table.rows(idx)
+        numbers = table.laps[sl]
+        picks = []
+        for part in laps.split(","):
+            found = np.flatnonzero(numbers == int(part)) if part.strip().isdigit() else []
+            if len(found):
+                picks.append((idx, sl.start + int(found[0])))
+        return picks[:MAX_OVERLAY_LAPS]
+    if vehicles:
+        idxs = [table.index_of(v.strip()) for v in vehicles.split(",") if v.strip()]
+        idxs = list(dict.fromkeys(i for i in idxs if i is not None))
+    else:
+        best = table.best_laps()
+        ranked = [int(i) for i in np.argsort(np.where(np.isnan(best), np.inf, best), kind="stable") if best[i] == best[i]]
+        idxs = ranked[:count]
+    plausible = table.plausible()
+    picks = []
+    for idx in idxs[:MAX_OVERLAY_LAPS]:
+        sl = table.rows(idx)
+        times = np.where(plausible[sl], table.times[sl], np.inf)
+        if len(times) and np.isfinite(times).any():
+            picks.append((idx, sl.start + int(np.argmin(times))))
+    return picks
+
+
+def _overlay_lap(path: Path, table: LapTable, idx: int, row: int, channels: Tuple[str, ...], points: int) -> Optional[LapTrace]:
+    """One lap on the distance grid, resampled once per telemetry version, lap bounds and grid."""
+    sidecar, name = _open_telemetry(path, table.vehicles[idx], channels)
+    if sidecar is None or sidecar.timestamps is None:
+        return None
+    lo, hi = _overlay_segments(path, sidecar, table, idx)
+    sl = table.rows(idx)
+    i = row - sl.start
+    start = float(lap_bounds(table.starts[sl], table.ends[sl], table.times[sl])[0][i])
+    return parse_cache.get_or_parse(
+        path, "overlay_lap", _resample_overlay_lap, sidecar.root, table.vehicles[idx], int(table.laps[row]), channels, points,
+        versions=(sidecar, int(lo[i]), int(hi[i]), start),
+    )
+
+
+def _overlay_segments(path: Path, sidecar: TelemetrySidecar, table: LapTable, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row range of every lap of one vehicle in time order, cut once per sidecar and lap table version."""
+    sl = table.rows(idx)
+    bounds = lap_bounds(table.starts[sl], table.ends[sl], table.times[sl])
+    return parse_cache.get_or_parse(
+        path, "overlay_segments", _segment_vehicle, sidecar.root, table.vehicles[idx], versions=(sidecar, bounds[0].tobytes(), bounds[1].tobytes())
+    )
+
+
+def _segment_vehicle(path: Path, _root: Path, _vehicle: str, sidecar: TelemetrySidecar, starts: bytes, ends: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    stamps = np.asarray(sidecar.timestamps)
+    order = _time_order(path, sidecar)
+    return segment(stamps if order is None else stamps[order], np.frombuffer(starts), np.frombuffer(ends))
+
+
+def _time_order(path: Path, sidecar: TelemetrySidecar) -> Optional[np.ndarray]:
+    """Rows of a sidecar in time order; None when it is stored that way (wide CSVs need not be)."""
+    if sidecar.timestamps_sorted:
+        return None
+    return parse_cache.get_or_parse(path, "telemetry_order", _sort_timestamps, sidecar.root, versions=(sidecar,))
+
+
+def _sort_timestamps(path: Path, _root: Path, sidecar: TelemetrySidecar) -> np.ndarray:
+    return np.argsort(np.asarray(sidecar.timestamps), kind="stable")
+
+
+def _resample_overlay_lap(
+    path: Path, _root: Path, _vehicle: str, _lap: int, channels: Tuple[str, ...], points: int, sidecar: TelemetrySidecar, lo: int, hi: int, start: float
+) -> Optional[LapTrace]:
+    if hi - lo < MIN_LAP_SAMPLES:
+        return None
+    order = _time_order(path, sidecar)
+    rows = slice(lo, hi) if order is None else order[lo:hi]
+    data = {}
+    for k in channels:
+        col_name = pick_column(sidecar.columns, TELEMETRY_FIELDS[k])
+        data[k] = np.asarray(sidecar.column(col_name)[rows], dtype=np.float64) if col_name else np.full(hi - lo, np.nan)
+    t = np.asarray(sidecar.timestamps[rows], dtype=np.float64)
+    return resample_lap(t, start, data["speed"], data, points)
+
+
+SECTION_NAMES = (
+    ["S1.a", "S1.b", "S2.a", "S2.b", "S3.a", "S3.b"],
+    ["IM1a", "IM1", "IM2a", "IM2", "IM3a", "FL"],
+)
 
-    return {"series": data, "file": str(path.relative_to(base))}
 
 def _extract_sections(csv_path: Path) -> Optional[Tuple[List[int], Dict[str, List[float]]]]:
     """Parse CSV for per-section columns if present.
@@ -540,66 +1463,253 @@ def _extract_sections(csv_path: Path) -> Optional[Tuple[List[int], Dict[str, Lis
     Returns (laps, timesBySection) or None if not found.
     """
     try:
-        with csv_path.open("r", newline="", encoding="utf-8", errors="ignore") as f:
-            reader = csv.DictReader(f)
-            headers = [h.strip() for h in (reader.fieldnames or [])]
-            # accepted section column variants
-            s_names = ["S1.a", "S1.b", "S2.a", "S2.b", "S3.a", "S3.b"]
-            im_names = ["IM1a", "IM1", "IM2a", "IM2", "IM3a", "FL"]
-            # normalise a function to get numeric from value
-            def to_num(v: str) -> Optional[float]:
-                if v is None or v == "":
-                    return None
-                try:
-                    x = float(v)
-                    return x / 1000.0 if abs(x) > 1000 else x
-                except:
-                    try:
-                        return float(v.replace(",", ""))
-                    except:
-                        return None
-
-            lap_key = None
-            for k in ["lap", "Lap", "lap_number", "LapNumber"]:
-                if k in headers:
-                    lap_key = k
-                    break
-
-            # Decide which section naming exists
-            active = None
-            if all(name in headers for name in s_names):
-                active = s_names
-            elif all(name in headers for name in im_names):
-                active = im_names
-            if not active:
-                return None
-
-            # Aggregate per lap
-            per_lap: Dict[int, Dict[str, float]] = {}
-            for row in reader:
-                lap_num = None
-                if lap_key and row.get(lap_key):
-                    try:
-                        lap_num = int(float(row[lap_key]))
-                    except:
-                        lap_num = None
-                if lap_num is None:
-                    # if no lap column, assume one row per lap and increment
-                    lap_num = len(per_lap) + 1
-                if lap_num not in per_lap:
-                    per_lap[lap_num] = {name: 0.0 for name in active}
-                for name in active:
-                    val = to_num(row.get(name))
-                    if val is not None:
-                        per_lap[lap_num][name] += float(val)
-
-            if not per_lap:
-                return None
-            laps = sorted(per_lap.keys())
-            times_by_section: Dict[str, List[float]] = {name: [] for name in active}
-            for lap in laps:
-                for name in active:
-                    times_by_section[name].append(round(per_lap[lap].get(name, 0.0), 3))
-            return laps, times_by_section
+        headers = read_header(csv_path)[1]
+        # Decide which section naming exists
+        active = next((names for names in SECTION_NAMES if all(n in headers for n in names)), None)
+        if not active:
+            return None
+        cols = read_columns(csv_path, {"lap": LAP_COLUMNS, **{n: [n] for n in active}})
     except Exception:
         return None
+    rows = len(cols[active[0]])
+    if not rows:
+        return None
+    lap = to_numbers(cols["lap"]) if "lap" in cols else np.full(rows, np.nan)
+    # rows without a lap number count as one lap each
+    lap = np.where(np.isnan(lap), np.arange(1, rows + 1), lap).astype(np.int64)
+    laps, row_lap = np.unique(lap, return_inverse=True)
+    times_by_section: Dict[str, List[float]] = {}
+    for name in active:
+        vals = to_numbers(cols[name])
+        # millisecond values
+        vals = np.where(np.abs(vals) > 1000, vals / 1000.0, vals)
+        sums = np.bincount(row_lap.reshape(-1), weights=np.nan_to_num(vals), minlength=len(laps))
+        times_by_section[name] = np.round(sums, 3).tolist()
+    return laps.tolist(), times_by_section
+
+
+DASHBOARD_PANELS = ("summary", "recommendations", "top3", "tyreDegradation", "sections", "telemetry")
+
+
+@app.get("/dashboard/bundle")
+async def dashboard_bundle(
+    folder: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    panels: Optional[str] = Query(default=None),
+    channels: Optional[str] = Query(default=None),
+    points: int = Query(default=500, ge=3, le=20000),
+    stream: bool = Query(default=False),
+):
+    """
+    Every dashboard panel of one folder/vehicle in one response: `panels` (comma separated,
+    default all of DASHBOARD_PANELS) are computed concurrently from the same parsed tables,
+    so a cold folder is resolved and parsed once rather than once per panel request.
+    Each panel is what its own route returns (`telemetry`: /telemetry/series with
+    `channels` and `points`); a panel that fails is reported under `errors`.
+    stream=true sends NDJSON instead, one {"panel", "data"} line as each panel is ready.
+    """
+    wanted = [p for p in (panels.split(",") if panels else DASHBOARD_PANELS) if p in DASHBOARD_PANELS]
+    folder = folder or await offload(_first_dataset_folder)
+    jobs = {name: _dashboard_job(name, folder, vehicle, channels, points) for name in wanted}
+    done = asyncio.as_completed([_dashboard_panel(name, *job) for name, job in jobs.items()])
+    if stream:
+        async def lines():
+            for panel in done:
+                name, data, error = await panel
+                yield dumps({"panel": name, "data": data} if error is None else {"panel": name, "error": error}) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    out: Dict[str, Dict] = {"panels": {}, "errors": {}}
+    for panel in done:
+        name, data, error = await panel
+        if error is None:
+            out["panels"][name] = data
+        else:
+            out["errors"][name] = error
+    # panels in the order they were asked for
+    out["panels"] = {name: out["panels"][name] for name in wanted if name in out["panels"]}
+    return Response(dumps({"folder": folder, "vehicle": vehicle, **out}), media_type="application/json")
+
+
+def _dashboard_job(name: str, folder: Optional[str], vehicle: Optional[str], channels: Optional[str], points: int) -> Tuple:
+    if name == "summary":
+        return _summary, (folder, None, vehicle)
+    if name == "recommendations":
+        return _recommendations, (folder, vehicle)
+    if name == "top3":
+        return _top3, (folder, vehicle)
+    if name == "tyreDegradation":
+        return _tyre_degradation, (folder, None, vehicle)
+    if name == "sections":
+        return _sections, (folder, None, vehicle)
+    return _telemetry_series, (folder, None, points, vehicle, channels, points)
+
+
+async def _dashboard_panel(name: str, fn, args: Tuple) -> Tuple[str, Optional[Dict], Optional[str]]:
+    try:
+        # same key as a concurrent bundle for the same panel: one computation
+        return name, await offload(fn, *args, key=("dashboard", name, args)), None
+    except RequestTimeout:
+        return name, None, "timed out"
+    except Exception as e:  # one broken panel must not blank the others
+        return name, None, str(e) or type(e).__name__
+
+
+LIVE_EVENTS = ("laps", "summary", "pitWindow", "telemetry")
+# replay: wall-clock seconds between frames, and the most samples per channel in one frame
+REPLAY_TICK_SECONDS = 0.25
+REPLAY_FRAME_POINTS = 2000
+
+
+@app.get("/live/stream")
+async def live_stream(
+    folder: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    events: Optional[str] = Query(default=None),
+    channels: Optional[str] = Query(default=None),
+):
+    """
+    Server-Sent Events for a session as it is ingested: `laps` (new or corrected laps),
+    `summary` and `pitWindow` when they change, and `telemetry` samples past the last
+    ones sent. One poll per folder/vehicle feeds every subscriber; `events` and
+    `channels` (comma separated) only filter what this client receives.
+    """
+    folder = folder or await offload(_first_dataset_folder)
+    wanted = set(events.split(",")) if events else set(LIVE_EVENTS)
+    keep = [c for c in channels.split(",") if c in SERIES_CHANNELS] if channels else None
+
+    def select(event: str, data: Dict) -> Optional[Dict]:
+        if event not in wanted:
+            return None
+        if event == "telemetry" and keep is not None:
+            return {**data, "series": {k: v for k, v in data["series"].items() if k in keep}}
+        return data
+
+    async def frames():
+        async with hub.subscribe(("live", folder, vehicle), functools.partial(_live_poll, folder, vehicle)) as sub:
+            async for frame in sse_stream(sub, select):
+                yield frame
+
+    return StreamingResponse(frames(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def _live_poll(folder: Optional[str], vehicle: Optional[str], state: Optional[Dict]) -> Tuple[List[Tuple[str, Dict]], Dict]:
+    """One tick of a live topic: the events that changed since `state`, and the new state."""
+    state = state or {"laps": {}, "summary": None, "pitWindow": None, "telemetry": None}
+    events: List[Tuple[str, Dict]] = []
+    table = _session_laps(folder, None)
+    idx = _pick_vehicle(table, vehicle)
+    if idx is not None:
+        name = table.vehicles[idx] or None
+        laps, times = table.lap_times(idx)
+        sent = state["laps"]
+        new = [{"lap": int(lap), "time": round(float(t), 3)} for lap, t in zip(laps.tolist(), times.tolist()) if sent.get(lap) != t]
+        if new:
+            sent.update(zip(laps.tolist(), times.tolist()))
+            events.append(("laps", {"vehicle": name, "laps": new}))
+            model = _session_degradation(folder, None)
+            car_idx = _degradation_car(model, folder, None, vehicle)
+            if car_idx is not None:
+                car = model.car(car_idx)
+                window = {"vehicle": name, "pitWindow": car["pitWindow"], "crossoverLap": car["crossoverLap"], "slope": car["slope"]}
+                if window != state["pitWindow"]:
+                    state["pitWindow"] = window
+                    events.append(("pitWindow", window))
+        summary = _summary(folder, None, vehicle)
+        if summary != state["summary"]:
+            state["summary"] = summary
+            events.append(("summary", summary))
+    samples, state["telemetry"] = _new_telemetry(folder, vehicle, state["telemetry"])
+    if samples:
+        events.append(("telemetry", samples))
+    return events, state
+
+
+def _new_telemetry(folder: Optional[str], vehicle: Optional[str], last: Optional[Tuple]) -> Tuple[Optional[Dict], Optional[Tuple]]:
+    """
+    Telemetry rows stamped after the newest one already sent, once the file has changed.
+    `last` is (file fingerprint, newest timestamp sent); the first call only records it.
+    """
+    path = _telemetry_path(folder, None)
+    version = _fingerprint_or_none(path)
+    if version is None or (last is not None and last[0] == version):
+        return None, last
+    try:
+        sidecar, vehicle = _open_telemetry(path, vehicle, tuple(SERIES_CHANNELS))
+    except OSError:
+        return None, last
+    ts = sidecar.timestamps if sidecar is not None else None
+    if ts is None or not sidecar.rows:
+        return None, (version, None)
+    ts = np.asarray(ts)
+    newest = float(np.nanmax(ts))
+    if last is None or last[1] is None:
+        return None, (version, newest)
+    rows = np.flatnonzero(ts > last[1])[-MAX_PENDING_SAMPLES:]
+    if not rows.size:
+        return None, (version, newest)
+    return _telemetry_frame(sidecar, rows, vehicle, path), (version, newest)
+
+
+def _telemetry_frame(sidecar: TelemetrySidecar, rows: np.ndarray, vehicle: Optional[str], path: DatasetPath) -> Dict:
+    """Samples of every series channel at `rows`, times in epoch seconds."""
+    series: Dict[str, List[Optional[float]]] = {}
+    for k in SERIES_CHANNELS:
+        col_name = pick_column(sidecar.columns, TELEMETRY_FIELDS[k])
+        if col_name is None:
+            continue
+        values = np.asarray(sidecar.column(col_name)[rows], dtype=np.float64)
+        if k == "speed":
+            values = _speed_to_mph(values)
+        series[k] = [None if v != v else v for v in values.tolist()]
+    times = np.round(np.asarray(sidecar.timestamps[rows], dtype=np.float64), 3).tolist()
+    return {"vehicle": vehicle, "file": str(path.relative_to(_datasets_base())), "time": times, "series": series}
+
+
+@app.get("/live/replay")
+async def live_replay(
+    folder: Optional[str] = Query(default=None),
+    file: Optional[str] = Query(default=None),
+    vehicle: Optional[str] = Query(default=None),
+    speed: float = Query(default=1.0, ge=1.0, le=50.0),
+    start: Optional[float] = Query(default=None, ge=0),
+    channels: Optional[str] = Query(default=None),
+):
+    """
+    Server-Sent Events replaying a recorded session's telemetry at `speed` x real time
+    (1-50), from `start` seconds into the session. Frames follow the wall clock: a client
+    that reads slowly gets fewer, larger frames (at most REPLAY_FRAME_POINTS samples each)
+    rather than falling behind. Ends with an `end` event.
+    """
+    path = await offload(_telemetry_path, folder, file)
+    if not path or not path.exists():
+        return JSONResponse(status_code=404, content={"detail": "no telemetry for this dataset"})
+    wanted = tuple(c for c in (channels.split(",") if channels else SERIES_CHANNELS) if c in SERIES_CHANNELS)
+    try:
+        sidecar, vehicle = await offload(_open_telemetry, path, vehicle, wanted)
+    except OSError:
+        sidecar = None
+    if sidecar is None or sidecar.timestamps is None or not sidecar.rows or not sidecar.timestamps_sorted:
+        return JSONResponse(status_code=404, content={"detail": "telemetry has no ordered timestamps to replay"})
+
+    async def frames():
+        ts = sidecar.timestamps
+        t0 = float(ts[0])
+        sent = sidecar.time_range(t0 + start, None)[0] if start else 0
+        loop = asyncio.get_running_loop()
+        began, origin = loop.time(), float(ts[sent]) if sent < sidecar.rows else t0
+        yield b"retry: 2000\n\n"
+        while sent < sidecar.rows:
+            await asyncio.sleep(REPLAY_TICK_SECONDS)
+            clock = origin + (loop.time() - began) * speed
+            upto = int(np.searchsorted(ts, clock, side="right"))
+            if upto <= sent:
+                continue
+            rows = np.arange(sent, upto, max(1, -(-(upto - sent) // REPLAY_FRAME_POINTS)))
+            frame = _telemetry_frame(sidecar, rows, vehicle, path)
+            frame["series"] = {k: v for k, v in frame["series"].items() if k in wanted}
+            yield sse_frame("telemetry", {**frame, "t0": t0, "clock": round(clock - t0, 3), "speed": speed})
+            sent = upto
+        yield sse_frame("end", {"t0": t0, "rows": sidecar.rows})
+
+    return StreamingResponse(frames(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,229 @@
+"""
+Request and parse-stage instrumentation, exposed as Prometheus text.
+
+MetricsMiddleware times every request against its route template. Inside a request,
+`span(name)` times a stage (dataset resolution, a parse, a model fit); spans land in
+a per-request trace held in a contextvar, which the executor copies into worker
+threads, so stages timed off the event loop still belong to their request. The
+time between the handler returning and the response starting is recorded as the
+`serialise` stage. CSV readers report rows and bytes read through `count_read`.
+
+Requests slower than TRACKOTA_SLOW_REQUEST_MS (unset: off) are logged to the
+`trackota.slow` logger with their stage breakdown.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# seconds; Prometheus client defaults plus the long tail of cold parses
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SLOW_REQUEST_MS = float(os.getenv("TRACKOTA_SLOW_REQUEST_MS", "0") or 0)
+
+slow_log = logging.getLogger("trackota.slow")
+
+
+class _Trace:
+    """Stages, rows and bytes of one request."""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float, float]] = []
+        self.rows = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        with self.lock:
+            for name, _, seconds in self.spans:
+                stage = out.setdefault(name, {"ms": 0.0, "count": 0})
+                stage["ms"] = round(stage["ms"] + seconds * 1000.0, 3)
+                stage["count"] += 1
+        return out
+
+
+_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("trackota_trace", default=None)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def snapshot(self) -> Tuple[Dict, Dict]:
+        with self._lock:
+            hists = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+            return hists, dict(self._counters)
+
+
+registry = _Registry()
+
+HELP = {
+    "trackota_request_duration_seconds": ("histogram", "Request latency by route template and status."),
+    "trackota_stage_duration_seconds": ("histogram", "Time spent in a named stage (resolve, parse.<kind>, walk, serialise, ...)."),
+    "trackota_parse_duration_seconds": ("histogram", "Parse-cache misses: time to parse one file, by parse kind."),
+    "trackota_rows_read_total": ("counter", "CSV rows read."),
+    "trackota_bytes_read_total": ("counter", "CSV bytes read."),
+    "trackota_slow_requests_total": ("counter", "Requests over TRACKOTA_SLOW_REQUEST_MS."),
+}
+
+
+def record(name: str, started: float, seconds: float) -> None:
+    """Add a timed stage (perf_counter start, duration) to the stage histogram and the current trace."""
+    registry.observe("trackota_stage_duration_seconds", seconds, stage=name)
+    trace = _trace.get()
+    if trace is not None:
+        with trace.lock:
+            trace.spans.append((name, started, seconds))
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, started, time.perf_counter() - started)
+
+
+def observe_parse(kind: str, seconds: float) -> None:
+    registry.observe("trackota_parse_duration_seconds", seconds, kind=kind)
+
+
+def count_read(rows: int, nbytes: int) -> None:
+    registry.inc("trackota_rows_read_total", rows)
+    registry.inc("trackota_bytes_read_total", nbytes)
+    trace = _trace.get()
+    if trace is not None:
+        with trace.lock:
+            trace.rows += rows
+            trace.bytes += nbytes
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency per route template, `serialise` stage, slow-request log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = _Trace()
+        token = _trace.set(trace)
+        started = time.perf_counter()
+        response: Dict[str, Any] = {"status": 500, "at": None}
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["at"] = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _trace.reset(token)
+            self._record(scope, trace, started, response)
+
+    def _record(self, scope, trace: _Trace, started: float, response: Dict[str, Any]) -> None:
+        seconds = time.perf_counter() - started
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        handler = [s for s in trace.spans if s[0] == "handler"]
+        if handler and response["at"] is not None:
+            end = max(s[1] + s[2] for s in handler)
+            serialise = max(0.0, response["at"] - end)
+            registry.observe("trackota_stage_duration_seconds", serialise, stage="serialise")
+            with trace.lock:
+                trace.spans.append(("serialise", end, serialise))
+        status = str(response["status"])
+        registry.observe("trackota_request_duration_seconds", seconds, method=scope["method"], route=route, status=status)
+        if SLOW_REQUEST_MS and seconds * 1000.0 >= SLOW_REQUEST_MS:
+            registry.inc("trackota_slow_requests_total", route=route)
+            slow_log.warning(json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "route": route,
+                "status": response["status"],
+                "ms": round(seconds * 1000.0, 3),
+                "stages": trace.breakdown(),
+                "rows": trace.rows,
+                "bytes": trace.bytes,
+            }))
+
+
+def _labels(pairs: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(pairs) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(extra: Optional[Dict[str, Tuple[str, str, Optional[float]]]] = None) -> str:
+    """
+    Prometheus text exposition of every metric, plus values read from elsewhere at
+    scrape time: `extra` maps name -> (type, help, value); None values are skipped.
+    """
+    hists, counters = registry.snapshot()
+    lines: List[str] = []
+    for name, (kind, text) in HELP.items():
+        rows = [(k, v) for k, v in (hists.items() if kind == "histogram" else counters.items()) if k[0] == name]
+        if not rows:
+            continue
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for (_, labels), value in sorted(rows):
+            if kind == "histogram":
+                counts, total, count = value
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {_num(value)}")
+    for name, (kind, text, value) in (extra or {}).items():
+        if value is None:
+            continue
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}", f"{name} {_num(value)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+"""
+Pit-window optimiser.
+
+Searches 0-, 1- and 2-stop plans (pit laps x compound sequences) against the
+calibrated pace / degradation / pit-loss model. A stint's time has a closed form
+(L laps from fresh tyres: L * (pace + gain) + slope * mult * L(L-1)/2), so every
+stint cost is a table lookup. A dynamic-programming pass gives, for every lap, the
+cheapest way to finish the race after pitting there; branch-and-bound then walks
+the plans in order of that exact lower bound and stops as soon as a branch cannot
+beat the N-th best plan found so far.
+
+Each returned plan is then run through the Monte Carlo simulator to attach a risk
+figure (spread of finish times under noise and safety cars).
+"""
+import heapq
+import itertools
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .simulation import COMPOUNDS, Calibration, simulate_traces
+
+# traces per plan for the risk estimate; seeded so repeated queries agree
+RISK_TRACES = 2000
+RISK_SEED = 0
+
+Plan = Tuple[Tuple[int, str], ...]
+
+
+def _stint_tables(calib: Calibration, compounds: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Time of a stint of L = 0..total laps on the starting tyres, and on each fresh compound."""
+    length = np.arange(calib.total_laps + 1, dtype=np.float64)
+    wear = calib.slope * length * (length - 1) / 2.0
+    start = length * calib.pace + wear
+    fresh = np.array([length * (calib.pace + COMPOUNDS[c][0]) + COMPOUNDS[c][1] * wear for c in compounds])
+    return start, fresh
+
+
+def optimise(
+    calib: Calibration,
+    compounds: Sequence[str],
+    max_stops: int = 2,
+    top: int = 10,
+    min_stint: int = 1,
+) -> List[Tuple[float, Plan]]:
+    """The `top` fastest plans as (expected race time, ((pit lap, compound), ...)), fastest first."""
+    total = calib.total_laps
+    loss = calib.pit_loss
+    compounds = [c for c in compounds if c in COMPOUNDS]
+    if total < 1:
+        return []
+    start, fresh = _stint_tables(calib, compounds)
+    # every lap pays the same fuel correction whatever the plan
+    fuel = -calib.fuel_effect * total * (total - 1) / 2.0
+    heap: List[Tuple[float, int, Plan]] = []
+    counter = itertools.count()
+
+    def threshold() -> float:
+        return -heap[0][0] if len(heap) >= top else np.inf
+
+    def push(cost: float, plan: Plan) -> None:
+        item = (-cost, next(counter), plan)
+        if len(heap) < top:
+            heapq.heappush(heap, item)
+        elif cost < -heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    push(float(start[total]), ())
+    if max_stops < 1 or not compounds or total < 2 * min_stint:
+        return _ranked(heap, fuel)
+
+    laps = np.arange(total + 1)
+    # finish[a]: cheapest last stint after pitting at lap a
+    finish = np.full(total + 1, np.inf)
+    last_ok = (laps >= min_stint) & (total - laps >= min_stint)
+    finish[last_ok] = fresh[:, np.clip(total - laps, 0, total)].min(axis=0)[last_ok]
+
+    # one stop: bound is exact (best compound for the last stint)
+    one_bound = start[laps] + loss + finish
+    for p in np.argsort(one_bound):
+        if not np.isfinite(one_bound[p]) or one_bound[p] >= threshold():
+            break
+        for ci, c in enumerate(compounds):
+            push(float(start[p] + loss + fresh[ci, total - p]), ((int(p), c),))
+
+    if max_stops < 2:
+        return _ranked(heap, fuel)
+
+    # two stops: after pitting at p1 on compound c1, the best second stop p2 costs
+    # fresh[c1, p2 - p1] + loss + finish[p2]; the cheapest over c1 and p2 bounds the branch
+    gaps = laps[None, :] - laps[:, None]
+    valid = (gaps >= min_stint) & np.isfinite(finish)[None, :]
+    middle = np.where(valid[None], fresh[:, np.clip(gaps, 0, total)], np.inf)
+    second = middle + loss + finish[None, None, :]
+    first_ok = laps >= min_stint
+    two_bound = np.where(first_ok, start[laps] + loss + second.min(axis=(0, 2)), np.inf)
+    for p1 in np.argsort(two_bound):
+        if not np.isfinite(two_bound[p1]) or two_bound[p1] >= threshold():
+            break
+        head = start[p1] + loss
+        for c1i in np.argsort(second[:, p1].min(axis=1)):
+            row = head + second[c1i, p1]
+            if row.min() >= threshold():
+                break
+            for p2 in np.argsort(row):
+                if not np.isfinite(row[p2]) or row[p2] >= threshold():
+                    break
+                for c2i, c2 in enumerate(compounds):
+                    cost = head + middle[c1i, p1, p2] + loss + fresh[c2i, total - p2]
+                    push(float(cost), ((int(p1), compounds[c1i]), (int(p2), c2)))
+    return _ranked(heap, fuel)
+
+
+def _ranked(heap: List[Tuple[float, int, Plan]], fuel: float) -> List[Tuple[float, Plan]]:
+    return sorted((-neg + fuel, plan) for neg, _, plan in heap)
+
+
+def plan_risk(calib: Calibration, plans: List[Plan], sc: Tuple[float, int, int]) -> List[Dict[str, Any]]:
+    """
+    Finish-time percentiles of each plan over seeded random traces. The risk level comes
+    from how much the plan's result swings against the first (fastest expected) plan on
+    the same traces, i.e. its own exposure to noise and safety-car timing.
+    """
+    if not plans:
+        return []
+    width = max(1, max(len(p) for p in plans))
+    pit_laps = np.zeros((len(plans), width), dtype=np.int64)
+    names = []
+    for i, plan in enumerate(plans):
+        for k, (lap, _) in enumerate(plan):
+            pit_laps[i, k] = lap
+        names.append(tuple(c for _, c in plan) + ("",) * (width - len(plan)))
+    finish = simulate_traces(calib, pit_laps, names, RISK_TRACES, sc, RISK_SEED)
+    p50, p95 = np.percentile(finish, (50, 95), axis=1)
+    # spread against the reference plan, in laps of racing pace
+    swing = (finish - finish[0]).std(axis=1) / calib.pace
+    out = []
+    for i in range(len(plans)):
+        level = "Low" if swing[i] < 0.1 else "Medium" if swing[i] < 0.25 else "High"
+        out.append({
+            "std": round(float(finish[i].std()), 3),
+            "p50": round(float(p50[i]), 3),
+            "p95": round(float(p95[i]), 3),
+            "swing": round(float(swing[i]), 3),
+            "level": level,
+        })
+    return out
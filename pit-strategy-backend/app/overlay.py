@@ -0,0 +1,106 @@
+"""
+Distance-aligned lap overlays from telemetry.
+
+Telemetry is one time series per vehicle with no lap structure. `segment` cuts it
+into laps with the lap start/end timestamps of the timing files: one np.searchsorted
+over the (sorted) sample times finds the row range of every lap at once. A lap is
+then put on a distance axis (`resample_lap`): sparse long-format channels are first
+filled over time, speed is integrated into distance with the trapezoid rule, and every
+channel plus the elapsed time is read off a grid of evenly spaced fractions of the
+lap's distance in one matrix interpolation (one searchsorted, one weighted blend of
+neighbouring rows for all channels).
+
+Laps of different length (a different line, or integration drift) are compared on
+fraction of the lap, scaled to the reference lap's length; the delta trace is the
+elapsed time of a lap minus the reference's at the same point. Distance is kept in
+the telemetry's own speed unit times seconds: the grid is fractions of the lap, so
+the unit only scales lengths, and the caller converts those once it knows the unit.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# metres per second in one speed unit
+KMH_TO_MS = 1.0 / 3.6
+MPH_TO_MS = 0.44704
+# a lap needs this many samples to be drawn
+MIN_LAP_SAMPLES = 10
+# channels that move in steps: read off the nearer sample instead of blended
+STEPPED = ("gear",)
+
+
+class LapTrace:
+    """One lap resampled onto `points` evenly spaced fractions of its distance (`length`, in speed unit-seconds)."""
+
+    def __init__(self, length: float, elapsed: np.ndarray, channels: Dict[str, np.ndarray], samples: int):
+        self.length = length
+        self.elapsed = elapsed
+        self.channels = channels
+        self.samples = samples
+
+    def cache_size(self) -> int:
+        return self.elapsed.nbytes + sum(c.nbytes for c in self.channels.values()) + 256
+
+
+def lap_bounds(starts: np.ndarray, ends: np.ndarray, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start/end epoch seconds per lap, a missing one derived from the other and the lap time."""
+    starts = np.where(np.isnan(starts), ends - times, starts)
+    ends = np.where(np.isnan(ends), starts + times, ends)
+    return starts, ends
+
+
+def segment(stamps: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Row range [lo, hi) of every lap in sorted sample times; empty where a bound is unknown."""
+    known = np.isfinite(starts) & np.isfinite(ends)
+    lo = np.searchsorted(stamps, np.where(known, starts, 0.0), side="left")
+    hi = np.searchsorted(stamps, np.where(known, ends, 0.0), side="right")
+    return np.where(known, lo, 0), np.where(known, np.maximum(lo, hi), 0)
+
+
+def fill_gaps(t: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Values interpolated over time where a channel was not sampled (NaN when it never was)."""
+    ok = np.isfinite(values)
+    if ok.all() or not ok.any():
+        return values
+    return np.interp(t, t[ok], values[ok])
+
+
+def resample_lap(t: np.ndarray, start: float, speed: np.ndarray, channels: Dict[str, np.ndarray], points: int) -> Optional[LapTrace]:
+    """A lap's samples (epoch seconds, speed, other channels) on a distance grid."""
+    ok = np.isfinite(t)
+    t = t[ok]
+    if t.size < MIN_LAP_SAMPLES:
+        return None
+    speed = fill_gaps(t, speed[ok])
+    if not np.isfinite(speed).any():
+        return None
+    speed = np.clip(np.nan_to_num(speed), 0.0, None)
+    distance = np.concatenate(([0.0], np.cumsum(0.5 * (speed[1:] + speed[:-1]) * np.diff(t))))
+    length = float(distance[-1])
+    if length <= 0:
+        return None
+
+    names = list(channels)
+    matrix = np.column_stack([t - start] + [fill_gaps(t, channels[n][ok]) for n in names])
+    grid = np.linspace(0.0, length, points)
+    # distance only grows, so one search places every grid point for every channel
+    right = np.clip(np.searchsorted(distance, grid, side="right"), 1, len(distance) - 1)
+    left = right - 1
+    span = distance[right] - distance[left]
+    w = np.divide(grid - distance[left], span, out=np.zeros(points), where=span > 0)
+    w = np.clip(w, 0.0, 1.0)[:, None]
+    values = matrix[left] * (1.0 - w) + matrix[right] * w
+    out = {n: values[:, i + 1] for i, n in enumerate(names)}
+    for n in STEPPED:
+        if n in out:
+            out[n] = np.where(w[:, 0] < 0.5, matrix[left, names.index(n) + 1], matrix[right, names.index(n) + 1])
+    return LapTrace(length, values[:, 0], out, int(t.size))
+
+
+def overlay(traces: List[LapTrace], scale: float = 1.0) -> Dict[str, np.ndarray]:
+    """Common distance axis (the first trace's length times `scale`) and each trace's delta to the first."""
+    ref = traces[0]
+    return {
+        "distance": np.linspace(0.0, ref.length * scale, len(ref.elapsed)),
+        "delta": np.vstack([tr.elapsed - ref.elapsed for tr in traces]),
+    }
@@ -0,0 +1,190 @@
+"""
+In-process cache for parsed dataset files.
+
+Entries are keyed on the resolved file path plus its mtime/size, so a CSV that is
+edited or replaced on disk is re-parsed on the next request while unchanged files
+are served straight from memory. Memory use is bounded by a byte budget with LRU
+eviction. Threads asking for an entry that another thread is already parsing wait
+for that parse instead of starting their own. With a persistent store attached
+(see store.py) a miss is looked up on disk before parsing, so neither a restart
+nor another worker process re-parses an unchanged file.
+"""
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .executor import Cancelled
+from .metrics import observe_parse, record
+from .store import MISSING
+
+Fingerprint = Tuple[str, int, int]
+
+
+def fingerprint(path: Path) -> Fingerprint:
+    """(resolved path, mtime in ns, size in bytes) for a dataset file."""
+    st = path.stat()
+    return (str(path.resolve()), st.st_mtime_ns, st.st_size)
+
+
+def estimate_size(obj: Any) -> int:
+    """Rough deep size of a parsed result in bytes (lists, dicts, tuples and arrays)."""
+    size_hint = getattr(obj, "cache_size", None)
+    if callable(size_hint):
+        return size_hint()
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes + sys.getsizeof(object())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj))
+    return size
+
+
+class _Pending:
+    """A parse in progress; waiters block on `done` and then read value or error."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ParseCache:
+    """
+    Bounded LRU cache in front of the CSV extractors.
+    Cached values are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # key -> (value, size in bytes, slot)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, Hashable]]" = OrderedDict()
+        # slot (kind, path, args) -> current key, so a re-parsed file drops its stale entry;
+        # a slot lives exactly as long as its entry
+        self._latest: Dict[Hashable, Hashable] = {}
+        self._pending: Dict[Hashable, _Pending] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.stored = 0
+        # optional AnalyticsStore consulted on a miss; attached by the app at startup
+        self.store: Any = None
+
+    def get_or_parse(self, path: Path, kind: str, parse: Callable[..., Any], *args: Any, versions: Tuple = ()) -> Any:
+        """
+        Return parse(path, *args, *versions), re-using the cached result while the file is
+        unchanged. `versions` (companion file fingerprints, a sidecar) are part of the key
+        but not of the slot, so a new version of them replaces the old entry at once.
+        """
+        try:
+            fp = fingerprint(path)
+        except OSError:
+            return parse(path, *args, *versions)
+        key = (kind, fp, args, versions)
+        stored = args + versions
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = _Pending()
+                    self.misses += 1
+                    break
+                self.coalesced += 1
+            pending.done.wait()
+            if pending.error is None:
+                return pending.value
+            if not isinstance(pending.error, Cancelled):
+                raise pending.error
+            # the parsing request was abandoned half-way: parse it here instead
+        started = time.perf_counter()
+        store = self.store
+        try:
+            # another worker process parsing the same entry publishes it before releasing the claim
+            with store.claim(kind, fp, stored) if store is not None else contextlib.nullcontext():
+                value = store.load(kind, fp, stored) if store is not None else MISSING
+                if value is MISSING:
+                    value = parse(path, *args, *versions)
+                    seconds = time.perf_counter() - started
+                    record(f"parse.{kind}", started, seconds)
+                    observe_parse(kind, seconds)
+                    if store is not None:
+                        store.save(kind, fp, stored, value)
+                else:
+                    self.stored += 1
+                    record(f"store.{kind}", started, time.perf_counter() - started)
+            pending.value = value
+            self._store((kind, fp[0], args), key, value)
+            return value
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+
+    def _store(self, slot: Hashable, key: Hashable, value: Any) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            stale = self._latest.get(slot)
+            if stale is not None and stale != key:
+                self._drop(stale)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, slot)
+            self._latest[slot] = key
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            if self._latest.get(entry[2]) == key:
+                del self._latest[entry[2]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "storeLoads": self.stored,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+parse_cache = ParseCache(int(float(os.getenv("TRACKOTA_PARSE_CACHE_MB", "256")) * 1024 * 1024))
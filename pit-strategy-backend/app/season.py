@@ -0,0 +1,173 @@
+"""
+Season queries: aggregates across every session under the datasets folder.
+
+A session is a folder holding a lap-time or timing analysis file (one race). Each
+one is reduced to a small per-car summary (laps, best lap, degradation slope and
+temperature-corrected pace) by `summarise_session`, which only parses files and so
+runs in a worker process; the caller caches the summaries per file version. A
+SeasonAggregate merges the summaries in whatever order sessions finish, so results
+can be streamed while slower sessions are still being parsed.
+
+Pace from different sessions of a track is weather-normalised: each session's pace
+is fitted at that session's median track temperature and moved to the track's
+median across sessions with the model's seconds-per-degree effect.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .analysis import read_analysis
+from .csv_reader import read_header
+from .degradation import DegradationModel
+from .executor import process_pool
+from .laps import build_lap_table, car_number, is_gr_lap_file
+from .simulation import Calibration
+from .weather import read_weather
+
+METRICS = ("bestLaps", "degradation", "pace")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _workers() -> int:
+    return int(os.getenv("TRACKOTA_SEASON_WORKERS", str(os.cpu_count() or 1)))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = process_pool(_workers())
+    return _pool
+
+
+def in_pool(files: Dict[str, Any]) -> Dict[str, Any]:
+    """summarise_session in a worker process (blocking), or in-process with one worker."""
+    if _workers() <= 1:
+        return summarise_session(files)
+    return _get_pool().submit(summarise_session, files).result()
+
+
+def summarise_session(files: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-car figures of one session from its files ("lapTimes", "lapStart", "lapEnd",
+    "analysis", "weather"; any may be None). Prefers the analysis file, which has pit
+    flags, over the GR lap table.
+    """
+    weather = read_weather(files["weather"]) if files.get("weather") else None
+    analysis = read_analysis(files["analysis"]) if files.get("analysis") else None
+    if analysis is not None:
+        temps = weather.join(weather.align_clock(analysis.clock))["trackTemp"] if weather else None
+        model = DegradationModel(
+            analysis.cars, analysis.offsets, analysis.laps, analysis.times, analysis.in_pit, analysis.out_lap, analysis.green,
+            track_temp=temps,
+        )
+        numbers = list(analysis.cars)
+    else:
+        lap_file = files.get("lapTimes")
+        if lap_file is None or not is_gr_lap_file(read_header(lap_file)[1]):
+            return {"cars": [], "totalLaps": 0, "referenceTrackTemp": None, "tempEffect": 0.0}
+        table = build_lap_table(lap_file, files.get("lapStart"), files.get("lapEnd"))
+        temps = weather.join(table.ends)["trackTemp"] if weather else None
+        model = DegradationModel(table.vehicles, table.offsets, table.laps, table.times, track_temp=temps)
+        numbers = [car_number(v).lstrip("0") or "0" for v in table.vehicles]
+
+    cars = []
+    for idx, number in enumerate(numbers):
+        times = model.times[int(model.offsets[idx]) : int(model.offsets[idx + 1])]
+        timed = times[np.isfinite(times) & (times > 0)]
+        if not timed.size:
+            continue
+        calib = Calibration.from_model(model, idx)
+        cars.append({
+            "car": number,
+            "laps": int(timed.size),
+            "bestLap": round(float(timed.min()), 3),
+            "slope": _round(model.car_slope[idx], 4),
+            "confidence": _round(model.car_confidence[idx], 3),
+            "pace": round(calib.pace, 3),
+        })
+    return {
+        "cars": cars,
+        "totalLaps": model.total_laps,
+        "referenceTrackTemp": model.reference_temp,
+        "tempEffect": model.temp_effect,
+    }
+
+
+def _round(value: float, digits: int) -> Optional[float]:
+    return None if value != value else round(float(value), digits)
+
+
+class SeasonAggregate:
+    """Running merge of session summaries for one metric, optionally narrowed to one car."""
+
+    def __init__(self, metric: str, car: Optional[str] = None):
+        self.metric = metric
+        self.car = (car.rsplit("-", 1)[-1].strip().lstrip("0") or "0") if car else None
+        self.sessions = 0
+        # track -> (best lap, car, session)
+        self.best: Dict[str, tuple] = {}
+        # car -> [(track, session, slope, confidence)]
+        self.slopes: Dict[str, List[tuple]] = {}
+        # track -> [(session folder, reference track temp, temp effect, car, pace)]
+        self.paces: Dict[str, List[tuple]] = {}
+
+    def add(self, track: str, session: str, summary: Dict[str, Any], folder: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Merge one session (named `session`, found in `folder`); returns its rows for the metric."""
+        self.sessions += 1
+        rows = []
+        for row in summary["cars"]:
+            if self.car is not None and row["car"] != self.car:
+                continue
+            if self.metric == "bestLaps":
+                if track not in self.best or row["bestLap"] < self.best[track][0]:
+                    self.best[track] = (row["bestLap"], row["car"], session)
+                rows.append({"car": row["car"], "bestLap": row["bestLap"], "laps": row["laps"]})
+            elif self.metric == "degradation":
+                if row["slope"] is not None:
+                    self.slopes.setdefault(row["car"], []).append((track, session, row["slope"], row["confidence"] or 0.0))
+                rows.append({"car": row["car"], "slope": row["slope"], "confidence": row["confidence"]})
+            else:
+                ref = summary["referenceTrackTemp"]
+                # one reference per folder: "Race 1" of two events at a track are two sessions
+                self.paces.setdefault(track, []).append((folder or session, ref, summary["tempEffect"], row["car"], row["pace"]))
+                rows.append({"car": row["car"], "pace": row["pace"], "trackTemp": ref})
+        return rows
+
+    def result(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"metric": self.metric, "sessions": self.sessions}
+        if self.metric == "bestLaps":
+            out["tracks"] = [
+                {"track": track, "bestLap": t, "car": car, "session": session}
+                for track, (t, car, session) in sorted(self.best.items())
+            ]
+        elif self.metric == "degradation":
+            out["cars"] = sorted((self._car_slope(car, events) for car, events in self.slopes.items()), key=lambda r: (len(r["car"]), r["car"]))
+        else:
+            out["tracks"] = [self._track_pace(track, rows) for track, rows in sorted(self.paces.items())]
+        return out
+
+    @staticmethod
+    def _car_slope(car: str, events: List[tuple]) -> Dict[str, Any]:
+        slopes = np.array([e[2] for e in events])
+        weights = np.array([e[3] for e in events])
+        # confidence-weighted: a noisy fit from a short race counts for less
+        mean = float(np.average(slopes, weights=weights)) if weights.sum() > 0 else float(slopes.mean())
+        return {
+            "car": car,
+            "slope": round(mean, 4),
+            "events": [{"track": t, "session": s, "slope": slope, "confidence": c} for t, s, slope, c in events],
+        }
+
+    @staticmethod
+    def _track_pace(track: str, rows: List[tuple]) -> Dict[str, Any]:
+        refs = [ref for ref in {folder: ref for folder, ref, _, _, _ in rows}.values() if ref is not None]
+        reference = float(np.median(refs)) if refs else None
+        per_car: Dict[str, List[float]] = {}
+        for _, ref, effect, car, pace in rows:
+            shift = effect * (reference - ref) if reference is not None and ref is not None else 0.0
+            per_car.setdefault(car, []).append(pace + shift)
+        cars = sorted(({"car": car, "pace": round(float(np.mean(v)), 3), "sessions": len(v)} for car, v in per_car.items()), key=lambda r: r["pace"])
+        return {"track": track, "referenceTrackTemp": reference, "cars": cars}
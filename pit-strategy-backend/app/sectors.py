@@ -0,0 +1,151 @@
+"""
+Sector analytics over Al Kamel "AnalysisEnduranceWithSections" timing files.
+
+Every lap row carries three sector times (S1..S3) and six intermediate sections
+(IM1a, IM1, IM2a, IM2, IM3a, FL, which sum to the lap). A SectorTable holds them
+as one (laps x splits) matrix per level, grouped by driver (car NUMBER plus
+DRIVER_NUMBER) with CSR-style offsets like LapTable, and precomputes per-driver
+best splits, the theoretical best lap and per-split rankings with np.minimum.reduceat.
+Rolling pace and the field-wide gap matrices are a few array operations over those,
+so a full-field comparison never loops over drivers in Python.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .analysis import ANALYSIS_COLUMNS, GREEN_FLAGS, car_numbers, is_analysis_file
+from .csv_reader import read_columns, read_header, to_clock, to_numbers
+
+SECTORS = ["S1", "S2", "S3"]
+SECTIONS = ["IM1a", "IM1", "IM2a", "IM2", "IM3a", "FL"]
+LEVELS = {"sector": SECTORS, "section": SECTIONS}
+
+SPLIT_COLUMNS = {
+    **{name: [f"{name}_SECONDS", name] for name in SECTORS},
+    **{name: [f"{name}_time"] for name in SECTIONS},
+}
+
+
+class SectorTable:
+    """Split times of every lap of a session, sorted by car, driver, then lap number."""
+
+    def __init__(self, cars: List[str], drivers: List[str], offsets: np.ndarray, laps: np.ndarray, times: np.ndarray, clean: np.ndarray, splits: Dict[str, np.ndarray]):
+        self.cars = cars
+        self.drivers = drivers
+        self.offsets = offsets
+        self.laps = laps
+        self.times = times
+        self.clean = clean
+        self.splits = splits
+        self.row_driver = np.repeat(np.arange(len(cars)), np.diff(offsets))
+        self.best = {level: _group_min(matrix, offsets) for level, matrix in splits.items()}
+        self.ranks = {level: _ranks(best) for level, best in self.best.items()}
+        # sum of a driver's best splits; NaN when one split was never timed
+        self.theoretical = {level: best.sum(axis=1) for level, best in self.best.items()}
+        self.best_lap = _group_min(times[:, None], offsets)[:, 0]
+
+    def labels(self) -> List[Dict[str, str]]:
+        return [{"car": c, "driver": d} for c, d in zip(self.cars, self.drivers)]
+
+    def select(self, car: Optional[str], driver: Optional[str] = None) -> np.ndarray:
+        """Driver indices of a car (number, or a GR vehicle id ending in it) and optionally one driver."""
+        keep = np.ones(len(self.cars), dtype=bool)
+        if car:
+            keep &= np.asarray(self.cars, dtype=str) == (car.rsplit("-", 1)[-1].strip().lstrip("0") or "0")
+        if driver:
+            keep &= np.asarray(self.drivers, dtype=str) == driver.strip()
+        return np.flatnonzero(keep)
+
+    def rows(self, idx: int) -> slice:
+        return slice(int(self.offsets[idx]), int(self.offsets[idx + 1]))
+
+    def car_rows(self, car: str) -> np.ndarray:
+        """Rows of every driver of one car, in lap order."""
+        rows = np.flatnonzero(np.isin(self.row_driver, self.select(car)))
+        return rows[np.argsort(self.laps[rows], kind="stable")]
+
+    def default_car(self) -> Optional[str]:
+        """Car with the most laps."""
+        if not self.cars:
+            return None
+        per_car: Dict[str, int] = {}
+        for c, n in zip(self.cars, np.diff(self.offsets).tolist()):
+            per_car[c] = per_car.get(c, 0) + n
+        return max(per_car, key=per_car.get)
+
+    def rolling(self, level: str, window: int) -> np.ndarray:
+        """Mean of each split over a driver's last `window` laps (clean laps only), per row."""
+        matrix = self.splits[level]
+        valid = self.clean[:, None] & ~np.isnan(matrix)
+        sums = np.vstack([np.zeros(matrix.shape[1]), np.cumsum(np.where(valid, matrix, 0.0), axis=0)])
+        counts = np.vstack([np.zeros(matrix.shape[1]), np.cumsum(valid, axis=0)])
+        rows = np.arange(len(self.laps))
+        lo = np.maximum(rows - window + 1, self.offsets[self.row_driver])
+        total, n = sums[rows + 1] - sums[lo], counts[rows + 1] - counts[lo]
+        return np.divide(total, n, out=np.full(total.shape, np.nan), where=n > 0)
+
+    def gaps(self, level: str) -> Dict[str, np.ndarray]:
+        """Per split (plus the theoretical lap): matrix[i, j] = best of driver i minus best of driver j."""
+        out = {name: col[:, None] - col[None, :] for name, col in zip(LEVELS[level], self.best[level].T)}
+        theoretical = self.theoretical[level]
+        out["theoretical"] = theoretical[:, None] - theoretical[None, :]
+        return out
+
+    def cache_size(self) -> int:
+        arrays = [self.offsets, self.laps, self.times, self.clean, self.row_driver, *self.splits.values(), *self.best.values(), *self.ranks.values()]
+        return sum(a.nbytes for a in arrays) + 64 * len(self.cars)
+
+
+def _group_min(matrix: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Column-wise minimum per row group, ignoring NaN (NaN for a group without values)."""
+    if not len(matrix):
+        return np.full((len(offsets) - 1, matrix.shape[1]), np.nan)
+    filled = np.where(np.isnan(matrix) | (matrix <= 0), np.inf, matrix)
+    best = np.minimum.reduceat(filled, offsets[:-1], axis=0)
+    return np.where(np.isinf(best), np.nan, best)
+
+
+def _ranks(best: np.ndarray) -> np.ndarray:
+    """1-based rank of each driver per column; 0 where the driver has no time."""
+    order = np.argsort(np.where(np.isnan(best), np.inf, best), axis=0, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, len(best) + 1)[:, None], axis=0)
+    return np.where(np.isnan(best), 0, ranks)
+
+
+def read_sectors(csv_path: Path) -> Optional[SectorTable]:
+    if not is_analysis_file(read_header(csv_path)[1]):
+        return None
+    cols = read_columns(csv_path, {**ANALYSIS_COLUMNS, "driver": ["DRIVER_NUMBER"], **SPLIT_COLUMNS})
+    lap_f = to_numbers(cols["lap"])
+    ok = np.isfinite(lap_f)
+    n = int(ok.sum())
+    blank = [""] * len(lap_f)
+    strip = lambda name: np.strings.strip(np.asarray(cols.get(name, blank), dtype=str))[ok]
+    cars = car_numbers(strip("car"))
+    drivers = strip("driver")
+    flags = strip("flag")
+
+    pairs = sorted(set(zip(cars.tolist(), drivers.tolist())), key=lambda p: (len(p[0]), p[0], p[1]))
+    code = {p: i for i, p in enumerate(pairs)}
+    group = np.fromiter((code[p] for p in zip(cars.tolist(), drivers.tolist())), dtype=np.int64, count=n)
+    laps = lap_f[ok].astype(np.int32)
+    order = np.lexsort((laps, group))
+
+    in_pit = strip("in_pit") == "B"
+    out_lap = ~np.isnan(to_clock(cols.get("pit_time", blank))[ok])
+    green = (flags == "") | np.isin(flags, list(GREEN_FLAGS))
+    clean = (green & ~in_pit & ~out_lap & (laps > 1))[order]
+    splits = {
+        level: np.column_stack([to_clock(cols.get(name, blank))[ok][order] for name in names]).reshape(n, len(names))
+        for level, names in LEVELS.items()
+    }
+    offsets = np.searchsorted(group[order], np.arange(len(pairs) + 1)).astype(np.int64)
+    times = to_clock(cols["time"])[ok][order]
+    return SectorTable([c for c, _ in pairs], [d for _, d in pairs], offsets, laps[order], times, clean, splits)
+
+
+def rounded(values: np.ndarray, digits: int = 3) -> list:
+    """Nested lists with NaN as None, for JSON."""
+    return np.where(np.isnan(values), None, np.round(values, digits)).tolist()
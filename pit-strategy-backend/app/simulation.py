@@ -0,0 +1,228 @@
+"""
+Monte Carlo race simulation.
+
+A strategy is a set of pit laps and the compound fitted at each (or no stop). Every trace
+draws lap-time noise and an optional safety-car period; all strategies are run
+against the same draws (common random numbers) so their differences come from
+the strategy rather than the dice. Lap times never materialise as a
+strategies x traces x laps array: the deterministic part is summed once per
+strategy, and the safety-car correction is a matrix product of the per-trace
+safety-car masks with the per-strategy lap times.
+
+Pace, degradation, lap-time noise, pit loss and race length are calibrated from a
+car's fitted DegradationModel. Large batches are split across a process pool.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .degradation import DEFAULT_PIT_LOSS, DegradationModel
+from .executor import offload, process_pool
+
+# compound -> (pace gain of a fresh set over the starting tyres in s/lap, degradation multiplier)
+COMPOUNDS = {"Soft": (-1.8, 1.5), "Medium": (-1.2, 1.0), "Hard": (-0.6, 0.7)}
+# safety-car laps run this much slower than racing pace
+SC_PACE_RATIO = 1.35
+# share of the pit loss still paid when stopping under the safety car
+SC_PIT_FACTOR = 0.5
+# lap-time samples (strategies x traces x laps) above which a batch goes to the process pool
+POOL_MIN_SAMPLES = 20_000_000
+HISTOGRAM_BINS = 30
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class Calibration:
+    """Per-lap model of one car: pace + slope * tyre age - fuel effect * lap, plus noise."""
+
+    def __init__(
+        self,
+        pace: float,
+        slope: float,
+        sigma: float,
+        pit_loss: float,
+        total_laps: int,
+        fuel_effect: float = 0.0,
+        track_temp: Optional[float] = None,
+        temp_effect: float = 0.0,
+    ):
+        self.pace = pace
+        self.slope = slope
+        self.sigma = sigma
+        self.pit_loss = pit_loss
+        self.total_laps = total_laps
+        self.fuel_effect = fuel_effect
+        # pace is what the car runs on a track at this temperature (None: no weather data)
+        self.track_temp = track_temp
+        self.temp_effect = temp_effect
+
+    @classmethod
+    def from_model(cls, model: Optional[DegradationModel], idx: Optional[int]) -> "Calibration":
+        """Calibrate from a car's fitted stints; the old demo pace when there is no data."""
+        if model is None or idx is None or not model.total_laps:
+            return cls(93.0, 0.25, 0.3, DEFAULT_PIT_LOSS, 45)
+        sl = slice(int(model.offsets[idx]), int(model.offsets[idx + 1]))
+        mine = model.stints["car"] == idx
+        paces = model.stints["pace"][mine]
+        paces = paces[np.isfinite(paces)]
+        usable = model.usable[sl]
+        resid = (model.times[sl] - model.fitted[sl])[usable]
+        resid = resid[np.isfinite(resid)]
+        if paces.size:
+            pace = float(np.median(paces))
+        else:
+            timed = model.corrected[sl][usable]
+            pace = float(np.median(timed)) if timed.size else 93.0
+        slope = float(model.car_slope[idx]) if model.car_slope[idx] == model.car_slope[idx] else 0.0
+        sigma = float(resid.std()) if resid.size > 2 else 0.3
+        return cls(pace, slope, sigma, model.pit_loss, model.total_laps, model.fuel_effect, model.reference_temp, model.temp_effect)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "pace": round(self.pace, 3),
+            "slope": round(self.slope, 4),
+            "sigma": round(self.sigma, 3),
+            "pitLoss": round(self.pit_loss, 3),
+            "totalLaps": self.total_laps,
+            "fuelEffect": self.fuel_effect,
+            "trackTemp": self.track_temp,
+            "trackTempEffect": self.temp_effect,
+        }
+
+
+def _as_plans(pit_laps: np.ndarray, compounds: List[Any]) -> Tuple[np.ndarray, List[Tuple[str, ...]]]:
+    """Pit laps as (strategies x stops), 0 padding unused stops; compounds as one tuple per strategy."""
+    pit_laps = np.asarray(pit_laps, dtype=np.int64)
+    if pit_laps.ndim == 1:
+        return pit_laps[:, None], [(c,) for c in compounds]
+    return pit_laps, [tuple(c) for c in compounds]
+
+
+def strategy_lap_times(calib: Calibration, pit_laps: np.ndarray, compounds: List[Any]) -> np.ndarray:
+    """
+    Deterministic lap times (strategies x laps) without noise, safety car or pit loss.
+    `pit_laps` is one pit lap per strategy (0: no stop) or strategies x stops, with
+    `compounds` the compound (or tuple of compounds) fitted at each stop.
+    """
+    pits, seqs = _as_plans(pit_laps, compounds)
+    n_stops = pits.shape[1]
+    lap = np.arange(1, calib.total_laps + 1)[None, :]
+    # stint 0 runs on the starting tyres (no gain, calibrated degradation)
+    gain = np.zeros((len(seqs), n_stops + 1))
+    mult = np.ones((len(seqs), n_stops + 1))
+    for s, seq in enumerate(seqs):
+        for k, c in enumerate(seq[:n_stops]):
+            if c:
+                gain[s, k + 1], mult[s, k + 1] = COMPOUNDS[c]
+    stint = np.zeros((len(seqs), calib.total_laps), dtype=np.int64)
+    start = np.zeros((len(seqs), calib.total_laps), dtype=np.int64)
+    for k in range(n_stops):
+        pit = pits[:, k : k + 1]
+        after = (pit > 0) & (lap > pit)
+        stint = np.where(after, k + 1, stint)
+        start = np.where(after, pit, start)
+    age = lap - start - 1
+    rows = np.arange(len(seqs))[:, None]
+    times = calib.pace + gain[rows, stint] + calib.slope * mult[rows, stint] * age
+    return times - calib.fuel_effect * (lap - 1)
+
+
+def simulate_traces(
+    calib: Calibration,
+    pit_laps: np.ndarray,
+    compounds: List[Any],
+    traces: int,
+    sc: Tuple[float, int, int],
+    seed: Any,
+) -> np.ndarray:
+    """Finish times (strategies x traces) of one batch of random traces."""
+    rng = np.random.default_rng(seed)
+    total = calib.total_laps
+    det = strategy_lap_times(calib, pit_laps, compounds)
+    noise = rng.normal(0.0, calib.sigma, size=(traces, total))
+    probability, min_laps, max_laps = sc
+    lap = np.arange(1, total + 1)[None, :]
+    happens = rng.random(traces) < probability
+    start = rng.integers(1, total + 1, size=traces)[:, None]
+    length = rng.integers(min_laps, max_laps + 1, size=traces)[:, None]
+    sc_mask = (happens[:, None] & (lap >= start) & (lap < start + length)).astype(np.float64)
+
+    # sum over laps of (racing lap, or the safety-car lap in its place)
+    racing = det.sum(axis=1)[:, None] + noise.sum(axis=1)[None, :]
+    sc_time = calib.pace * SC_PACE_RATIO
+    replaced = sc_time * sc_mask.sum(axis=1)[None, :] - det @ sc_mask.T - (sc_mask * noise).sum(axis=1)[None, :]
+    finish = racing + replaced
+
+    pits, _ = _as_plans(pit_laps, compounds)
+    for k in range(pits.shape[1]):
+        stops = np.flatnonzero(pits[:, k] > 0)
+        if stops.size:
+            under_sc = sc_mask[:, pits[stops, k] - 1].T
+            finish[stops] += calib.pit_loss * (1.0 - (1.0 - SC_PIT_FACTOR) * under_sc)
+    return finish
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _workers() -> int:
+    return int(os.getenv("TRACKOTA_SIM_WORKERS", str(os.cpu_count() or 1)))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = process_pool(_workers())
+    return _pool
+
+
+async def run_batch(
+    calib: Calibration,
+    pit_laps: np.ndarray,
+    compounds: List[Any],
+    traces: int,
+    sc: Tuple[float, int, int],
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Finish times (strategies x traces). Batches too big for one process are fanned out
+    to worker processes, the rest run on the request thread pool, never on the event loop.
+    """
+    workers = _workers()
+    samples = traces * len(pit_laps) * calib.total_laps
+    if workers <= 1 or samples < POOL_MIN_SAMPLES:
+        return await offload(simulate_traces, calib, pit_laps, compounds, traces, sc, seed)
+    chunks = min(workers, max(2, samples // POOL_MIN_SAMPLES + 1))
+    sizes = [len(part) for part in np.array_split(np.arange(traces), chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    parts = await asyncio.gather(*[
+        loop.run_in_executor(pool, simulate_traces, calib, pit_laps, compounds, size, sc, child)
+        for size, child in zip(sizes, seeds)
+    ])
+    return np.concatenate(parts, axis=1)
+
+
+def summarise(finish: np.ndarray, labels: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Percentiles, win probability and a shared-bin histogram per strategy, best median first."""
+    pct = np.percentile(finish, PERCENTILES, axis=1)
+    wins = np.bincount(finish.argmin(axis=0), minlength=len(labels)) / finish.shape[1]
+    lo, hi = float(finish.min()), float(finish.max())
+    edges = np.linspace(lo, hi if hi > lo else lo + 1.0, HISTOGRAM_BINS + 1)
+    order = np.argsort(pct[PERCENTILES.index(50)])
+    strategies = []
+    counts = []
+    for s in order:
+        row = {
+            **labels[s],
+            "mean": round(float(finish[s].mean()), 3),
+            "std": round(float(finish[s].std()), 3),
+            "winProbability": round(float(wins[s]), 4),
+        }
+        row.update({f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, pct[:, s])})
+        strategies.append(row)
+        counts.append(np.histogram(finish[s], bins=edges)[0].tolist())
+    return {"strategies": strategies, "histogram": {"edges": np.round(edges, 3).tolist(), "counts": counts}}
@@ -0,0 +1,363 @@
+"""
+Persistent analytics store: parsed results shared by every worker and kept across restarts.
+
+The parse cache consults the store on a miss and writes every fresh parse of a
+PERSISTED_KINDS entry back to it, so a restarted server serves lap tables, sector
+and analysis tables, weather series and season summaries straight from disk and only
+re-parses files that changed. Entries are keyed like the parse cache on
+(kind, resolved path, extra arguments) and valid only for the mtime and size they
+were parsed from.
+
+Several uvicorn workers share one store. The index is an SQLite database (WAL, so
+workers read while one writes); the arrays of an entry are published as one .npy
+file each in a folder next to it, and every worker maps them read-only with
+np.load(mmap_mode="r"), so a lap table occupies the page cache once however many
+workers serve it. A worker about to parse an entry first takes its lock file
+(`claim`): other workers asking for the same entry wait on that lock and then map
+what it published instead of parsing the file again.
+
+Values are stored explicitly rather than pickled: arrays as .npy files (loaded
+without pickle support), names and plain results as JSON.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from .analysis import AnalysisTable
+from .laps import LapTable
+from .sectors import SectorTable
+from .weather import WeatherSeries
+
+try:
+    import fcntl
+except ImportError:  # no POSIX file locks: workers may parse the same file side by side
+    fcntl = None
+
+STORE_VERSION = 2
+PERSISTED_KINDS = {"headers", "lap_times", "lap_table", "sections", "sectors", "analysis", "weather", "season_summary"}
+# returned by `load` when there is no current row (None is a valid stored value)
+MISSING = object()
+# entries hash onto this many lock files
+LOCK_STRIPES = 256
+# scratch folders younger than this may still be written by another worker
+SCRATCH_SECONDS = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    args TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    arrays TEXT,
+    stored REAL NOT NULL,
+    PRIMARY KEY (kind, path, args)
+)
+"""
+
+
+@contextlib.contextmanager
+def process_lock(path: Path) -> Iterator[bool]:
+    """Exclusive lock shared with other processes; yields whether it had to wait for it."""
+    if fcntl is None:
+        yield False
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waited = False
+        except BlockingIOError:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            waited = True
+        try:
+            yield waited
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def encode(value: Any) -> Optional[Tuple[str, Any, Optional[Dict[str, np.ndarray]]]]:
+    """(codec, JSON meta, named arrays) for a storable value; None when it has no codec."""
+    if value is None:
+        return "none", None, None
+    # exact types only: a LiveTable is a moving snapshot, never stored
+    if type(value) is LapTable:
+        arrays = {"offsets": value.offsets, "laps": value.laps, "times": value.times, "starts": value.starts, "ends": value.ends}
+        return "lap_table", {"vehicles": value.vehicles}, arrays
+    if type(value) is AnalysisTable:
+        columns = {name: getattr(value, name) for name in ("laps", "times", "in_pit", "out_lap", "pit_time", "green", "clock")}
+        return "analysis", {"cars": value.cars}, {"offsets": value.offsets, **columns}
+    if type(value) is SectorTable:
+        arrays = {"offsets": value.offsets, "laps": value.laps, "times": value.times, "clean": value.clean}
+        arrays.update({f"split.{level}": matrix for level, matrix in value.splits.items()})
+        return "sectors", {"cars": value.cars, "drivers": value.drivers}, arrays
+    if type(value) is WeatherSeries:
+        return "weather", None, {"times": value.times, **{f"col.{k}": v for k, v in value.columns.items()}}
+    try:
+        return "json", json.loads(json.dumps(value)), None
+    except (TypeError, ValueError):
+        return None
+
+
+def decode(codec: str, meta: Any, arrays: Optional[Dict[str, np.ndarray]]) -> Any:
+    if codec == "none":
+        return None
+    if codec == "json":
+        return meta
+    if codec == "lap_table":
+        return MappedLapTable(meta["vehicles"], arrays["offsets"], arrays["laps"], arrays["times"], arrays["starts"], arrays["ends"])
+    if codec == "analysis":
+        return MappedAnalysisTable(meta["cars"], arrays.pop("offsets"), arrays)
+    if codec == "sectors":
+        splits = {name.split(".", 1)[1]: a for name, a in arrays.items() if name.startswith("split.")}
+        return MappedSectorTable(meta["cars"], meta["drivers"], arrays["offsets"], arrays["laps"], arrays["times"], arrays["clean"], splits)
+    if codec == "weather":
+        return MappedWeatherSeries(arrays["times"], {name[4:]: a for name, a in arrays.items() if name.startswith("col.")})
+    raise ValueError(f"unknown store codec {codec!r}")
+
+
+# Mapped arrays live in the OS page cache, shared by every worker: only what a
+# class derives in its constructor counts against a worker's parse cache budget.
+
+class MappedLapTable(LapTable):
+    def cache_size(self) -> int:
+        return 1024 + 64 * len(self.vehicles)
+
+
+class MappedAnalysisTable(AnalysisTable):
+    def cache_size(self) -> int:
+        return 1024 + 64 * len(self.cars)
+
+
+class MappedSectorTable(SectorTable):
+    def cache_size(self) -> int:
+        derived = [self.row_driver, self.best_lap, *self.best.values(), *self.ranks.values(), *self.theoretical.values()]
+        return sum(a.nbytes for a in derived) + 64 * len(self.cars)
+
+
+class MappedWeatherSeries(WeatherSeries):
+    def cache_size(self) -> int:
+        return 1024
+
+
+class AnalyticsStore:
+    """SQLite index plus memory-mapped array folders, one connection per thread."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.arrays_dir = path.with_name(path.stem + ".arrays")
+        self.locks_dir = path.with_name(path.stem + ".locks")
+        self._local = threading.local()
+        # stripe -> (open lock, holders): one flock per stripe per process, shared by its threads
+        self._stripes: Dict[int, Tuple[contextlib.ExitStack, int]] = {}
+        self._stripe_guards = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.loads = 0
+        self.saves = 0
+        self.waits = 0
+        self.errors = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with process_lock(self.locks_dir / "schema.lock"):
+            db = self._db()
+            db.execute(_SCHEMA)
+            if db.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+                # codecs changed: start over rather than decode stale layouts
+                db.execute("DROP TABLE entries")
+                db.execute(_SCHEMA)
+                db.execute(f"PRAGMA user_version = {STORE_VERSION}")
+                shutil.rmtree(self.arrays_dir, ignore_errors=True)
+            db.commit()
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), timeout=10.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _digest(kind: str, fp: Tuple[str, int, int], args: Hashable) -> str:
+        return hashlib.sha1(repr((kind, fp, args)).encode("utf-8")).hexdigest()
+
+    @contextlib.contextmanager
+    def claim(self, kind: str, fp: Tuple[str, int, int], args: Hashable) -> Iterator[None]:
+        """Hold an entry's cross-worker lock while loading it or, failing that, parsing it."""
+        # one claim per thread: a parse that reads another entry must not wait on its own stripe
+        if kind not in PERSISTED_KINDS or getattr(self._local, "claiming", False):
+            yield
+            return
+        stripe = int(self._digest(kind, fp, args)[:8], 16) % LOCK_STRIPES
+        self._local.claiming = True
+        try:
+            self._enter_stripe(stripe)
+            try:
+                yield
+            finally:
+                self._leave_stripe(stripe)
+        finally:
+            self._local.claiming = False
+
+    def _enter_stripe(self, stripe: int) -> None:
+        # flock is per open file, so threads of one process must share it rather than queue on it;
+        # the in-process cache already lets only one thread parse a given key
+        with self._stripe_guards[stripe]:
+            held = self._stripes.get(stripe)
+            if held is None:
+                stack = contextlib.ExitStack()
+                if stack.enter_context(process_lock(self.locks_dir / f"{stripe:03d}.lock")):
+                    self.waits += 1
+                held = (stack, 0)
+            self._stripes[stripe] = (held[0], held[1] + 1)
+
+    def _leave_stripe(self, stripe: int) -> None:
+        with self._stripe_guards[stripe]:
+            stack, holders = self._stripes.pop(stripe)
+            if holders > 1:
+                self._stripes[stripe] = (stack, holders - 1)
+            else:
+                stack.close()
+
+    def load(self, kind: str, fp: Tuple[str, int, int], args: Hashable) -> Any:
+        """Stored value for this file version and arguments, else MISSING."""
+        if kind not in PERSISTED_KINDS:
+            return MISSING
+        try:
+            row = self._db().execute(
+                "SELECT codec, meta, arrays FROM entries WHERE kind=? AND path=? AND args=? AND mtime_ns=? AND size=?",
+                (kind, fp[0], repr(args), fp[1], fp[2]),
+            ).fetchone()
+            if row is None:
+                return MISSING
+            value = decode(row[0], json.loads(row[1]), self._map(row[2]) if row[2] else None)
+        except (sqlite3.Error, ValueError, KeyError, OSError):
+            self.errors += 1
+            return MISSING
+        self.loads += 1
+        return value
+
+    def _map(self, name: str) -> Dict[str, np.ndarray]:
+        """Every array of a published folder, mapped read-only."""
+        return {
+            f.name[:-4]: np.load(f, mmap_mode="r", allow_pickle=False)
+            for f in (self.arrays_dir / name).iterdir()
+            if f.name.endswith(".npy")
+        }
+
+    def save(self, kind: str, fp: Tuple[str, int, int], args: Hashable, value: Any) -> None:
+        if kind not in PERSISTED_KINDS:
+            return
+        encoded = encode(value)
+        if encoded is None:
+            return
+        codec, meta, arrays = encoded
+        try:
+            name = self._publish(self._digest(kind, fp, args), arrays) if arrays is not None else None
+            db = self._db()
+            with db:
+                old = db.execute("SELECT arrays FROM entries WHERE kind=? AND path=? AND args=?", (kind, fp[0], repr(args))).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, fp[0], repr(args), fp[1], fp[2], codec, json.dumps(meta), name, time.time()),
+                )
+        except (sqlite3.Error, OSError):
+            # a locked or read-only store only costs another worker or the next restart a parse
+            self.errors += 1
+            return
+        if old and old[0] and old[0] != name:
+            # workers still mapping the previous version keep its pages until they drop it
+            shutil.rmtree(self.arrays_dir / old[0], ignore_errors=True)
+        self.saves += 1
+
+    def _publish(self, name: str, arrays: Dict[str, np.ndarray]) -> str:
+        """Write arrays into a scratch folder and rename it into place, so readers never see half a folder."""
+        target = self.arrays_dir / name
+        if target.is_dir():
+            return name
+        self.arrays_dir.mkdir(parents=True, exist_ok=True)
+        work = Path(tempfile.mkdtemp(prefix=".publish-", dir=self.arrays_dir))
+        try:
+            for key, arr in arrays.items():
+                np.save(work / f"{key}.npy", np.ascontiguousarray(arr), allow_pickle=False)
+            os.replace(work, target)
+        except OSError:
+            shutil.rmtree(work, ignore_errors=True)
+            if not target.is_dir():
+                raise
+        return name
+
+    def prune(self) -> int:
+        """Drop entries whose source file is gone or has changed since it was stored."""
+        db = self._db()
+        try:
+            rows = db.execute("SELECT path, mtime_ns, size, arrays FROM entries").fetchall()
+            stale = [row for row in rows if not _current(*row[:3])]
+            with db:
+                db.executemany("DELETE FROM entries WHERE path=? AND mtime_ns=? AND size=?", [row[:3] for row in stale])
+            published = {name for (name,) in db.execute("SELECT arrays FROM entries WHERE arrays IS NOT NULL")}
+        except sqlite3.Error:
+            # another process holds the write lock: stale rows never match a lookup anyway
+            self.errors += 1
+            return 0
+        if self.arrays_dir.is_dir():
+            # folders of pruned entries, and scratch folders of writers that died half-way
+            for folder in self.arrays_dir.iterdir():
+                if folder.name in published:
+                    continue
+                if folder.name.startswith(".publish-") and time.time() - folder.stat().st_mtime < SCRATCH_SECONDS:
+                    continue
+                shutil.rmtree(folder, ignore_errors=True)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries = self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        try:
+            mapped = sum(f.stat().st_size for d in self.arrays_dir.iterdir() if d.is_dir() for f in d.iterdir())
+        except OSError:
+            # missing, or another worker is pruning it
+            mapped = None
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "mappedBytes": mapped,
+            "loads": self.loads,
+            "saves": self.saves,
+            "waits": self.waits,
+            "errors": self.errors,
+        }
+
+
+def _current(path: str, mtime: int, size: int) -> bool:
+    probe = path
+    while probe != os.path.dirname(probe):
+        try:
+            st = os.stat(probe)
+        except OSError:
+            probe = os.path.dirname(probe)
+            continue
+        # "<archive>/<member>" rows carry the archive's mtime and the member's size
+        return st.st_mtime_ns == mtime and (probe != path or st.st_size == size)
+    return False
+
+
+def open_store(path: Path) -> Optional[AnalyticsStore]:
+    """The store at `path`, or None when it cannot be created (read-only folder)."""
+    try:
+        return AnalyticsStore(path)
+    except (sqlite3.Error, OSError):
+        return None
@@ -0,0 +1,492 @@
+"""
+Columnar sidecars for telemetry CSVs.
+
+A telemetry CSV is converted once into one raw little-endian float64 file per
+numeric column plus a timestamp index (epoch seconds), described by a small
+meta.json. Sidecars are opened with numpy.memmap so any row range of any channel
+can be sliced without reading or decoding the rest of the file. Conversion runs
+lazily on first access and is redone when the source CSV's mtime or size changes;
+worker processes take a lock file first, so one converts while the others wait and
+then map its files.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .csv_reader import CsvReader, parse_number, pick_column, read_header, to_epoch, to_numbers
+from .executor import checkpoint
+from .store import process_lock
+
+SIDECAR_VERSION = 1
+CHUNK_ROWS = 65536
+# spilled samples pivoted in memory at once; a pivot splits a vehicle into timestamp
+# ranges of about this many, capped at MAX_BUCKETS ranges (open files) per vehicle
+BUCKET_ROWS = 1 << 18
+MAX_BUCKETS = 256
+# one spilled sample inside a timestamp range file
+SAMPLE = np.dtype([("ts", "<f8"), ("ch", "<i2"), ("val", "<f8")])
+
+# logical channel -> accepted column names, in order of preference
+TELEMETRY_FIELDS: Dict[str, List[str]] = {
+    "speed": ["Speed", "speed", "mph", "kmh", "km/h"],
+    "gear": ["Gear", "gear"],
+    "throttle": ["ath", "aps", "Throttle", "throttle"],
+    "brake_f": ["pbrake_f", "brake_f", "brake"],
+    "brake_r": ["pbrake_r", "brake_r"],
+    "accx": ["accx_can", "accx"],
+    "accy": ["accy_can", "accy"],
+    "steering": ["Steering_Angle", "steering", "steering_angle"],
+    "timestamp": ["timestamp", "meta_time", "time"],
+}
+# long (GR "kafka:gr-raw") exports: one row per vehicle, timestamp and channel name
+LONG_NAME_COLUMNS = ["telemetry_name", "name"]
+LONG_VALUE_COLUMNS = ["telemetry_value", "value"]
+VEHICLE_COLUMNS = ["vehicle_id", "original_vehicle_id"]
+LAP_COLUMNS = ["lap", "Lap", "lap_number", "LapNumber"]
+SERIES_CHANNELS = ["speed", "gear", "throttle", "brake_f", "brake_r", "accx", "accy", "steering"]
+
+
+class TelemetrySidecar:
+    """Memory-mapped columnar view of one telemetry CSV."""
+
+    def __init__(self, root: Path, meta: Dict):
+        self.root = root
+        self.meta = meta
+        self.rows: int = meta["rows"]
+        self.timestamps_sorted: bool = meta["timestampsSorted"]
+        self.columns: List[str] = list(meta["columns"].keys())
+        self.timestamps = self._map(meta["timestamp"]) if meta["timestamp"] else None
+        self._channels: Dict[str, np.ndarray] = {}
+
+    def _map(self, filename: str) -> np.ndarray:
+        if self.rows == 0:
+            return np.empty(0, dtype="<f8")
+        return np.memmap(self.root / filename, dtype="<f8", mode="r", shape=(self.rows,))
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        """Full-length memory-mapped column, or None if the CSV has no such numeric column."""
+        filename = self.meta["columns"].get(name)
+        if filename is None:
+            return None
+        arr = self._channels.get(name)
+        if arr is None:
+            arr = self._channels[name] = self._map(filename)
+        return arr
+
+    def map_all(self) -> "TelemetrySidecar":
+        """Map every column now, so this view keeps its own files if the folder is rebuilt."""
+        for name in self.columns:
+            self.column(name)
+        return self
+
+    def channel(self, logical: str) -> Optional[np.ndarray]:
+        """Column for a logical channel name resolved through TELEMETRY_FIELDS."""
+        col = pick_column(self.columns, TELEMETRY_FIELDS.get(logical, [logical]))
+        return self.column(col) if col else None
+
+    @property
+    def token(self) -> int:
+        """Changes whenever the sidecar is rebuilt; part of cache keys for derived data."""
+        return self.meta.get("token", 0)
+
+    def time_range(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        """Row range [lo, hi) with timestamps inside [start, end]."""
+        if self.timestamps is None or (start is None and end is None):
+            return 0, self.rows
+        if not self.timestamps_sorted:
+            ts = np.asarray(self.timestamps)
+            idx = np.flatnonzero((ts >= (start if start is not None else -np.inf)) & (ts <= (end if end is not None else np.inf)))
+            return (int(idx[0]), int(idx[-1]) + 1) if idx.size else (0, 0)
+        lo = int(np.searchsorted(self.timestamps, start, side="left")) if start is not None else 0
+        hi = int(np.searchsorted(self.timestamps, end, side="right")) if end is not None else self.rows
+        return lo, max(lo, hi)
+
+    def cache_size(self) -> int:
+        # memory-mapped pages live in the OS page cache, not in the parse cache budget
+        return 1024
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TelemetrySidecar) and (self.root, self.token) == (other.root, other.token)
+
+    def __hash__(self) -> int:
+        return hash((self.root, self.token))
+
+
+_convert_locks: Dict[str, threading.Lock] = {}
+_convert_locks_guard = threading.Lock()
+
+
+def _source_key(csv_path: Path) -> Tuple[Path, os.stat_result, str, threading.Lock]:
+    source = csv_path.resolve()
+    st = source.stat()
+    key = hashlib.sha1(str(source).encode("utf-8")).hexdigest()[:16]
+    with _convert_locks_guard:
+        lock = _convert_locks.setdefault(key, threading.Lock())
+    return source, st, key, lock
+
+
+def _is_current(meta: Optional[Dict], st: os.stat_result) -> bool:
+    return bool(meta) and meta.get("mtime") == st.st_mtime_ns and meta.get("size") == st.st_size
+
+
+def open_sidecar(csv_path: Path, root: Path) -> TelemetrySidecar:
+    """Open the sidecar for csv_path, converting the CSV first if it is missing or stale."""
+    source, st, key, lock = _source_key(csv_path)
+    target = root / key
+    # the thread lock orders this process, the lock file other worker processes
+    with lock, process_lock(root / f".{key}.lock"):
+        meta = _read_meta(target)
+        if not _is_current(meta, st):
+            meta = _convert(source, st, target)
+    return TelemetrySidecar(target, meta)
+
+
+def _read_meta(target: Path) -> Optional[Dict]:
+    try:
+        with (target / "meta.json").open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == SIDECAR_VERSION else None
+
+
+def _write_meta(target: Path, meta: Dict) -> None:
+    meta["token"] = time.time_ns()
+    with (target / "meta.json").open("w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def _convert(source: Path, st: os.stat_result, target: Path) -> Dict:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    work = Path(tempfile.mkdtemp(prefix=".convert-", dir=target.parent))
+    try:
+        with CsvReader(source) as reader:
+            meta = _write_columns(reader, reader.headers, work)
+        meta.update({"version": SIDECAR_VERSION, "source": str(source), "mtime": st.st_mtime_ns, "size": st.st_size})
+        _write_meta(work, meta)
+        if target.exists():
+            shutil.rmtree(target, ignore_errors=True)
+        os.replace(work, target)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    return meta
+
+
+def _write_columns(reader, headers: List[str], work: Path) -> Dict:
+    """Stream rows in chunks into one raw float64 file per numeric column."""
+    ts_col = pick_column(headers, TELEMETRY_FIELDS["timestamp"])
+    ts_idx = headers.index(ts_col) if ts_col else None
+    numeric: Optional[List[int]] = None
+    files: Dict[int, object] = {}
+    ts_file = None
+    rows = 0
+    last_ts = -np.inf
+    ts_sorted = True
+    try:
+        while True:
+            checkpoint()
+            chunk = [row for _, row in zip(range(CHUNK_ROWS), reader)]
+            if not chunk:
+                break
+            if numeric is None:
+                # decide once, from the first chunk, which columns hold numbers
+                numeric = [i for i in range(len(headers)) if i != ts_idx and _looks_numeric(chunk, i)]
+                files = {i: (work / f"c{i}.f64").open("wb") for i in numeric}
+                if ts_idx is not None:
+                    ts_file = (work / "timestamp.f64").open("wb")
+            for i, fh in files.items():
+                to_numbers([row[i] if i < len(row) else "" for row in chunk]).astype("<f8").tofile(fh)
+            if ts_file is not None:
+                arr = to_epoch([row[ts_idx] if ts_idx < len(row) else "" for row in chunk]).astype("<f8")
+                arr.tofile(ts_file)
+                if ts_sorted and arr.size:
+                    ts_sorted = bool(arr[0] >= last_ts and np.all(np.diff(arr) >= 0))
+                    last_ts = arr[-1]
+            rows += len(chunk)
+    finally:
+        for fh in files.values():
+            fh.close()
+        if ts_file is not None:
+            ts_file.close()
+    return {
+        "rows": rows,
+        "columns": {headers[i]: f"c{i}.f64" for i in (numeric or [])},
+        "timestamp": "timestamp.f64" if ts_file is not None else None,
+        "timestampColumn": ts_col,
+        "timestampsSorted": ts_sorted,
+    }
+
+
+def _looks_numeric(chunk: List[List[str]], idx: int) -> bool:
+    seen = ok = 0
+    for row in chunk[:1000]:
+        if idx >= len(row) or row[idx] == "":
+            continue
+        seen += 1
+        if not math.isnan(parse_number(row[idx])):
+            ok += 1
+    # all-empty columns are kept so the channel still reports (null) samples
+    return seen == 0 or ok >= seen * 0.9
+
+
+def read_headers(csv_path: Path) -> List[str]:
+    return read_header(csv_path)[1]
+
+
+def is_long_format(headers: List[str]) -> bool:
+    """True for name/value telemetry rows (one channel sample per row)."""
+    return bool(
+        pick_column(headers, LONG_NAME_COLUMNS)
+        and pick_column(headers, LONG_VALUE_COLUMNS)
+        and pick_column(headers, VEHICLE_COLUMNS)
+    )
+
+
+def first_vehicle(csv_path: Path) -> Optional[str]:
+    """vehicle_id of the first data row of a long-format file."""
+    with CsvReader(csv_path) as reader:
+        v_idx = reader.column(VEHICLE_COLUMNS)
+        if v_idx is None:
+            return None
+        for row in reader:
+            if v_idx < len(row) and row[v_idx]:
+                return row[v_idx]
+    return None
+
+
+def _vehicle_dirname(vehicle: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", vehicle) or "_"
+
+
+def _column_file(name: str) -> str:
+    """Stable file name of a pivoted channel; the digest keeps sanitised names apart."""
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    return f"c_{_vehicle_dirname(name)}-{digest}.f64"
+
+
+def open_vehicle_sidecar(csv_path: Path, root: Path, vehicle: str, channels: Tuple[str, ...]) -> TelemetrySidecar:
+    """
+    Wide, memory-mapped channels for one vehicle of a long-format telemetry file.
+    Only the requested logical channels are pivoted; asking for more later re-pivots
+    the vehicle with the union of channels. Column files are named after their channel
+    and every column is mapped before returning, so an earlier view stays consistent.
+    """
+    source, st, key, lock = _source_key(csv_path)
+    file_dir = root / key
+    wanted = {name for c in channels if c != "timestamp" for name in TELEMETRY_FIELDS.get(c, [c])}
+    # as in open_sidecar: the thread lock orders this process, the lock file other workers
+    with lock, process_lock(root / f".{key}.lock"):
+        file_meta = _read_meta(file_dir)
+        if not _is_current(file_meta, st):
+            shutil.rmtree(file_dir, ignore_errors=True)
+            file_meta = None
+        vdir = file_dir / _vehicle_dirname(vehicle)
+        meta = _read_meta(vdir)
+        if meta is None or not wanted <= set(meta["names"]):
+            names = wanted | set(meta["names"] if meta else [])
+            vehicles_seen = _pivot(source, file_dir, {vehicle: names})
+            if file_meta is None:
+                file_meta = {"version": SIDECAR_VERSION, "source": str(source), "mtime": st.st_mtime_ns, "size": st.st_size, "vehicles": vehicles_seen}
+                _write_meta(file_dir, file_meta)
+            meta = _read_meta(vdir)
+        return TelemetrySidecar(vdir, meta).map_all()
+
+
+def vehicle_sidecar_token(csv_path: Path, root: Path, vehicle: str) -> int:
+    """Token of the current pivot of a vehicle (0 when there is none yet); part of cache keys."""
+    _, st, key, _ = _source_key(csv_path)
+    file_dir = root / key
+    if not _is_current(_read_meta(file_dir), st):
+        return 0
+    meta = _read_meta(file_dir / _vehicle_dirname(vehicle))
+    return meta.get("token", 0) if meta else 0
+
+
+def long_file_vehicles(csv_path: Path, root: Path) -> List[str]:
+    """Vehicles recorded by the last pivot pass over a long-format file, if any."""
+    _, st, key, _ = _source_key(csv_path)
+    meta = _read_meta(root / key)
+    return meta.get("vehicles", []) if _is_current(meta, st) else []
+
+
+def _pivot(source: Path, file_dir: Path, wanted: Dict[str, set]) -> List[str]:
+    """
+    One streaming pass over a long file: rows for the wanted (vehicle, channel name) pairs
+    are spilled to per-vehicle temp files chunk by chunk, then each vehicle is pivoted
+    onto its sorted unique timestamps. Returns every vehicle id seen in the file.
+    """
+    file_dir.mkdir(parents=True, exist_ok=True)
+    work = Path(tempfile.mkdtemp(prefix=".pivot-", dir=file_dir))
+    seen: Dict[str, None] = {}
+    try:
+        with CsvReader(source) as reader:
+            n_idx = reader.column(LONG_NAME_COLUMNS)
+            val_idx = reader.column(LONG_VALUE_COLUMNS)
+            v_idx = reader.column(VEHICLE_COLUMNS)
+            ts_idx = reader.column(TELEMETRY_FIELDS["timestamp"])
+            lap_idx = reader.column(LAP_COLUMNS)
+            width = max(n_idx, val_idx, v_idx, ts_idx or 0, lap_idx or 0) + 1
+
+            # channel index per vehicle; the row's lap number is kept as an extra channel
+            names = {v: sorted(ns) + (["lap"] if lap_idx is not None else []) for v, ns in wanted.items()}
+            lookup = {v: {n: i for i, n in enumerate(ns)} for v, ns in names.items()}
+            spills = {v: [(work / f"{i}.{ext}").open("ab") for ext in ("ts", "ch", "val")] for i, v in enumerate(wanted)}
+            try:
+                while True:
+                    checkpoint()
+                    chunk = [row for _, row in zip(range(CHUNK_ROWS), reader)]
+                    if not chunk:
+                        break
+                    # raw cells per vehicle: timestamp, channel index, value, lap
+                    buf = {v: ([], [], [], []) for v in wanted}
+                    for row in chunk:
+                        if len(row) < width:
+                            continue
+                        v = row[v_idx]
+                        seen[v] = None
+                        idx = lookup.get(v)
+                        if idx is None:
+                            continue
+                        ci = idx.get(row[n_idx])
+                        if ci is None:
+                            continue
+                        b = buf[v]
+                        b[0].append(row[ts_idx] if ts_idx is not None else "")
+                        b[1].append(ci)
+                        b[2].append(row[val_idx])
+                        if lap_idx is not None:
+                            b[3].append(row[lap_idx])
+                    for v, (ts_s, ch_l, val_s, lap_s) in buf.items():
+                        ts = to_epoch(ts_s)
+                        ch = np.asarray(ch_l, dtype="<i2")
+                        val = to_numbers(val_s)
+                        if lap_idx is not None:
+                            ts = np.concatenate([ts, ts])
+                            ch = np.concatenate([ch, np.full(len(lap_s), lookup[v]["lap"], dtype="<i2")])
+                            val = np.concatenate([val, to_numbers(lap_s)])
+                        ts.astype("<f8").tofile(spills[v][0])
+                        ch.tofile(spills[v][1])
+                        val.astype("<f8").tofile(spills[v][2])
+            finally:
+                for files in spills.values():
+                    for fh in files:
+                        fh.close()
+
+        for i, (v, ns) in enumerate(names.items()):
+            spill = (work / f"{i}.ts", work / f"{i}.ch", work / f"{i}.val")
+            _write_wide(file_dir / _vehicle_dirname(v), v, ns, wanted[v], spill, work / f"{i}.buckets")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return list(seen)
+
+
+def _write_wide(vdir: Path, vehicle: str, names: List[str], requested: set, spill: Tuple[Path, Path, Path], scratch: Path) -> None:
+    """
+    Pivot spilled (timestamp, channel, value) triples to one column per channel and swap vdir in.
+    The spill is split into disjoint timestamp ranges on disk first; each range is then
+    pivoted in memory and appended to the columns in order, so memory stays bounded by
+    the range size rather than the session length.
+    """
+    ts_map, ch_map, val_map = (_map_spill(p, dtype) for p, dtype in zip(spill, ("<f8", "<i2", "<f8")))
+    edges = _bucket_edges(ts_map)
+    scratch.mkdir(parents=True, exist_ok=True)
+    buckets = [scratch / f"{b}.bin" for b in range(len(edges) + 1)]
+    handles = [path.open("ab") for path in buckets]
+    try:
+        for lo in range(0, len(ts_map), CHUNK_ROWS):
+            checkpoint()
+            ts, ch, val = (np.asarray(m[lo : lo + CHUNK_ROWS]) for m in (ts_map, ch_map, val_map))
+            keep = ~np.isnan(ts)
+            ts, ch, val = ts[keep], ch[keep], val[keep]
+            # stable, so rows keep their file order within a range and later rows still win
+            which = np.searchsorted(edges, ts, side="right")
+            order = np.argsort(which, kind="stable")
+            cuts = np.searchsorted(which[order], np.arange(len(buckets) + 1))
+            for b, fh in enumerate(handles):
+                part = order[cuts[b] : cuts[b + 1]]
+                if part.size:
+                    rec = np.empty(part.size, dtype=SAMPLE)
+                    rec["ts"], rec["ch"], rec["val"] = ts[part], ch[part], val[part]
+                    rec.tofile(fh)
+    finally:
+        for fh in handles:
+            fh.close()
+    del ts_map, ch_map, val_map
+
+    work = Path(tempfile.mkdtemp(prefix=".wide-", dir=vdir.parent))
+    try:
+        present = np.zeros(len(names), dtype=bool)
+        rows = 0
+        outs = [(work / _column_file(name)).open("wb") for name in names]
+        try:
+            with (work / "timestamp.f64").open("wb") as ts_out:
+                for path in buckets:
+                    checkpoint()
+                    rec = np.fromfile(path, dtype=SAMPLE)
+                    ts, ch, val = rec["ts"], rec["ch"], rec["val"]
+                    stamps, row_of = np.unique(ts, return_inverse=True)
+                    wide = np.full((len(names), len(stamps)), np.nan)
+                    # later rows for the same (timestamp, channel) win
+                    wide[ch, row_of] = val
+                    present[np.unique(ch)] = True
+                    stamps.astype("<f8").tofile(ts_out)
+                    for ci, fh in enumerate(outs):
+                        wide[ci].astype("<f8").tofile(fh)
+                    rows += len(stamps)
+                    path.unlink()
+        finally:
+            for fh in outs:
+                fh.close()
+        columns = {}
+        for ci, name in enumerate(names):
+            if present[ci]:
+                columns[name] = _column_file(name)
+            else:
+                (work / _column_file(name)).unlink()
+        _write_meta(work, {
+            "version": SIDECAR_VERSION,
+            "vehicle": vehicle,
+            "rows": rows,
+            "columns": columns,
+            "names": sorted(requested),
+            "timestamp": "timestamp.f64",
+            "timestampColumn": "timestamp",
+            "timestampsSorted": True,
+        })
+        if vdir.exists():
+            shutil.rmtree(vdir, ignore_errors=True)
+        os.replace(work, vdir)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+
+
+def _map_spill(path: Path, dtype: str) -> np.ndarray:
+    """Read-only view of a spill file (memory-mapped; a plain empty array when the file is empty)."""
+    if not path.stat().st_size:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _bucket_edges(ts: np.ndarray) -> np.ndarray:
+    """Timestamps splitting a spill into ranges of about BUCKET_ROWS samples, from a strided sample."""
+    n = len(ts)
+    count = min(MAX_BUCKETS, n // BUCKET_ROWS + 1)
+    if count <= 1:
+        return np.empty(0)
+    sample = np.asarray(ts[:: max(1, n // (count * 64))])
+    sample = sample[~np.isnan(sample)]
+    if not sample.size:
+        return np.empty(0)
+    return np.unique(np.quantile(sample, np.linspace(0.0, 1.0, count + 1)[1:-1]))
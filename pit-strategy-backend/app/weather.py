@@ -0,0 +1,97 @@
+"""
+Weather station files (`26_Weather_*.CSV`) and their as-of join onto laps.
+
+One `;`-delimited row per sample, about a minute apart: `TIME_UTC_SECONDS` (epoch),
+`AIR_TEMP`, `TRACK_TEMP`, `HUMIDITY`, `PRESSURE`, `WIND_SPEED`, `WIND_DIRECTION` and
+`RAIN`. A WeatherSeries keeps them as arrays sorted by time; every lap takes the
+newest sample at or before the moment it ended, found for all laps at once with
+np.searchsorted over the sample times.
+
+GR lap-end timestamps are UTC already. The analysis file only has `HOUR`, the local
+time of day at the line: it is put on the weather clock by the whole quarter-hour
+offset that lines the session's laps up with the weather samples.
+"""
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .csv_reader import read_columns, to_numbers
+
+WEATHER_COLUMNS = {
+    "time": ["TIME_UTC_SECONDS"],
+    "airTemp": ["AIR_TEMP"],
+    "trackTemp": ["TRACK_TEMP"],
+    "humidity": ["HUMIDITY"],
+    "pressure": ["PRESSURE"],
+    "windSpeed": ["WIND_SPEED"],
+    "windDirection": ["WIND_DIRECTION"],
+    "rain": ["RAIN"],
+}
+# a lap more than this after the last sample has no weather of its own
+MAX_SAMPLE_AGE = 15 * 60.0
+# time zones are whole quarter hours from UTC
+ZONE_STEP = 15 * 60.0
+
+
+class WeatherSeries:
+    """Weather samples of a session, sorted by epoch seconds."""
+
+    def __init__(self, times: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.times = times
+        self.columns = columns
+
+    def as_of(self, stamps: np.ndarray) -> np.ndarray:
+        """Index of the newest sample at or before each stamp; -1 when there is none."""
+        stamps = np.asarray(stamps, dtype=np.float64)
+        idx = np.searchsorted(self.times, stamps, side="right") - 1
+        known = np.isfinite(stamps) & (idx >= 0)
+        if len(self.times):
+            known &= stamps - self.times[np.maximum(idx, 0)] <= MAX_SAMPLE_AGE
+        return np.where(known, idx, -1)
+
+    def join(self, stamps: np.ndarray) -> Dict[str, np.ndarray]:
+        """Every weather column as of each stamp (NaN where no sample applies)."""
+        idx = self.as_of(stamps)
+        found = idx >= 0
+        safe = np.where(found, idx, 0)
+        return {name: np.where(found, col[safe], np.nan) if len(col) else np.full(len(idx), np.nan) for name, col in self.columns.items()}
+
+    def latest(self, stamp: Optional[float] = None) -> Optional[Dict[str, Optional[float]]]:
+        """One sample as a dict: as of `stamp`, else the newest one."""
+        if not len(self.times):
+            return None
+        i = int(self.as_of(np.array([stamp]))[0]) if stamp is not None and stamp == stamp else len(self.times) - 1
+        if i < 0:
+            return None
+        out: Dict[str, Any] = {name: (None if col[i] != col[i] else round(float(col[i]), 2)) for name, col in self.columns.items()}
+        out["time"] = float(self.times[i])
+        return out
+
+    def align_clock(self, clock: np.ndarray) -> np.ndarray:
+        """Epoch seconds for local times of day (seconds after midnight) on the weather clock."""
+        clock = np.asarray(clock, dtype=np.float64)
+        ok = np.isfinite(clock)
+        if not len(self.times) or not ok.any():
+            return np.full(len(clock), np.nan)
+        day = np.floor(self.times[0] / 86400.0) * 86400.0
+        middle = float(np.median(self.times))
+        shift = (middle - day - float(np.median(clock[ok]))) % 86400.0
+        offset = np.round(((shift + 43200.0) % 86400.0 - 43200.0) / ZONE_STEP) * ZONE_STEP
+        stamps = day + clock + offset
+        # a session running past midnight: every lap belongs to the day nearest the weather
+        return stamps + 86400.0 * np.round((middle - stamps) / 86400.0)
+
+    def cache_size(self) -> int:
+        return self.times.nbytes + sum(col.nbytes for col in self.columns.values())
+
+
+def read_weather(csv_path: Path) -> Optional[WeatherSeries]:
+    cols = read_columns(csv_path, WEATHER_COLUMNS)
+    if "time" not in cols or "trackTemp" not in cols:
+        return None
+    times = to_numbers(cols.pop("time"))
+    ok = np.isfinite(times)
+    order = np.argsort(times[ok], kind="stable")
+    columns = {name: to_numbers(values)[ok][order] for name, values in cols.items()}
+    return WeatherSeries(times[ok][order], columns)
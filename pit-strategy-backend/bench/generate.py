@@ -0,0 +1,276 @@
+"""
+Deterministic synthetic race weekends in the shapes of the real exports.
+
+Every session folder (`<Track>/Race <n>`) gets the files the backend reads from a
+real Sebring session:
+
+- `23_AnalysisEnduranceWithSections_Race <n>_Anonymized.CSV` — Al Kamel `;` export with
+  padded headers, clock strings, pit in/out laps and full-course-yellow laps
+- `<track>_lap_time_R<n>.csv`, `<track>_lap_start_time_R<n>.csv`, `<track>_lap_end_time_R<n>.csv`
+  — GR message-stream rows (milliseconds / ISO timestamps) with resent laps and
+  lap-32768 placeholder rows
+- `26_Weather_Race <n>_Anonymized.CSV` — one reading a minute
+- `<track>_telemetry_R<n>.csv` — long-format (name/value) telemetry sized by `telemetry_mb`
+
+The same arguments always produce byte-identical files.
+
+    python -m bench.generate /tmp/bench-data --preset weekend
+    python -m bench.generate /tmp/bench-data --tracks 50 --races 4 --cars 30 --telemetry-mb 0
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# name -> generate() arguments
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "race": {"tracks": 1, "races": 1, "cars": 20, "laps": 20, "telemetry_mb": 10},
+    "weekend": {"tracks": 1, "races": 2, "cars": 30, "laps": 22, "telemetry_mb": 100},
+    "field": {"tracks": 1, "races": 2, "cars": 60, "laps": 40, "telemetry_mb": 200},
+    "season": {"tracks": 50, "races": 4, "cars": 30, "laps": 20, "telemetry_mb": 0},
+    "telemetry": {"tracks": 1, "races": 1, "cars": 30, "laps": 20, "telemetry_mb": 2048},
+}
+TRACKS = ["Sebring", "Barber", "COTA", "Indianapolis", "Road America", "Sonoma", "VIR"]
+# lap length used for the KPH column
+TRACK_KM = 6.02
+# 2025-05-17 17:00 UTC, the Sebring race 1 weekend
+EPOCH = 1747501200.0
+
+ANALYSIS_HEADERS = [
+    "NUMBER", " DRIVER_NUMBER", " LAP_NUMBER", " LAP_TIME", " LAP_IMPROVEMENT", " CROSSING_FINISH_LINE_IN_PIT",
+    " S1", " S1_IMPROVEMENT", " S2", " S2_IMPROVEMENT", " S3", " S3_IMPROVEMENT", " KPH", " ELAPSED", " HOUR",
+    "S1_LARGE", "S2_LARGE", "S3_LARGE", "TOP_SPEED", "PIT_TIME", "CLASS", "GROUP", "MANUFACTURER", "FLAG_AT_FL",
+    "S1_SECONDS", "S2_SECONDS", "S3_SECONDS", "IM1a_time", "IM1a_elapsed", "IM1_time", "IM1_elapsed",
+    "IM2a_time", "IM2a_elapsed", "IM2_time", "IM2_elapsed", "IM3a_time", "IM3a_elapsed", "FL_time", "FL_elapsed",
+]
+GR_HEADERS = ["meta_source", "meta_time", "meta_event", "meta_session", "timestamp", "vehicle_id", "outing", "lap", "value", "expire_at"]
+WEATHER_HEADERS = ["TIME_UTC_SECONDS", "TIME_UTC_STR", "AIR_TEMP", "TRACK_TEMP", "HUMIDITY", "PRESSURE", "WIND_SPEED", "WIND_DIRECTION", "RAIN"]
+TELEMETRY_HEADERS = [
+    "expire_at", "lap", "meta_event", "meta_session", "meta_source", "meta_time", "original_vehicle_id",
+    "outing", "telemetry_name", "telemetry_value", "timestamp", "vehicle_id", "vehicle_number",
+]
+# channel -> (mean, amplitude, decimals)
+CHANNELS = {
+    "speed": (140.0, 60.0, 2),
+    "gear": (4.0, 2.0, 0),
+    "nmot": (5800.0, 1400.0, 0),
+    "aps": (60.0, 40.0, 1),
+    "pbrake_f": (10.0, 10.0, 2),
+    "pbrake_r": (8.0, 8.0, 2),
+    "accx_can": (0.0, 0.8, 3),
+    "accy_can": (0.0, 1.2, 3),
+    "Steering_Angle": (0.0, 90.0, 1),
+}
+# approximate size of one long-format telemetry row
+TELEMETRY_ROW_BYTES = 130
+SECTOR_SPLIT = (0.30, 0.34, 0.36)
+# share of the lap in each of the six intermediate sections (IM1a .. FL)
+SECTION_SPLIT = (0.12, 0.18, 0.15, 0.22, 0.13, 0.20)
+
+
+def _clock(seconds: float) -> str:
+    """Al Kamel clock string: "2:38.824", or "1:02:38.824" past the hour."""
+    minutes, secs = divmod(seconds, 60.0)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}:{minutes:02d}:{secs:06.3f}" if hours else f"{minutes}:{secs:06.3f}"
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _slug(track: str) -> str:
+    return track.lower().replace(" ", "_")
+
+
+def _track_names(count: int) -> List[str]:
+    return [TRACKS[i % len(TRACKS)] + (f" {i // len(TRACKS) + 1}" if i >= len(TRACKS) else "") for i in range(count)]
+
+
+class _Session:
+    """Lap-by-lap truth for one race: pace, degradation, one pit stop for some cars, an FCY period."""
+
+    def __init__(self, rng: np.random.Generator, cars: int, laps: int, start: float):
+        self.start = start
+        self.numbers = np.sort(rng.choice(np.arange(2, max(100, cars * 2)), size=cars, replace=False))
+        self.chassis = rng.choice(np.arange(1, 1000), size=cars, replace=False)
+        pace = rng.uniform(145.0, 150.0, cars)[:, None]
+        slope = rng.uniform(0.05, 0.2, cars)[:, None]
+        lap = np.arange(1, laps + 1)[None, :]
+        self.pit_lap = np.where(rng.random(cars) < 0.3, rng.integers(laps // 3, max(laps // 3 + 1, 2 * laps // 3), cars), 0)
+        age = np.where((self.pit_lap[:, None] > 0) & (lap > self.pit_lap[:, None]), lap - self.pit_lap[:, None] - 1, lap - 1)
+        times = pace + slope * age - 0.03 * (lap - 1) + rng.normal(0.0, 0.3, (cars, laps))
+        times[:, 0] += 5.0
+        self.in_lap = (self.pit_lap[:, None] > 0) & (lap == self.pit_lap[:, None])
+        self.out_lap = (self.pit_lap[:, None] > 0) & (lap == self.pit_lap[:, None] + 1)
+        self.pit_time = np.where(self.out_lap, rng.uniform(95.0, 110.0, (cars, laps)), np.nan)
+        times += np.where(self.in_lap, 12.0, 0.0) + np.nan_to_num(self.pit_time)
+        fcy_from = int(rng.integers(2, max(3, laps - 2)))
+        self.fcy = (lap >= fcy_from) & (lap < fcy_from + 2) & np.ones((cars, 1), dtype=bool)
+        times += np.where(self.fcy, 40.0, 0.0)
+        self.times = times
+        self.ends = start + np.cumsum(times, axis=1)
+        self.starts = self.ends - times
+
+    @property
+    def cars(self) -> int:
+        return len(self.numbers)
+
+    @property
+    def laps(self) -> int:
+        return self.times.shape[1]
+
+    def vehicle(self, c: int) -> str:
+        return f"GR86-{self.chassis[c]:03d}-{self.numbers[c]}"
+
+
+def _write_analysis(path: Path, s: _Session) -> None:
+    lines = [";".join(ANALYSIS_HEADERS)]
+    for c in range(s.cars):
+        for i in range(s.laps):
+            t = float(s.times[c, i])
+            sectors = [t * f for f in SECTOR_SPLIT]
+            sections = np.cumsum([t * f for f in SECTION_SPLIT])
+            elapsed = float(s.ends[c, i] - s.start)
+            hour = datetime.fromtimestamp(float(s.ends[c, i]), tz=timezone.utc).strftime("%H:%M:%S.%f")[:-3]
+            pit = "" if np.isnan(s.pit_time[c, i]) else _clock(float(s.pit_time[c, i]))
+            row = [
+                str(s.numbers[c]), "1", str(i + 1), _clock(t), "0", "B" if s.in_lap[c, i] else "",
+                f"{sectors[0]:.3f}", "0", f"{sectors[1]:.3f}", "0", f"{sectors[2]:.3f}", "0",
+                f"{TRACK_KM * 3600 / t:.1f}", _clock(elapsed), hour,
+                *(_clock(x) for x in sectors), "", pit, "Am", "", "Toyota Gazoo Racing",
+                "FCY" if s.fcy[c, i] else "GF", *(f"{x:.3f}" for x in sectors),
+            ]
+            prev = 0.0
+            for mark in sections:
+                row += [f"{mark - prev:.3f}", _clock(mark)]
+                prev = mark
+            lines.append(";".join(row))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _write_gr(path: Path, s: _Session, rng: np.random.Generator, session: str, event: str, kind: str) -> None:
+    """GR timing rows; a few laps are resent with a newer meta_time and placeholders are mixed in."""
+    rows = []
+    for c in range(s.cars):
+        vid = s.vehicle(c)
+        for i in range(s.laps):
+            end = float(s.ends[c, i])
+            if kind == "time":
+                value = str(int(round(s.times[c, i] * 1000)))
+            else:
+                value = f'"{_iso(float(s.starts[c, i]) if kind == "start" else end)}"'
+            sent = end + rng.uniform(0.2, 1.0)
+            rows.append((sent, vid, i + 1, value))
+            if rng.random() < 0.05:
+                rows.append((sent + rng.uniform(5.0, 60.0), vid, i + 1, value))
+        rows.append((float(s.ends[c, -1]) + 2.0, vid, 32768, "44" if kind == "time" else f'"{_iso(float(s.ends[c, -1]))}"'))
+    rows.sort(key=lambda r: -r[0])
+    out = [",".join(f'"{h}"' for h in GR_HEADERS)]
+    for sent, vid, lap, value in rows:
+        out.append(f'"kafka:gr-raw","{_iso(sent)}","{event}","{session}","{_iso(sent - 0.7)}","{vid}",0,{lap},{value},')
+    path.write_text("\n".join(out) + "\n", encoding="utf-8")
+
+
+def _write_weather(path: Path, s: _Session, rng: np.random.Generator) -> None:
+    stamps = np.arange(s.start - 600.0, float(s.ends.max()) + 60.0, 60.0)
+    air = 30.0 + np.cumsum(rng.normal(0.0, 0.05, len(stamps)))
+    track = air + 12.0 + np.cumsum(rng.normal(0.0, 0.08, len(stamps)))
+    lines = [";".join(WEATHER_HEADERS)]
+    for ts, a, t in zip(stamps, air, track):
+        when = datetime.fromtimestamp(ts, tz=timezone.utc)
+        stamp = f"{when.month}/{when.day}/{when.year} {when.strftime('%I:%M:%S %p').lstrip('0')}"
+        lines.append(f"{int(ts)};{stamp};{a:.2f};{t:.1f};{rng.uniform(40, 60):.2f};1013.7;{rng.uniform(0, 8):.2f};{int(rng.integers(0, 360))};0")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _write_telemetry(path: Path, s: _Session, rng: np.random.Generator, session: str, event: str, target_bytes: int) -> int:
+    """Long-format rows, one per (vehicle, sample, channel), written car by car. Returns the row count."""
+    per_car = max(1, target_bytes // TELEMETRY_ROW_BYTES // (s.cars * len(CHANNELS)))
+    rows = 0
+    with path.open("w", encoding="utf-8", newline="") as f:
+        f.write(",".join(TELEMETRY_HEADERS) + "\n")
+        for c in range(s.cars):
+            vid = s.vehicle(c)
+            stamps = np.linspace(float(s.starts[c, 0]), float(s.ends[c, -1]), per_car)
+            lap = np.clip(np.searchsorted(s.ends[c], stamps) + 1, 1, s.laps)
+            phase = rng.uniform(0.0, 2.0 * np.pi)
+            values = {}
+            for name, (mean, amp, decimals) in CHANNELS.items():
+                wave = mean + amp * np.sin(stamps / 7.0 + phase + len(name)) + rng.normal(0.0, amp * 0.05, per_car)
+                values[name] = np.round(wave, decimals)
+            prefix = f",{event},{session},kafka:gr-raw,"
+            for j0 in range(0, per_car, 4096):
+                chunk = []
+                for j in range(j0, min(per_car, j0 + 4096)):
+                    iso = _iso(float(stamps[j]))
+                    head = f",{lap[j]}{prefix}{iso},{vid},0,"
+                    tail = f",{iso},{vid},{s.numbers[c]}\n"
+                    chunk.extend(f"{head}{name},{values[name][j]:g}{tail}" for name in CHANNELS)
+                f.write("".join(chunk))
+                rows += len(chunk)
+    return rows
+
+
+def generate(
+    out: Path,
+    tracks: int = 1,
+    races: int = 2,
+    cars: int = 20,
+    laps: int = 20,
+    telemetry_mb: float = 10.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Write tracks x races sessions under `out`; returns a manifest of what was written."""
+    out.mkdir(parents=True, exist_ok=True)
+    sessions = []
+    for t, track in enumerate(_track_names(tracks)):
+        for r in range(1, races + 1):
+            rng = np.random.default_rng([seed, t, r])
+            folder = out / track / f"Race {r}"
+            folder.mkdir(parents=True, exist_ok=True)
+            s = _Session(rng, cars, laps, EPOCH + t * 7 * 86400 + (r - 1) * 86400)
+            slug, session, event = _slug(track), f"R{r}", f"I_R{t:02d}_{track}"
+            _write_analysis(folder / f"23_AnalysisEnduranceWithSections_Race {r}_Anonymized.CSV", s)
+            for kind, name in (("time", "lap_time"), ("start", "lap_start_time"), ("end", "lap_end_time")):
+                _write_gr(folder / f"{slug}_{name}_R{r}.csv", s, rng, session, event, kind)
+            _write_weather(folder / f"26_Weather_Race {r}_Anonymized.CSV", s, rng)
+            telemetry_rows = 0
+            if telemetry_mb > 0:
+                telemetry_rows = _write_telemetry(folder / f"{slug}_telemetry_R{r}.csv", s, rng, session, event, int(telemetry_mb * 1024 * 1024))
+            sessions.append({"folder": folder.relative_to(out).as_posix(), "cars": cars, "laps": laps, "telemetryRows": telemetry_rows})
+    manifest = {
+        "params": {"tracks": tracks, "races": races, "cars": cars, "laps": laps, "telemetryMb": telemetry_mb, "seed": seed},
+        "sessions": sessions,
+        "bytes": sum(p.stat().st_size for p in out.rglob("*") if p.is_file() and not p.name.startswith(".")),
+    }
+    (out / "bench-manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out", type=Path)
+    parser.add_argument("--preset", choices=sorted(PRESETS))
+    parser.add_argument("--tracks", type=int)
+    parser.add_argument("--races", type=int)
+    parser.add_argument("--cars", type=int)
+    parser.add_argument("--laps", type=int)
+    parser.add_argument("--telemetry-mb", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    params = dict(PRESETS[args.preset or "race"])
+    for key in ("tracks", "races", "cars", "laps", "telemetry_mb"):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    started = time.perf_counter()
+    manifest = generate(args.out, seed=args.seed, **params)
+    print(f"{len(manifest['sessions'])} sessions, {manifest['bytes'] / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Parser and endpoint benchmarks.
+
+Times the CSV extractors directly (uncached) and every dashboard route through an
+in-process ASGI client, cold (empty parse cache and sidecars) and warm. Each case
+records latency percentiles, peak RSS and throughput; results are written as JSON
+and, with --baseline, compared against an earlier run.
+
+    python -m bench.run --preset weekend
+    python -m bench.run --data /tmp/bench-data --out bench/results/today.json --baseline bench/results/last.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .generate import PRESETS, generate
+
+PERCENTILES = (50, 90, 95, 99)
+# a case slower than the baseline by more than this ratio is reported as a regression
+REGRESSION_RATIO = 1.2
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the process's RSS high-water mark (Linux); False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _summary(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000.0
+    out = {f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))}
+    out.update({"min": round(float(ms.min()), 3), "max": round(float(ms.max()), 3), "mean": round(float(ms.mean()), 3)})
+    return out
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """First call (cold) plus `repeat` timed calls, with the peak RSS over all of them."""
+    exact = _reset_peak_rss()
+    started = time.perf_counter()
+    fn()
+    cold = time.perf_counter() - started
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return {
+        "coldMs": round(cold * 1000.0, 3),
+        "runs": repeat,
+        "latencyMs": _summary(latencies),
+        "perSecond": round(repeat / sum(latencies), 2) if sum(latencies) else None,
+        "peakRssMb": round(_peak_rss_mb(), 1),
+        "peakRssExact": exact,
+    }
+
+
+def _session_files(base: Path, folder: str) -> Dict[str, Optional[Path]]:
+    d = base / folder
+    pick = lambda pattern: next(iter(sorted(d.glob(pattern))), None)
+    return {
+        "analysis": pick("*AnalysisEnduranceWithSections*"),
+        "lap_time": pick("*_lap_time_*.csv"),
+        "lap_start": pick("*_lap_start_time_*.csv"),
+        "lap_end": pick("*_lap_end_time_*.csv"),
+        "telemetry": pick("*telemetry*.csv"),
+    }
+
+
+def bench_parsers(base: Path, folders: List[str], repeat: int) -> List[Dict[str, Any]]:
+    from app import main
+    from app.analysis import read_analysis
+    from app.catalog import DatasetCatalog
+    from app.laps import build_lap_table
+    from app.telemetry import first_vehicle, open_vehicle_sidecar
+
+    results = []
+    for folder in folders:
+        files = _session_files(base, folder)
+        cases: List[tuple] = []
+        if files["analysis"]:
+            cases.append(("read_analysis", files["analysis"], lambda p=files["analysis"]: read_analysis(p)))
+            cases.append(("_extract_sections", files["analysis"], lambda p=files["analysis"]: main._extract_sections(p)))
+        if files["lap_time"]:
+            cases.append(("_extract_lap_times", files["lap_time"], lambda p=files["lap_time"]: main._extract_lap_times(p)))
+            cases.append((
+                "build_lap_table", files["lap_time"],
+                lambda: build_lap_table(files["lap_time"], files["lap_start"], files["lap_end"]),
+            ))
+        if files["telemetry"]:
+            tele = files["telemetry"]
+            cases.append(("_extract_telemetry", tele, lambda p=tele: main._extract_telemetry(p, 500)))
+            vehicle = first_vehicle(tele)
+            work = Path(tempfile.mkdtemp(prefix="trackota-bench-"))
+
+            def pivot(p=tele, v=vehicle, root=work):
+                # a fresh root every run: always a full pivot pass
+                shutil.rmtree(root / "s", ignore_errors=True)
+                return open_vehicle_sidecar(p, root / "s", v, ("speed", "gear", "throttle", "brake_f"))
+
+            cases.append(("open_vehicle_sidecar", tele, pivot))
+        for name, path, fn in cases:
+            size = path.stat().st_size
+            row = {"name": name, "file": path.relative_to(base).as_posix(), "bytes": size, **_measure(fn, repeat)}
+            p50 = row["latencyMs"]["p50"]
+            row["mbPerSecond"] = round(size / 1e6 / (p50 / 1000.0), 2) if p50 else None
+            results.append(row)
+            print(f"  {name:<22} {row['latencyMs']['p50']:>10.2f} ms p50  {row['mbPerSecond'] or 0:>8.1f} MB/s  {row['file']}")
+        if files["telemetry"]:
+            shutil.rmtree(work, ignore_errors=True)
+
+    # the directory walk behind /datasets: cold (no manifest) and warm (unchanged tree)
+    manifest = Path(tempfile.mkdtemp(prefix="trackota-bench-")) / "catalog.json"
+
+    def walk_cold():
+        manifest.unlink(missing_ok=True)
+        DatasetCatalog(base, manifest, 0.0).refresh(force=True)
+
+    warm = DatasetCatalog(base, manifest, 0.0)
+    for name, fn in (("catalog_walk_cold", walk_cold), ("catalog_walk_warm", lambda: warm.refresh(force=True))):
+        row = {"name": name, "file": ".", **_measure(fn, repeat)}
+        results.append(row)
+        print(f"  {name:<22} {row['latencyMs']['p50']:>10.2f} ms p50")
+    shutil.rmtree(manifest.parent, ignore_errors=True)
+    return results
+
+
+def _routes(base: Path, folder: str) -> List[tuple]:
+    files = _session_files(base, folder)
+    q = f"folder={folder}"
+    routes = [
+        ("GET", "/datasets", None),
+        ("GET", f"/strategy/summary?{q}", None),
+        ("GET", f"/strategy/recommendations?{q}", None),
+        ("GET", f"/race/top3?{q}", None),
+        ("GET", f"/charts/tyre-degradation?{q}", None),
+        ("GET", f"/charts/sections?{q}", None),
+        ("GET", f"/strategy/optimise?{q}", None),
+        ("POST", f"/strategy/simulate/batch?{q}", {"traces": 2000, "seed": 1}),
+    ]
+    if files["telemetry"]:
+        rel = files["telemetry"].relative_to(base).as_posix()
+        routes.append(("GET", f"/telemetry/series?file={rel}&points=2000", None))
+    return routes
+
+
+async def _bench_routes(base: Path, folders: List[str], repeat: int, concurrency: int) -> List[Dict[str, Any]]:
+    import httpx
+
+    from app.main import _sidecar_root, app
+    from app.parse_cache import parse_cache
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for folder in folders:
+            for method, url, body in _routes(base, folder):
+
+                async def call() -> httpx.Response:
+                    return await client.request(method, url, json=body)
+
+                # cold: nothing parsed, no telemetry sidecars
+                parse_cache.clear()
+                shutil.rmtree(_sidecar_root(), ignore_errors=True)
+                exact = _reset_peak_rss()
+                started = time.perf_counter()
+                resp = await call()
+                cold = time.perf_counter() - started
+                latencies = []
+                size = 0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    r = await call()
+                    latencies.append(time.perf_counter() - started)
+                    size = len(r.content)
+                # throughput: `concurrency` requests in flight at once (identical requests coalesce)
+                started = time.perf_counter()
+                await asyncio.gather(*[call() for _ in range(concurrency)])
+                burst = time.perf_counter() - started
+                row = {
+                    "method": method,
+                    "path": url,
+                    "status": resp.status_code,
+                    "responseBytes": size,
+                    "coldMs": round(cold * 1000.0, 3),
+                    "runs": repeat,
+                    "latencyMs": _summary(latencies),
+                    "perSecond": round(repeat / sum(latencies), 2) if sum(latencies) else None,
+                    "concurrency": concurrency,
+                    "concurrentPerSecond": round(concurrency / burst, 2) if burst else None,
+                    "peakRssMb": round(_peak_rss_mb(), 1),
+                    "peakRssExact": exact,
+                }
+                results.append(row)
+                print(f"  {method:<4} {url[:60]:<60} {resp.status_code}  cold {row['coldMs']:>9.1f} ms  warm p50 {row['latencyMs']['p50']:>8.2f} ms")
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _case_key(row: Dict[str, Any]) -> str:
+    return f"{row.get('method', 'parse')} {row.get('path') or row['name'] + ' ' + row['file']}"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-case p50 ratio against a baseline run; cases missing from either side are skipped."""
+    before = {_case_key(r): r for r in baseline.get("parsers", []) + baseline.get("routes", [])}
+    out = []
+    for row in current.get("parsers", []) + current.get("routes", []):
+        old = before.get(_case_key(row))
+        if not old or not old["latencyMs"]["p50"]:
+            continue
+        ratio = row["latencyMs"]["p50"] / old["latencyMs"]["p50"]
+        out.append({"case": _case_key(row), "p50Ms": row["latencyMs"]["p50"], "baselineP50Ms": old["latencyMs"]["p50"], "ratio": round(ratio, 3), "regression": ratio > REGRESSION_RATIO})
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--data", type=Path, help="datasets folder (e.g. written by bench.generate)")
+    source.add_argument("--preset", choices=sorted(PRESETS), help="generate a synthetic dataset first (default: race)")
+    parser.add_argument("--sessions", type=int, default=2, help="session folders to benchmark (default 2)")
+    parser.add_argument("--repeat", type=int, default=20, help="warm runs per case")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous requests for the throughput burst")
+    parser.add_argument("--skip-parsers", action="store_true")
+    parser.add_argument("--skip-routes", action="store_true")
+    parser.add_argument("--out", type=Path, help="results JSON (default bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    scratch = None
+    if args.data is None:
+        scratch = Path(tempfile.mkdtemp(prefix="trackota-bench-data-"))
+        preset = args.preset or "race"
+        print(f"generating '{preset}' dataset in {scratch}")
+        generate(scratch, **PRESETS[preset])
+        base = scratch
+    else:
+        base = args.data.resolve()
+    # the app reads its datasets folder from the environment on every request
+    os.environ["TRACKOTA_DATASETS_DIR"] = str(base)
+
+    folders = sorted({p.parent.relative_to(base).as_posix() for p in base.rglob("*AnalysisEnduranceWithSections*")})
+    folders = folders[: args.sessions]
+    result: Dict[str, Any] = {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "dataset": {"path": str(base), "preset": args.preset, "sessions": folders, "bytes": sum(p.stat().st_size for p in base.rglob("*") if p.is_file())},
+        "repeat": args.repeat,
+    }
+    try:
+        if not args.skip_parsers:
+            print("parsers")
+            result["parsers"] = bench_parsers(base, folders, args.repeat)
+        if not args.skip_routes:
+            print("routes")
+            result["routes"] = asyncio.run(_bench_routes(base, folders, args.repeat, args.concurrency))
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.baseline:
+        result["comparison"] = compare(result, json.loads(args.baseline.read_text(encoding="utf-8")))
+        for row in result["comparison"]:
+            if row["regression"]:
+                print(f"  REGRESSION {row['case']}: {row['baselineP50Ms']} -> {row['p50Ms']} ms p50 (x{row['ratio']})")
+    out = args.out or Path(__file__).parent / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"results -> {out}")
+
+
+if __name__ == "__main__":
+    main()